@@ -0,0 +1,336 @@
+# USAGE: python3 -m benchmarks.bench [-o bench_results.json] [--frames 1500] [--east frozen_east_text_detection.pb]
+"""reproducible benchmarks of the decode, render, OCR and cut paths
+
+A test match is synthesized locally (moving pattern plus a rendered
+scoreboard clock), then the core operations of the labeler are timed on it.
+Results are written as json, tagged with the current git commit, so runs on
+different commits can be compared.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import wait
+from pathlib import Path
+from time import perf_counter, perf_counter_ns
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import cv2
+import numpy as np
+
+from src.instrument import Histogram
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# scoreboard clock position in the synthetic video
+CLOCK_ROI = (40, 30, 240, 90)
+
+
+def synthesize_match(path: str, frames: int, fps: int = 25, size: tuple = (1280, 720), kickoff_sec: int = 754):
+    """write a test video: scrolling stripes with a MM:SS clock in the top-left corner"""
+    width, height = size
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    xs = np.arange(width, dtype=np.float32)
+    ys = np.arange(height, dtype=np.float32)[:, None]
+    x1, y1, x2, y2 = CLOCK_ROI
+    for frame_idx in range(frames):
+        phase = frame_idx * 0.15
+        green = (127 + 80 * np.sin(xs / 23.0 + phase) + 40 * np.cos(ys / 17.0 - phase)).astype(np.uint8)
+        frame = np.dstack([green // 3, green, green // 4])
+        match_sec = kickoff_sec + frame_idx // fps
+        cv2.rectangle(frame, (x1, y1), (x2, y2), (20, 20, 20), -1)
+        cv2.putText(frame, '{:02d}:{:02d}'.format(match_sec // 60, match_sec % 60), (x1 + 12, y2 - 14),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.4, (255, 255, 255), 3)
+        writer.write(frame)
+    writer.release()
+
+
+def summarize(histogram: Histogram, **extra):
+    result = histogram.summary()
+    result.update(extra)
+    return result
+
+
+def time_calls(func, args_list):
+    histogram = Histogram(size=max(1, len(args_list)))
+    for args in args_list:
+        start = perf_counter_ns()
+        func(*args)
+        histogram.add(perf_counter_ns() - start)
+    return histogram
+
+
+def bench_sequential_playback(video_path: str):
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    start = perf_counter()
+    while True:
+        read_success, _ = cap.read()
+        if not read_success:
+            break
+        frames += 1
+    elapsed = perf_counter() - start
+    cap.release()
+    return {'frames': frames, 'seconds': elapsed, 'fps': frames / elapsed}
+
+
+def bench_analysis_decode(video_path: str, fps: int = 25, **kwargs):
+    """throughput of the reduced decoding mode, also as a multiple of real time"""
+    from src.decode import iter_frames
+
+    frames = 0
+    last_frame_idx = 0
+    start = perf_counter()
+    for frame_idx, _ in iter_frames(video_path, **kwargs):
+        frames += 1
+        last_frame_idx = frame_idx if frame_idx is not None else last_frame_idx
+    elapsed = perf_counter() - start
+    return {'frames': frames, 'seconds': elapsed, 'fps': frames / elapsed,
+            'x_real_time': (last_frame_idx + 1) / fps / elapsed, 'options': kwargs}
+
+
+def bench_random_seek(video_path: str, frame_count: int, samples: int, seed: int):
+    """latency of single frame requests at random positions, decoded and converted by the viewer's navigator"""
+    from src.navigation import FrameNavigator
+
+    rng = random.Random(seed)
+    targets = [(rng.randrange(frame_count),) for _ in range(samples)]
+    navigator = FrameNavigator(video_path, on_frame=lambda decoded: None)
+    try:
+        return summarize(time_calls(navigator.read, targets), samples=samples)
+    finally:
+        navigator.close()
+
+
+def bench_navigation_burst(video_path: str, bursts: int, burst: int = 25):
+    """latency from the last of `burst` consecutive frame requests (a held arrow key) to its frame"""
+    import threading
+    from src.navigation import FrameNavigator
+
+    delivered = []
+    last_target = [None]
+    done = threading.Event()
+
+    def on_frame(decoded):
+        delivered.append(decoded.frame_idx)
+        if decoded.frame_idx == last_target[0]:
+            done.set()
+
+    navigator = FrameNavigator(video_path, on_frame)
+    histogram = Histogram(size=bursts)
+    try:
+        for i in range(bursts):
+            first = i * burst * 2
+            done.clear()
+            last_target[0] = first + burst - 1
+            for target in range(first, first + burst):
+                navigator.request(target)
+            start = perf_counter_ns()
+            done.wait(10)
+            histogram.add(perf_counter_ns() - start)
+    finally:
+        navigator.close()
+    return summarize(histogram, bursts=bursts, requests=bursts * burst, decoded=len(delivered))
+
+
+def bench_qimage_conversion(video_app, video_path: str, samples: int):
+    from src.navigation import FrameNavigator
+
+    navigator = FrameNavigator(video_path, on_frame=lambda decoded: None)
+    try:
+        frame = navigator.read(0).rgb
+    finally:
+        navigator.close()
+    return summarize(time_calls(video_app._ndarray_to_qimage, [(frame,)] * samples), samples=samples)
+
+
+def bench_decode_predictions(samples: int, seed: int):
+    from src.text_recognition import decode_predictions
+
+    rng = np.random.RandomState(seed)
+    scores = rng.rand(1, 1, 80, 80).astype(np.float32)
+    geometry = (rng.rand(1, 5, 80, 80) * 20).astype(np.float32)
+    return summarize(time_calls(decode_predictions, [(scores, geometry, 0.5)] * samples), samples=samples)
+
+
+def bench_recognizer(video_path: str, east: str, samples: int, workdir: str, mode: str):
+    if mode == 'east' and not Path(east).exists():
+        return {'skipped': 'EAST model {} not found'.format(east)}
+    from src.text_recognition import recognizer
+
+    cap = cv2.VideoCapture(video_path)
+    read_success, frame = cap.read()
+    cap.release()
+    x1, y1, x2, y2 = CLOCK_ROI
+    crop_path = str(Path(workdir) / 'clock.jpg')
+    cv2.imwrite(crop_path, frame[y1:y2, x1:x2])
+    kwargs = dict(padding=0.08, east=east, x1=x1, y1=y1, x2=x2, y2=y2, mode=mode)
+    texts = []
+    histogram = Histogram(size=samples)
+    for _ in range(samples):
+        start = perf_counter_ns()
+        texts.append(recognizer(crop_path, **kwargs))
+        histogram.add(perf_counter_ns() - start)
+    return summarize(histogram, samples=samples, text=texts[-1])
+
+
+def bench_east_batch(video_path: str, east: str, crops: int, batch_sizes=(1, 4, 8, 16), dnn_threads=(None, 1, 4)):
+    """recognize_east_batch of `crops` clock crops for each batch size and OpenCV thread count, per crop latency"""
+    if not Path(east).exists():
+        return {'skipped': 'EAST model {} not found'.format(east)}
+    from src.clock import configure_ocr
+    from src.text_recognition import recognize_east_batch
+
+    cap = cv2.VideoCapture(video_path)
+    images = []
+    x1, y1, x2, y2 = CLOCK_ROI
+    while len(images) < crops:
+        read_success, frame = cap.read()
+        if not read_success:
+            break
+        images.append(frame[y1:y2, x1:x2])
+    cap.release()
+
+    default_threads = cv2.getNumThreads()
+    results = {}
+    for threads in dnn_threads:
+        configure_ocr({'dnn_threads': threads or default_threads})
+        for batch_size in batch_sizes:
+            start = perf_counter_ns()
+            recognize_east_batch(images, east=east, padding=0.08, batch_size=batch_size)
+            elapsed = perf_counter_ns() - start
+            results['threads_{}_batch_{}'.format(threads or 'default', batch_size)] = {
+                'crops': len(images), 'ms_per_crop': elapsed / 1e6 / max(1, len(images))}
+    cv2.setNumThreads(default_threads)
+    return results
+
+
+def bench_east_sizing(video_path: str, east: str, crops: int, fps: int = 25, kickoff_sec: int = 754):
+    """latency and accuracy of EAST + tesseract on labeled clock crops, fixed 320x320 input vs aspect-aware sizes"""
+    if not Path(east).exists():
+        return {'skipped': 'EAST model {} not found'.format(east)}
+    from src.clock import parse_clock
+    from src.text_recognition import recognize_east
+
+    # one crop per second of the synthetic match, labeled with the clock drawn on it
+    cap = cv2.VideoCapture(video_path)
+    x1, y1, x2, y2 = CLOCK_ROI
+    labeled = []
+    frame_idx = 0
+    while len(labeled) < crops:
+        read_success, frame = cap.read()
+        if not read_success:
+            break
+        if frame_idx % fps == 0:
+            labeled.append((frame[y1:y2, x1:x2], kickoff_sec + frame_idx // fps))
+        frame_idx += 1
+    cap.release()
+
+    variants = {'fixed_320x320': dict(input_size='fixed')}
+    for text_height in (16, 32, 64):
+        variants['auto_text_height_{}'.format(text_height)] = dict(input_size='auto', text_height=text_height)
+    results = {}
+    for name, options in variants.items():
+        histogram = Histogram(size=max(1, len(labeled)))
+        correct = 0
+        for crop, match_sec in labeled:
+            start = perf_counter_ns()
+            text = recognize_east(crop, east=east, padding=0.08, **options)
+            histogram.add(perf_counter_ns() - start)
+            correct += parse_clock(text or '') == match_sec
+        results[name] = summarize(histogram, crops=len(labeled), accuracy=correct / max(1, len(labeled)))
+    return results
+
+
+def bench_cut(video_app, highlights: int, workdir: str):
+    model = video_app.table_trim.model()
+    model.clear()
+    step = max(1, video_app.frame_count // (highlights + 1))
+    for i in range(1, highlights + 1):
+        model.add_highlight(i * step - step // 4, i * step + step // 4)
+    start = perf_counter()
+    wait(video_app.cut_videos())
+    elapsed = perf_counter() - start
+    cut_bytes = sum(path.stat().st_size for path in Path(workdir, 'cuts').glob('*.mp4'))
+    return {'clips': highlights, 'seconds': elapsed, 'clips_per_sec': highlights / elapsed,
+            'mb_per_sec': cut_bytes / 1e6 / elapsed}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=str(ROOT)).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def argparser():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('-o', '--output', dest='output', default='bench_results.json')
+    parser.add_argument('--frames', type=int, default=1500)
+    parser.add_argument('--samples', type=int, default=200)
+    parser.add_argument('--ocr-samples', dest='ocr_samples', type=int, default=10)
+    parser.add_argument('--highlights', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--east', default='frozen_east_text_detection.pb')
+    return parser
+
+
+def main(args: argparse.Namespace):
+    from PyQt5.QtWidgets import QApplication
+    from src.app import VideoApp
+    from src import pools
+
+    workdir = tempfile.mkdtemp(prefix='video_labeler_bench_')
+    video_path = str(Path(workdir) / 'complete_bench.mp4')
+    synthesize_match(video_path, args.frames)
+
+    app = QApplication(sys.argv)
+    # everything the app writes stays in the workdir, and the background jobs not measured here (remux, shot
+    # index, hot window) are off so that they do not compete with the timed operations
+    video_app = VideoApp(padding_sec=2, session_dir=str(Path(workdir) / 'sessions'),
+                         ocr_frames_dir=str(Path(workdir) / 'OCR_frames'),
+                         ingest={'enabled': False, 'cache_dir': str(Path(workdir) / 'ingest_cache')},
+                         shots={'enabled': False},
+                         hot_window={'enabled': False, 'cache_dir': str(Path(workdir) / 'hot_frames')})
+    video_app.videopath = video_path
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+        'video': {'frames': args.frames, 'size': [1280, 720], 'fps': 25},
+        'benchmarks': {},
+    }
+    benchmarks = results['benchmarks']
+    benchmarks['sequential_playback'] = bench_sequential_playback(video_path)
+    benchmarks['analysis_decode_quarter_gray'] = bench_analysis_decode(video_path, scale=0.25, gray=True)
+    benchmarks['analysis_decode_step_5'] = bench_analysis_decode(video_path, scale=0.25, gray=True, step=5)
+    benchmarks['analysis_decode_keyframes'] = bench_analysis_decode(video_path, scale=0.25, gray=True,
+                                                                    keyframes_only=True)
+    benchmarks['random_seek_navigator'] = bench_random_seek(video_path, args.frames, args.samples, args.seed)
+    benchmarks['navigation_burst'] = bench_navigation_burst(video_path, min(20, args.frames // 50))
+    benchmarks['frame_to_qimage'] = bench_qimage_conversion(video_app, video_path, args.samples)
+    benchmarks['decode_predictions'] = bench_decode_predictions(args.samples, args.seed)
+    benchmarks['recognizer_fixed_roi'] = bench_recognizer(video_path, args.east, args.ocr_samples, workdir,
+                                                          'fixed_roi')
+    benchmarks['recognizer_east'] = bench_recognizer(video_path, args.east, args.ocr_samples, workdir, 'east')
+    benchmarks['east_batch'] = bench_east_batch(video_path, args.east, 4 * args.ocr_samples)
+    benchmarks['east_sizing'] = bench_east_sizing(video_path, args.east, args.ocr_samples)
+    benchmarks['cut_videos'] = bench_cut(video_app, args.highlights, workdir)
+    video_app.close_all_videos()
+    pools.shutdown(wait=True)
+    app.quit()
+
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main(argparser().parse_args())
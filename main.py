@@ -1,5 +1,7 @@
 # USAGE: python3 main.py
 
+from src import startup
+
 import argparse
 import logging
 import sys
@@ -8,13 +10,22 @@ import yaml
 
 #sys.path.insert(1, '/src')
 
-from PyQt5.QtWidgets import QApplication
+# each module executed by the eager imports is timed as well, listed before the phase importing it
+with startup.import_times():
+    with startup.phase('import PyQt5'):
+        from PyQt5.QtCore import QTimer
+        from PyQt5.QtWidgets import QApplication
 
-from src.app import VideoApp, MyMainApp
-from src.utils import func_profile, log_handler
+    with startup.phase('import src.app'):
+        from src.app import VideoApp, MyMainApp
+from src.utils import func_profile, log_handler, stop_logging
+from src import instrument, pools
 
 CONFIG_FILE = str(Path(__file__).resolve().parents[0] / 'config.yaml')
 
+# modules only needed after a video is opened, imported in background once the window is shown
+WARM_UP_MODULES = ['cv2', 'pandas', 'moviepy.video.io.ffmpeg_tools', 'src.text_recognition']
+
 
 def argparser():
     """parse arguments from terminal"""
@@ -22,6 +33,8 @@ def argparser():
     parser.add_argument('-v', '--video', dest='video')
     parser.add_argument('-c', '--config', dest='config', default=CONFIG_FILE)
     parser.add_argument('-o', '--output', dest='output')
+    parser.add_argument('--serve', action='store_true', help='run a labeling server for the other instances')
+    parser.add_argument('--server', dest='server', help='url of the labeling server to use, overrides config.yaml')
     return parser
 
 
@@ -29,17 +42,37 @@ def argparser():
 def main(args: argparse.Namespace):
     """an interface tfo activate pyqt5 app"""
     logger = logging.getLogger(__name__)
-    log_handler(logger)
+    # the loggers of all the src modules go through the same non blocking handler
+    log_handler(logger, logging.getLogger('src'))
     logger.info(args)
-    with open(args.config, 'r') as config_file:
-        config = yaml.load(config_file)
+    with startup.phase('load config'):
+        with open(args.config, 'r') as config_file:
+            config = yaml.load(config_file)
 
     output_path = Path('outputs')
     if not output_path.exists():
         output_path.mkdir(parents=True)
 
-    app = QApplication(sys.argv)
-    main_app = MyMainApp(**config)
+    instrument.configure(**(config.get('instrumentation') or {}))
+    pools.configure(**(config.get('pools') or {}))
+
+    if args.serve:
+        from src.server import serve
+        serve(config)
+        return
+    if args.server:
+        config['server'] = dict(config.get('server') or {}, url=args.server)
+
+    with startup.phase('create QApplication'):
+        app = QApplication(sys.argv)
+    with startup.phase('build main window'):
+        main_app = MyMainApp(**config)
+
+    def on_first_window():
+        startup.report(logger)
+        startup.warm_up(*WARM_UP_MODULES)
+    # runs as soon as the event loop has shown the window
+    QTimer.singleShot(0, on_first_window)
     try:
         # log_handler(main_app.logger)
         app.exec()
@@ -48,4 +81,7 @@ def main(args: argparse.Namespace):
 
 
 if __name__ == '__main__':
-    main(argparser().parse_args())
+    try:
+        main(argparser().parse_args())
+    finally:
+        stop_logging()
@@ -1,21 +1,37 @@
 from collections import OrderedDict
 from datetime import datetime, timedelta
-from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
+from functools import partial
+from time import perf_counter_ns
 
-import cv2
 import numpy as np
-import pandas as pd
-from PyQt5.QtCore import Qt, QTimer, pyqtSlot
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal, pyqtSlot
 from PyQt5.QtGui import QColor, QImage, QPixmap
-from PyQt5.QtWidgets import QMessageBox, QStyle, QWidget, QTableWidgetItem, QErrorMessage, QFileDialog
+from PyQt5.QtWidgets import QMessageBox, QStyle, QWidget, QErrorMessage, QFileDialog, QListWidgetItem
 
 from .view import VideoAppViewer
 from .view import VideoAppMain
-from .text_recognition import recognizer
+from .clips import VirtualClip, append_clip_index
+from .labels import LABEL_COLUMNS, LABELS_FILE, VIRTUAL_LABELS_FILE
+from .records import RecordStore, record_frame
+from .highlights import NO_FRAME, HighlightTableModel
+from .journal import SessionJournal
+from .clock import configure_ocr, configured_clock_reader, read_clock, read_clocks
+from .probe import probe
+from .navigation import FrameNavigator, RemoteNavigator
+from .hotwindow import HotFrames, clear_cache
+from . import ingest
+from .startup import lazy_import
+from . import instrument, pools
+from .instrument import timer
 
 from pathlib import Path
 import os.path
 import csv
+import threading
+
+# heavy modules, imported on first use (see startup.py)
+cv2 = lazy_import('cv2')
+pd = lazy_import('pandas')
 
 
 class MyMainApp(VideoAppMain):
@@ -24,17 +40,85 @@ class MyMainApp(VideoAppMain):
         super().__init__(self.videoApp)
 
         self.select_path.triggered.connect(self.select_video_path)
+        self.add_videos.triggered.connect(self.add_video_paths)
+        self.ingest_folder.triggered.connect(self.ingest_video_folder)
+        self.next_video.triggered.connect(self.show_next_video)
+        self.list_videos.itemClicked.connect(self.on_video_item_clicked)
 
         self.show()
 
+    def closeEvent(self, event):
+        self.videoApp.close_all_videos()
+        pools.shutdown()
+        instrument.shutdown()
+        super().closeEvent(event)
+
     @pyqtSlot()
     def select_video_path(self):
         file_tuple = QFileDialog.getOpenFileName(self, "Open Video", "~", "Video Files (*.mp4);; Video Files ts (*.ts)")
-        self.videoApp.videopath = str(file_tuple[0])
+        if file_tuple[0]:
+            self.queue_videos([str(file_tuple[0])])
+            self.show_video(str(file_tuple[0]))
+
+    @pyqtSlot()
+    def add_video_paths(self):
+        file_tuple = QFileDialog.getOpenFileNames(self, "Add Videos", "~", "Video Files (*.mp4 *.ts)")
+        self.queue_videos([str(path) for path in file_tuple[0]])
+        if file_tuple[0] and not self.videoApp.videopath:
+            self.show_video(self.videoApp.video_queue[0])
+
+    @pyqtSlot()
+    def ingest_video_folder(self):
+        directory = QFileDialog.getExistingDirectory(self, "Ingest Videos", "~")
+        if not directory:
+            return
+        video_paths = ingest.find_videos(directory)
+        if self.videoApp.server is None:
+            # all the remuxes start now, in parallel on the ingest pool
+            for video_path in video_paths:
+                self.videoApp.ingest_future(video_path)
+        self.queue_videos(video_paths)
+        if video_paths and not self.videoApp.videopath:
+            self.show_video(self.videoApp.video_queue[0])
+
+    @pyqtSlot()
+    def show_next_video(self):
+        next_path = self.videoApp.next_video_path()
+        if next_path is None:
+            QMessageBox.information(self, 'Info', 'no next video in the queue', QMessageBox.Ok)
+        else:
+            self.show_video(next_path)
+
+    @pyqtSlot(QListWidgetItem)
+    def on_video_item_clicked(self, item):
+        self.show_video(item.data(Qt.UserRole))
+
+    def queue_videos(self, video_paths: list):
+        for video_path in self.videoApp.queue_videos(video_paths):
+            item = QListWidgetItem(os.path.basename(video_path))
+            item.setData(Qt.UserRole, video_path)
+            item.setToolTip(video_path)
+            self.list_videos.addItem(item)
+
+    def show_video(self, video_path: str):
+        if not self.videoApp.show_video(video_path):
+            return
+        self.list_videos.setCurrentRow(self.videoApp.video_queue.index(video_path))
         self.centralWidget().setDisabled(False)
 
 
 class VideoApp(VideoAppViewer):
+    # (video path, list of audio.Candidate) emitted by the highlight detection thread
+    candidates_ready = pyqtSignal(str, list)
+    # (video path, shots.ShotIndex) emitted by the shot index thread
+    shots_ready = pyqtSignal(str, object)
+    # (video path, line edit name, frame index, recognized text) emitted by the OCR pool
+    timestamp_ready = pyqtSignal(str, str, int, str)
+    # (clip path, error message) emitted by the cut pool when a cut fails
+    cut_failed = pyqtSignal(str, str)
+    # (video path, navigation.DecodedFrame) emitted by the navigator thread
+    frame_decoded = pyqtSignal(str, object)
+
     def __init__(self, **config):
         self.config = config
         self.title = self.config.get('title', 'PyQt5 video labeling viewer')
@@ -59,13 +143,85 @@ class VideoApp(VideoAppViewer):
         self.label_color = label_color
         self.label_thickness = label_thickness
         self.limit_nlabel = self.config.get('limit_nlabel', None)
-        self.records = []
+        self.records = RecordStore()
+
+        # cut config
+        self.padding_sec = self.config.get('padding_sec', 30)
+        self.virtual_clips = self.config.get('virtual_clips', False)
+
+        # event feeds already parsed, by csv path
+        self.event_feeds = {}
+
+        # ocr config, the clock reader is reset when the video or the time roi change
+        self.ocr_config = self.config.get('ocr') or {}
+        configure_ocr(self.ocr_config)
+        self.clock_reader = None
+        # time roi crops of the clock readings are kept here
+        self.ocr_frames_dir = self.config.get('ocr_frames_dir', 'OCR_frames')
+        # frame index of the clock reading still running, by timestamp line edit
+        self.pending_clocks = {}
+
+        # audio highlight detection, pre_sec/post_sec are added around each candidate
+        self.audio_config = dict(self.config.get('audio') or {})
+        self.candidates_ready.connect(self.add_candidates_to_table)
+
+        # shot boundary index, built in background for each opened video
+        self.shots_config = dict(self.config.get('shots') or {})
+        self.shot_index = None
+        # ShotIndex.load futures by video path, also started ahead for the next video of the queue
+        self.shot_futures = {}
+        self.shots_ready.connect(self.on_shots_ready)
+        self.timestamp_ready.connect(self.on_timestamp_ready)
+        self.cut_failed.connect(self.on_cut_failed)
+        # labels_info.csv rows are appended from the cut pool threads
+        self.labels_lock = threading.Lock()
+        self.frame_decoded.connect(self.on_frame_decoded)
+
+        # decoded window around the event being labeled
+        self.hot_window_config = dict(self.config.get('hot_window') or {})
+        if self.hot_window_config.get('enabled', True):
+            # window files of a session that crashed
+            clear_cache(self.hot_window_config.get('cache_dir', 'hot_frames'))
+
+        # labeling server decoding the frames and reading the clock for this app (see server.py), if any
+        server_url = (self.config.get('server') or {}).get('url')
+        self.server = None
+        if server_url:
+            from .server import ServerClient
+            self.server = ServerClient(server_url)
+
+        # remuxed copies of the videos, decoded in place of the originals
+        self.ingest_config = dict(self.config.get('ingest') or {})
+        # ingest.ingest_video futures by video path
+        self.ingest_futures = {}
+
+        # session autosave
+        self.session_dir = self.config.get('session_dir', 'sessions')
+        self.journal = None
+        self.is_restoring_session = False
+        for field in self.journal_fields:
+            getattr(self, field).textChanged.connect(
+                lambda value, field=field: self.journal_field_changed(field, value))
 
         self.msg_with_guide = {'first': 'Draw a window around the time (the squarer, the better)',
                                'second': 'Indicate timestamps of the highlights',
                                'third': 'Add to the table all the highlights, then cut them!'}
         self.status = 'first'
 
+        # videos of the session, the state of the ones not shown is kept in video_states
+        self._videopath = None
+        # file actually decoded for the video, its ingested copy when there is one
+        self.decode_path = None
+        self.media = None
+        self.navigator = None
+        self.hot_frames = None
+        self._target_frame_idx = None
+        self.video_queue = []
+        self.video_states = {}
+        self.is_frame_loop_running = False
+        self.is_playing_video = False
+        self.bind_widgets()
+
         # self.show()
 
     @property
@@ -74,42 +230,246 @@ class VideoApp(VideoAppViewer):
 
     @videopath.setter
     def videopath(self, value):
-        self._videopath = value
-        self.read_video()
-        self.bind_widgets()
+        self.show_video(value)
+
+    # attributes of the shown video, swapped with its VideoApp.video_states entry
+    video_state_attrs = ['_videopath', 'decode_path', 'media', 'navigator', '_target_frame_idx',
+                         'render_frame_idx', 'render_frame', 'hot_frames', 'records', 'journal', 'clock_reader',
+                         'pending_clocks', 'shot_index', 'x1', 'y1', 'x2', 'y2', 'status', 'item_selected']
 
+    def queue_videos(self, video_paths: list):
+        """append videos to the session queue
+
+        Returns:
+            {list} -- the paths that were not queued yet
+        """
+        added = [video_path for video_path in OrderedDict.fromkeys(video_paths) if video_path not in self.video_queue]
+        self.video_queue.extend(added)
+        if self._videopath is not None:
+            self.preindex_next_video()
+        return added
+
+    def next_video_path(self):
+        """video following the shown one in the queue, None at the end of the queue"""
+        if self._videopath not in self.video_queue:
+            return self.video_queue[0] if self.video_queue else None
+        position = self.video_queue.index(self._videopath) + 1
+        return self.video_queue[position] if position < len(self.video_queue) else None
+
+    def show_video(self, video_path: str):
+        """show a video, opening it the first time and restoring its labels and caches afterwards
+
+        Returns:
+            {bool} -- False if the video could not be opened, the shown video is left as it was
+        """
+        if video_path == self._videopath:
+            return True
+        media = None
+        if self.server is not None and video_path not in self.video_states:
+            # asked before anything is changed, so that an unreachable server leaves the shown video as it is
+            try:
+                media = self.server.media(video_path)
+            except OSError as err:
+                self.logger.error('%s cannot be opened on the labeling server: %s', video_path, err)
+                QMessageBox.warning(self, 'Error', 'Error! {} cannot be opened on the labeling server: {}'.format(
+                    video_path, err), QMessageBox.Ok)
+                return False
+        if video_path not in self.video_queue:
+            self.video_queue.append(video_path)
+        if self.is_playing_video:
+            self.on_play_video_clicked()
+        if self._videopath is not None:
+            self.video_states[self._videopath] = self._save_video_state()
+
+        state = self.video_states.pop(video_path, None)
+        if state is None:
+            self._open_video(video_path, media)
+        else:
+            self._restore_video_state(state)
+
+        if not self.is_frame_loop_running:
+            self.is_frame_loop_running = True
+            self._update_frame()
+        self.preindex_next_video()
+        return True
+
+    def _open_video(self, video_path: str, media=None):
+        self._videopath = video_path
+        self.decode_path = self._decode_path(video_path)
+        if self.server is None and self.decode_path == video_path and self.ingest_config.get('enabled', True):
+            # decoded from the original this time, from the remux next time
+            self.ingest_future(video_path)
+        self.table_trim.setModel(HighlightTableModel(parent=self.table_trim))
+        self.records = RecordStore()
+        self.x1 = self.y1 = self.x2 = self.y2 = None
+        self.status = 'first'
+        self.item_selected = None
+        self.journal = None
+        self.read_video(media)
+        self.enable_buttons(False)
+        self.open_session()
+        self.detect_highlights.setDisabled(False)
+        self.build_shot_index()
+
+    def _save_video_state(self):
+        """detach the shown video: its attributes, trim table model and line edit values"""
+        state = {attr: getattr(self, attr) for attr in self.video_state_attrs}
+        state['model'] = self.table_trim.model()
+        state['fields'] = {field: getattr(self, field).text() for field in self.journal_fields}
+        state['candidates'] = []
+        return state
+
+    def _restore_video_state(self, state: dict):
+        for attr in self.video_state_attrs:
+            setattr(self, attr, state[attr])
+        self.table_trim.setModel(state['model'])
+        self.is_restoring_session = True
+        for field in self.journal_fields:
+            getattr(self, field).setText(state['fields'].get(field, ''))
+        self.is_restoring_session = False
+
+        self.render_frame_idx = None
+        self.is_force_update = True
+        self.slider_video.setRange(0, self.frame_count - 1)
+        self._update_video_info()
+        self.enable_buttons(self.x1 is not None)
+        self.slider_video.set_markers(self.shot_index.frames if self.shot_index else [])
+        self.btn_previous_shot.setDisabled(self.shot_index is None)
+        self.btn_next_shot.setDisabled(self.shot_index is None)
+        if self.shot_index is None:
+            self.build_shot_index()
+        if state['candidates']:
+            self.add_candidates_to_table(self._videopath, state['candidates'])
+
+    def close_all_videos(self):
+        """close the journals and decoders of all the videos of the session"""
+        self.close_session()
+        if self.navigator is not None:
+            self.navigator.close()
+            if self.hot_frames is not None:
+                self.hot_frames.close()
+        for state in self.video_states.values():
+            if state['journal'] is not None:
+                state['journal'].close()
+            state['navigator'].close()
+            if state['hot_frames'] is not None:
+                state['hot_frames'].close()
+        self.video_states.clear()
+
+    def preindex_next_video(self):
+        """start the ingest and shot index of the next video of the queue while the current one is labeled"""
+        next_path = self.next_video_path()
+        if next_path is None or next_path in self.video_states or self.server is not None:
+            # with a server, videos are ingested and decoded on its side
+            return
+        if self.ingest_config.get('enabled', True):
+            self.ingest_future(next_path)
+        if self.shots_config.get('enabled', True):
+            self._shot_index_future(next_path)
+
+    def _decode_path(self, video_path: str):
+        if not self.ingest_config.get('enabled', True):
+            return video_path
+        return ingest.decode_path(video_path, self.ingest_config.get('cache_dir', 'ingest_cache'))
+
+    def ingest_future(self, video_path: str):
+        """ingest.ingest_video of a video on the ingest pool, started once per session"""
+        future = self.ingest_futures.get(video_path)
+        if future is None:
+            future = self.ingest_futures[video_path] = pools.submit(
+                'ingest', ingest.ingest_video, video_path, self.ingest_config.get('cache_dir', 'ingest_cache'))
+        return future
+
+    # line edits saved in the session journal
+    journal_fields = ['init_trim_value', 'select_event_value', 'begin_celebration_value', 'stop_trim_value',
+                      'init_timestamp', 'stop_timestamp']
+
+    def open_session(self):
+        """open the autosave journal of the current video and restore its labels"""
+        self.close_session()
+        self.journal = SessionJournal(self._videopath, self.session_dir)
+        state = self.journal.state
+
+        self.is_restoring_session = True
+        model = self.table_trim.model()
+        model.clear()
+        for highlight in state['highlights']:
+            model.add_highlight(**highlight)
+        for field in self.journal_fields:
+            getattr(self, field).setText(state['fields'].get(field, ''))
+        if state['roi']:
+            self._set_roi(**state['roi'])
+        self.is_restoring_session = False
+
+    def close_session(self):
+        """flush and close the autosave journal"""
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    def journal_field_changed(self, field: str, value: str):
+        if self.journal is not None and not self.is_restoring_session:
+            self.journal.edit_field(field, value)
+
+    # timing and geometry come from the probe of the video (see probe.py), not from the capture
     @property
     def frame_count(self):
-        return int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) if self.cap else None
+        return self.media.frame_count if self.media else None
 
     @property
     def frame_height(self):
-        return int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) if self.cap else None
+        return self.media.height if self.media else None
 
     @property
     def frame_width(self):
-        return int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH)) if self.cap else None
+        return self.media.width if self.media else None
 
     @property
     def video_fps(self):
-        return int(self.cap.get(cv2.CAP_PROP_FPS)) if self.cap else None
+        return float(self.media.fps) if self.media else None
 
-    def read_video(self):
-        # read video
-        self.cap = cv2.VideoCapture(self._videopath)
+    @property
+    def target_frame_idx(self):
+        return self._target_frame_idx
+
+    @target_frame_idx.setter
+    def target_frame_idx(self, frame_idx: int):
+        # every navigation goes through the navigator, which only decodes the latest target
+        if frame_idx != self._target_frame_idx and self.navigator is not None:
+            self.navigator.request(frame_idx)
+        self._target_frame_idx = frame_idx
+
+    def read_video(self, media=None):
+        """open the decoders of the current video; in server mode `media` is its MediaInfo, already asked to the
+        server"""
+        on_frame = partial(self.frame_decoded.emit, self._videopath)
+        self.hot_frames = None
+        if self.server is not None:
+            # decoders and hot window live in the server, which is asked by original path
+            self.media = media if media is not None else self.server.media(self._videopath)
+            self.navigator = RemoteNavigator(self.server, self._videopath, on_frame)
+        else:
+            self.media = probe(self.decode_path)
+            if self.hot_window_config.get('enabled', True):
+                window_config = {key: value for key, value in self.hot_window_config.items() if key != 'enabled'}
+                self.hot_frames = HotFrames(self.decode_path, executor=pools.get('hot_window'), **window_config)
+            self.navigator = FrameNavigator(self.decode_path, on_frame, store=self.hot_frames)
+        self._target_frame_idx = None
         self.target_frame_idx = 0  # ready to update
         self.render_frame_idx = None  # redneded
+        self.render_frame = None  # BGR frame shown, without drawings
         self.scale_height = self.scale_width = None
         self.is_playing_video = False
         self.is_force_update = False
+        self.clock_reader = None
+        self.pending_clocks = {}
+        self.slider_video.setRange(0, self.frame_count - 1)
+        self.slider_video.repaint()
         self._update_video_info()
-        self._update_frame()
 
     def bind_widgets(self):
-        # widget binding
+        # widget binding, once: the widgets are shared by all the videos of the session
         # general
-        self.slider_video.setRange(0, self.frame_count - 1)
-        self.slider_video.repaint()
         self.slider_video.sliderMoved.connect(self.on_slider_moved)
         self.slider_video.sliderReleased.connect(self.on_slider_released)
         # self.slider_video.valueChanged.connect(self.on_slider_moved)
@@ -133,12 +493,22 @@ class VideoApp(VideoAppViewer):
         self.select_event.clicked.connect(self.set_event_value)
         self.begin_celebration.clicked.connect(self.set_celebration_value)
         self.stop_trim.clicked.connect(self.set_stop_trim_value)
-        self.table_trim.itemClicked.connect(self.select_trim_from_table)
+        self.table_trim.clicked.connect(self.select_trim_from_table)
+        # not textChanged: a typed frame would start a window decode at each keystroke
+        self.select_event_value.editingFinished.connect(self.on_event_value_edited)
 
         # table toolbar
         self.delete_record.triggered.connect(self.delete_record_from_table)
         self.add_record.triggered.connect(self.add_trim_to_table)
         self.cut_video.triggered.connect(self.cut_videos)
+        self.detect_highlights.triggered.connect(self.propose_highlights)
+        self.btn_previous_shot.clicked.connect(self._goto_previous_shot)
+        self.btn_next_shot.clicked.connect(self._goto_next_shot)
+
+    def analysis_frames(self, **kwargs):
+        """iterate reduced frames of the opened video for analysis jobs (see decode.iter_frames)"""
+        from .decode import iter_frames
+        return iter_frames(self.decode_path, **kwargs)
 
     def _ndarray_to_qimage(self, image: np.ndarray):
         """convert cv2 image to pyqt5 image
@@ -151,38 +521,19 @@ class VideoApp(VideoAppViewer):
         return QImage(image, image.shape[1], image.shape[0], QImage.Format_RGB888)
 
     def _frame_idx_to_hmsf(self, frame_idx: int):
-        """convert to hmsf timestamp by given frame idx and fps"""
+        """convert to hmsf timestamp by given frame idx, from the frame pts"""
         assert self.video_fps
         base = datetime.strptime('00:00:00.000000', '%H:%M:%S.%f')
-        delta = timedelta(seconds=frame_idx / self.video_fps)
+        delta = timedelta(seconds=self.media.frame_time(frame_idx))
         return (base + delta).strftime('%H:%M:%S.%f')
 
     def _frame_idx_to_hms(self, frame_idx: int):
-        """convert to hms timestamp by given frame idx and fps"""
+        """convert to hms timestamp by given frame idx, from the frame pts"""
         assert self.video_fps
         base = datetime.strptime('00:00:00', '%H:%M:%S')
-        delta = timedelta(seconds=frame_idx // self.video_fps)
+        delta = timedelta(seconds=int(self.media.frame_time(frame_idx)))
         return (base + delta).strftime('%H:%M:%S')
 
-    def _read_frame(self, frame_idx: int):
-        """check frame idx and read frame status than return frame
-        Arguments:
-            frame_idx {int} -- frame index
-
-        Returns:
-            {np.ndarray} -- RGB image in (h, w, c)
-        """
-        if frame_idx >= self.frame_count:
-            self.logger.exception('frame index %d should be less than %d', frame_idx, self.frame_count)
-        else:
-            self.target_frame_idx = frame_idx
-            self.cap.set(1, frame_idx)
-            read_success, frame = self.cap.read()
-            if read_success:
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                return frame
-            self.logger.exception('read #%d frame failed', frame_idx)
-
     def _play_video(self):
         """play video when button clicked"""
         if self.is_playing_video and self.video_fps:
@@ -201,41 +552,53 @@ class VideoApp(VideoAppViewer):
         shape = str((self.frame_width, self.frame_height))
         self.label_video_path.setText(self.videopath)
         self.label_video_shape.setText(shape)
-        self.label_video_fps.setText(str(self.video_fps))
+        fps_text = '{} ({:.3f})'.format(self.media.fps, self.video_fps)
+        self.label_video_fps.setText(fps_text + (' VFR' if self.media.is_vfr else ''))
 
     def _update_frame(self):
-        """read and update image to label"""
+        """refresh the buttons, and ask again for the target frame when it must be redrawn"""
 
         # disable useless buttons
         self.check_available_buttons()
 
-        scale_factor = 1.5
-
-        if self.target_frame_idx != self.render_frame_idx or self.is_force_update:
+        if self.is_force_update:
             self.is_force_update = False
-            frame = self._read_frame(self.target_frame_idx)
-            if frame is not None:
-                # draw, convert, resize pixmap
-                frame = self.draw_rects(self.target_frame_idx, frame)
-                pixmap = QPixmap(self._ndarray_to_qimage(frame))
-                # self.scale_width = int(min(pixmap.width(), self.screen.width()))
-                # self.scale_height = int(pixmap.height() * (self.scale_width / pixmap.width()))
-                self.scale_width = int(min(pixmap.width(), self.screen.width()))
-                self.scale_height = int(pixmap.height() * (self.scale_width / pixmap.width()))
-                pixmap = pixmap.scaled(self.scale_width / 1.5, self.scale_height / 1.5, Qt.KeepAspectRatio)
-                # pixmap = pixmap.scaled(self.scale_width / scale_factor, self.scale_height / scale_factor, Qt.KeepAspectRatio)
-
-                self.label_frame.setPixmap(pixmap)
-                # self.label_frame.resize(self.scale_width, self.scale_height)
-
-                # sync, update related information
-                self._update_frame_status(self.target_frame_idx)
-                self.render_frame_idx = self.target_frame_idx
-                self.slider_video.setValue(self.render_frame_idx)
-                self.slider_video.repaint()
+            self.navigator.request(self.target_frame_idx)
 
         QTimer.singleShot(1000 / self.video_fps, self._update_frame)
 
+    @pyqtSlot(str, object)
+    def on_frame_decoded(self, video_path: str, decoded):
+        """draw and show a frame decoded by the navigator, unless another frame was asked meanwhile"""
+        if video_path != self.videopath or decoded.frame_idx != self.target_frame_idx:
+            instrument.count(instrument.NAVIGATE_STALE)
+            return
+
+        scale_factor = 1.5
+
+        # draw, convert, resize pixmap
+        frame = self.draw_rects(decoded.frame_idx, decoded.rgb)
+        with timer(instrument.CONVERT):
+            pixmap = QPixmap(self._ndarray_to_qimage(frame))
+        # self.scale_width = int(min(pixmap.width(), self.screen.width()))
+        # self.scale_height = int(pixmap.height() * (self.scale_width / pixmap.width()))
+        self.scale_width = int(min(pixmap.width(), self.screen.width()))
+        self.scale_height = int(pixmap.height() * (self.scale_width / pixmap.width()))
+        with timer(instrument.PAINT):
+            pixmap = pixmap.scaled(self.scale_width / 1.5, self.scale_height / 1.5, Qt.KeepAspectRatio)
+            # pixmap = pixmap.scaled(self.scale_width / scale_factor, self.scale_height / scale_factor, Qt.KeepAspectRatio)
+
+            self.label_frame.setPixmap(pixmap)
+        # self.label_frame.resize(self.scale_width, self.scale_height)
+
+        # sync, update related information
+        self._update_frame_status(decoded.frame_idx)
+        self.render_frame_idx = decoded.frame_idx
+        self.render_frame = decoded.bgr
+        self.slider_video.setValue(self.render_frame_idx)
+        self.slider_video.repaint()
+        instrument.observe(instrument.NAVIGATE, perf_counter_ns() - decoded.request_ns)
+
     def check_available_buttons(self):
         "disable unreacheable slider moving buttons"
         # 3 sec shift buttons
@@ -278,12 +641,15 @@ class VideoApp(VideoAppViewer):
             return frame
         # for record in rest_records:
         for record in self.records:
+            if 'x1' not in record:
+                # imported events have no rectangle to draw
+                continue
             pt1, pt2 = (record['x1'], record['y1']), (record['x2'], record['y2'])
-            print('[draw_rects] Coordinates: (x1, {}), (y1, {}), (x2, {}), (y2, {})'.format(pt1[0], pt1[1], pt2[0],
-                                                                                            pt2[1]))
+            self.logger.debug('draw rect', extra={'fields': {'frame_idx': frame_idx, 'x1': pt1[0], 'y1': pt1[1],
+                                                             'x2': pt2[0], 'y2': pt2[1]}})
 
-            rect = cv2.rectangle(frame, pt1, pt2, self.label_color, self.label_thickness)
-        return rect
+            cv2.rectangle(frame, pt1, pt2, self.label_color, self.label_thickness)
+        return frame
 
     def _update_frame_status(self, frame_idx: int, err: str = ''):
         """update frame status
@@ -301,8 +667,8 @@ class VideoApp(VideoAppViewer):
 
     def _get_records_by_frame_idx(self, frame_idx=None):
         """return specfic records by frame index (default: current frame)"""
-        frame_idx = frame_idx or self.render_frame_idx
-        return list(filter(lambda x: x['frame_idx'] == frame_idx, self.records))
+        frame_idx = self.render_frame_idx if frame_idx is None else frame_idx
+        return self.records.at(frame_idx)
 
     def _get_nrecord_in_current_frame(self):
         """get the number of records in current frame"""
@@ -310,10 +676,13 @@ class VideoApp(VideoAppViewer):
         return len(current_records) if current_records else None
 
     def get_events(self, events_file_path, start_time_min, start_time_sec, end_time_min, end_time_sec):
-        df = pd.read_csv(events_file_path, sep=',')
-        my_events = df.loc[
-            (df['_min'] >= start_time_min) & (df['sec'] >= start_time_sec) & (df['_min'] <= end_time_min) & (
-                    df['sec'] <= end_time_sec)]
+        from .events import EventFeed, match_time_key
+
+        feed = self.event_feeds.get(events_file_path)
+        if feed is None:
+            feed = self.event_feeds[events_file_path] = EventFeed.load(events_file_path)
+        my_events = feed.query(match_time_key(start_time_min, start_time_sec),
+                               match_time_key(end_time_min, end_time_sec))
         self.events_list = my_events
         return my_events
 
@@ -327,58 +696,94 @@ class VideoApp(VideoAppViewer):
             if src_pt1 == pt1 and src_pt2 == pt2:
                 target_record = record
         if target_record:
-            target_row_idx = self.records.index(target_record)
-            self.records.remove(target_record)
+            target_row_idx = self.records.remove(target_record)
             self.remove_record_from_preview(target_row_idx)
 
     @pyqtSlot()
     def cut_videos(self):
-        print("@pyqtSlot() cut_videos")
+        """write the labels and clips index of the table highlights and cut them on the shared cut pool; the
+        labels_info.csv row of a clip to cut is written once its cut succeeded
 
-        frame_to_add = self.video_fps * 30
+        Returns:
+            {list} -- futures of the ffmpeg cuts
+        """
+        self.logger.info('cut videos', extra={'fields': {'video': self.videopath}})
+        from moviepy.video.io.ffmpeg_tools import ffmpeg_extract_subclip
+
+        frame_to_add = int(round(self.media.fps * self.padding_sec))
 
         csv_dir = os.path.dirname(self.videopath) + '/cuts/'
         if not os.path.exists(csv_dir):
             os.makedirs(csv_dir)
 
-        csv_path = csv_dir + 'labels_info.csv'
+        # labels_info.csv only names clips written on disk, virtual clips are ranges of the match
+        csv_path = csv_dir + (VIRTUAL_LABELS_FILE if self.virtual_clips else LABELS_FILE)
         if not os.path.exists(csv_path):
             with open(csv_path, 'w') as writeFile:
                 writer = csv.writer(writeFile)
-                label_info = [
-                    ['video_name', '#_highlight', 'starting_frame', 'goal_frame', 'ending_frame', 'start_celebration',
-                     'starting_time', 'ending_time', 'added_frames_bf', 'fps']]
-                writer.writerows(label_info)
+                writer.writerow(LABEL_COLUMNS)
 
         label_info = []
-        all_rows = self.table_trim.rowCount()
+        clips = []
+        cuts = []
         i = 1
-        for row in range(0, all_rows):
-            i_trim_frame = self.table_trim.item(row, 0)
-            s_trim_frame = self.table_trim.item(row, 1)
-            event_frame = self.table_trim.item(row, 2)
-            celebration = self.table_trim.item(row, 3).text()
-            i_time = self.table_trim.item(row, 4).text()
-            s_time = self.table_trim.item(row, 5).text()
-
-            # decimal values, they take account of the single cutting frame
-            i_trim_sec = (int(i_trim_frame.text()) - frame_to_add)/ self.video_fps
-            s_trim_sec = (int(s_trim_frame.text()) + frame_to_add) / self.video_fps
+        # timing of the file actually cut (the server may decode another copy)
+        cut_media = self.media if self.server is None else probe(self.decode_path)
+        for highlight in self.table_trim.model().rows():
+            i_trim_frame = highlight['init_frame']
+            s_trim_frame = highlight['stop_frame']
 
-            file_name_output = self.videopath.replace('complete', '/cuts/label' + '_' + str(i))
-            if not os.path.exists(file_name_output):
-                ffmpeg_extract_subclip(self.videopath, i_trim_sec, s_trim_sec,
-                                       targetname=file_name_output)
+            # decimal values from the frame pts, they take account of the single cutting frame; ffmpeg_extract_subclip
+            # seeks (-ss before -i) from the container start, not from the first frame
+            i_trim_sec = cut_media.seek_time(i_trim_frame - frame_to_add)
+            s_trim_sec = cut_media.seek_time(s_trim_frame + frame_to_add)
 
-            label_info.append(
-                [file_name_output, i, i_trim_frame.text(), event_frame.text(), s_trim_frame.text(), celebration,
-                 i_time, s_time, frame_to_add, self.video_fps])
+            clips.append(VirtualClip(self.videopath, i_trim_frame, s_trim_frame))
+
+            file_name_output = self.videopath.replace('complete', '/cuts/label' + '_' + str(i))
+            label_row = [self.videopath if self.virtual_clips else file_name_output, i, i_trim_frame,
+                         self._frame_text(highlight['event_frame']), s_trim_frame,
+                         self._frame_text(highlight['celebration_frame']), highlight['init_time'],
+                         highlight['stop_time'], frame_to_add, self.video_fps]
+            if not self.virtual_clips and not os.path.exists(file_name_output):
+                cuts.append(pools.submit('cut', self._cut_clip, ffmpeg_extract_subclip, self.decode_path, i_trim_sec,
+                                         s_trim_sec, file_name_output, csv_path, label_row))
+            else:
+                label_info.append(label_row)
 
             i = i + 1
 
-        with open(csv_path, 'a') as writeFile:
-            writer = csv.writer(writeFile)
-            writer.writerows(label_info)
+        self._append_labels(csv_path, label_info)
+
+        # padding is applied when reading, so the index keeps the bare highlight window
+        append_clip_index(csv_dir + 'clips_index.csv', clips)
+        return cuts
+
+    def _append_labels(self, csv_path: str, label_info: list):
+        with self.labels_lock:
+            with open(csv_path, 'a') as writeFile:
+                writer = csv.writer(writeFile)
+                writer.writerows(label_info)
+
+    def _cut_clip(self, extract_subclip, video_path: str, start_sec: float, end_sec: float, output_path: str,
+                  csv_path: str, label_row: list):
+        try:
+            with timer(instrument.CUT):
+                extract_subclip(video_path, start_sec, end_sec, targetname=output_path)
+        except Exception as err:
+            self.logger.exception('cut of %s failed', output_path)
+            # a partial clip would be taken as done by the next cut
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            self.cut_failed.emit(output_path, str(err))
+            raise
+        self._append_labels(csv_path, [label_row])
+
+    @pyqtSlot(str, str)
+    def on_cut_failed(self, output_path: str, message: str):
+        error_dialog = QErrorMessage(self)
+        error_dialog.showMessage('Error! the cut of {} failed, its label was not written: {}'.format(output_path,
+                                                                                                   message))
 
     @pyqtSlot()
     def inc_frame(self):
@@ -421,27 +826,87 @@ class VideoApp(VideoAppViewer):
     @pyqtSlot()
     def delete_record_from_table(self):
         if self.item_selected is not None:
-            self.table_trim.removeRow(self.item_selected)
+            model = self.table_trim.model()
+            position = model.position(self.item_selected)
+            if model.removeRows(self.item_selected, 1) and self.journal is not None:
+                self.journal.remove_highlight(position)
+            self.item_selected = None
         else:
             error_dialog = QErrorMessage()
             error_dialog.showMessage('No item selected!')
             error_dialog.exec_()
 
+    def _recognize_clock(self, frame_idx: int, frame: np.ndarray, frame_name: str, field: str):
+        """read the match time in the time roi on the shared OCR pool, reusing the last reading if the clock did
+        not change; the text is set in the `field` line edit by on_timestamp_ready, and highlights cannot be added
+        to the table until it arrives
+
+        Arguments:
+            frame_idx {int} -- frame index
+            frame {np.ndarray} -- BGR frame
+            frame_name {str} -- name of the roi crop saved in the ocr_frames_dir folder
+            field {str} -- name of the timestamp line edit
+        """
+        crop = frame[self.y1: self.y2, self.x1: self.x2].copy()
+        output_path = Path(self.ocr_frames_dir) / frame_name
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        cv2.imwrite(str(output_path), crop)
+
+        if self.clock_reader is None and self.server is None:
+            self.clock_reader = configured_clock_reader((self.x1, self.y1, self.x2, self.y2), self.video_fps,
+                                                        self.ocr_config)
+        clock_reader, video_path, roi = self.clock_reader, self.videopath, (self.x1, self.y1, self.x2, self.y2)
+        skip_unchanged = self.ocr_config.get('skip_unchanged', True)
+        # a newer request on the same field makes the reading of this one stale
+        self.pending_clocks[field] = frame_idx
+        self.add_record.setDisabled(True)
+
+        def _read():
+            text = ''
+            try:
+                if self.server is not None:
+                    # the server reads the clock on its own copy of the frame, with its shared OCR
+                    text = self.server.timestamp(video_path, frame_idx, roi, skip_unchanged)
+                else:
+                    text = read_clock(clock_reader, frame_idx, crop, skip_unchanged)
+            except Exception:
+                self.logger.exception('clock recognition of frame %d failed', frame_idx)
+            finally:
+                # always emitted: on_timestamp_ready clears the pending reading, so adding is enabled again;
+                # EAST modes read None when no text box is found
+                self.timestamp_ready.emit(video_path, field, frame_idx, text or '')
+        pools.submit('ocr', _read)
+
+    @pyqtSlot(str, str, int, str)
+    def on_timestamp_ready(self, video_path: str, field: str, frame_idx: int, text: str):
+        if video_path == self.videopath:
+            pending_clocks = self.pending_clocks
+        elif video_path in self.video_states:
+            pending_clocks = self.video_states[video_path]['pending_clocks']
+        else:
+            return
+        if pending_clocks.get(field) != frame_idx:
+            # reading of an older request, finished after the latest one
+            return
+        del pending_clocks[field]
+
+        if video_path == self.videopath:
+            getattr(self, field).setText(text)
+            getattr(self, field).repaint()
+            self.add_record.setDisabled(self.x1 is None or bool(self.pending_clocks))
+        else:
+            # the video is not shown anymore, the reading goes to its saved fields and journal
+            state = self.video_states[video_path]
+            state['fields'][field] = text
+            if state['journal'] is not None:
+                state['journal'].edit_field(field, text)
+
     @pyqtSlot()
     def set_init_trim_value(self):
         frame_selected = self.slider_video.value()
-        ret, frame = self.cap.read()
-        output_path_part = Path('.')
-        output_path = output_path_part / 'OCR_frames' / 'init_frame.jpg'
-        output_path_str = str(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        cv2.imwrite(output_path_str, frame[self.y1: self.y2, self.x1: self.x2])
-        if (self.x1 is not None):
-            recognized_text = recognizer(output_path_str, padding=0.08, x1=self.x1, y1=self.y1, x2=self.x2, y2=self.y2)
-            self.init_timestamp.setText(recognized_text)
-            self.init_timestamp.repaint()
-            # else:
-            # recognizer(output_path_str, padding=0.08)
+        frame = self.render_frame
+        if self.x1 is not None and frame is not None:
+            self._recognize_clock(frame_selected, frame, 'init_frame.jpg', 'init_timestamp')
 
         if len(self.stop_trim_value.text()) > 0 and len(self.select_event_value.text()) > 0:
             if int(self.stop_trim_value.text()) < int(frame_selected) and int(self.select_event_value.text()) > int(
@@ -476,18 +941,10 @@ class VideoApp(VideoAppViewer):
         frame_selected = self.slider_video.value()
         self.status = 'third'
 
-        ret, frame = self.cap.read()
-
-        output_path_part = Path('.')
-        output_path = output_path_part / 'OCR_frames' / 'stop_frame.jpg'
-        output_path_str = str(output_path)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        cv2.imwrite(output_path_str, frame[self.y1: self.y2, self.x1: self.x2])
+        frame = self.render_frame
 
-        if (self.x1 is not None):
-            recognized_text = recognizer(output_path_str, padding=0.08, x1=self.x1, y1=self.y1, x2=self.x2, y2=self.y2)
-            self.stop_timestamp.setText(recognized_text)
-            self.stop_timestamp.repaint()
+        if self.x1 is not None and frame is not None:
+            self._recognize_clock(frame_selected, frame, 'stop_frame.jpg', 'stop_timestamp')
 
         if len(self.init_trim_value.text()) > 0 and len(self.select_event_value.text()) > 0:
             if int(self.init_trim_value.text()) < int(frame_selected) and int(self.select_event_value.text()) < int(
@@ -551,6 +1008,7 @@ class VideoApp(VideoAppViewer):
                     self.select_event_value.setText(str(frame_selected))
                     self.select_event_value.repaint()
 
+        self.focus_hot_window(self.select_event_value.text())
         self.update()
 
     @pyqtSlot()
@@ -592,24 +1050,105 @@ class VideoApp(VideoAppViewer):
 
     @pyqtSlot()
     def select_trim_from_table(self):
-        self.item_selected = self.table_trim.currentRow()
-        print("self.item_selected", self.item_selected)
+        self.item_selected = self.table_trim.currentIndex().row()
+        self.logger.debug('trim selected', extra={'fields': {'row': self.item_selected}})
+        # show the selected highlight, so that proposed candidates can be reviewed quickly
+        model = self.table_trim.model()
+        highlight = model.highlights.row(model.position(self.item_selected))
+        event_frame = highlight['event_frame']
+        self.target_frame_idx = highlight['init_frame'] if event_frame == NO_FRAME else event_frame
+        self.focus_hot_window(self.target_frame_idx)
+
+    @pyqtSlot()
+    def on_event_value_edited(self):
+        self.focus_hot_window(self.select_event_value.text())
+
+    def focus_hot_window(self, frame_idx):
+        """decode in background the window around the event frame (a frame index or its line edit text)"""
+        if not str(frame_idx).strip().isdigit():
+            return
+        if self.server is not None and self._videopath is not None:
+            pools.submit('background', self.server.focus, self._videopath, int(frame_idx))
+        elif self.hot_frames is not None:
+            self.hot_frames.focus(int(frame_idx))
 
     @pyqtSlot()
     def _goto_previous_record(self):
-        rest_records = list(filter(lambda x: x['frame_idx'] < self.render_frame_idx, self.records))
-        if not rest_records:
+        previous_record = self.records.previous(self.render_frame_idx)
+        if previous_record is None:
             QMessageBox.information(self, 'Info', 'no previous record', QMessageBox.Ok)
         else:
-            self.target_frame_idx = rest_records[-1]['frame_idx']
+            self.target_frame_idx = record_frame(previous_record)
 
     @pyqtSlot()
     def _goto_next_record(self):
-        rest_records = list(filter(lambda x: x['frame_idx'] > self.render_frame_idx, self.records))
-        if not rest_records:
+        next_record = self.records.next(self.render_frame_idx)
+        if next_record is None:
             QMessageBox.information(self, 'Info', 'no next record', QMessageBox.Ok)
         else:
-            self.target_frame_idx = rest_records[0]['frame_idx']
+            self.target_frame_idx = record_frame(next_record)
+
+    def build_shot_index(self):
+        """load or build the shot index of the current video in background"""
+        self.shot_index = None
+        self.slider_video.set_markers([])
+        self.btn_previous_shot.setDisabled(True)
+        self.btn_next_shot.setDisabled(True)
+        if not self.shots_config.get('enabled', True) or self.server is not None:
+            # the whole video would be decoded here by the analysis pool, which a thin client does not run
+            return
+        video_path = self.videopath
+
+        def _emit(future):
+            try:
+                self.shots_ready.emit(video_path, future.result())
+            except Exception:
+                self.logger.exception('shot index of %s failed', video_path)
+                self.shot_futures.pop(video_path, None)
+        self._shot_index_future(video_path).add_done_callback(_emit)
+
+    def _shot_index_future(self, video_path: str):
+        """ShotIndex.load of a video on the background pool, segments analyzed by the analysis pool"""
+        future = self.shot_futures.get(video_path)
+        if future is None:
+            index_config = {key: value for key, value in self.shots_config.items() if key != 'enabled'}
+            future = self.shot_futures[video_path] = pools.submit('background', self._load_shot_index, video_path,
+                                                                  **index_config)
+        return future
+
+    def _load_shot_index(self, video_path: str, **index_config):
+        from .shots import ShotIndex
+        # the index is built on the ingested copy, once its remux is over
+        ingest_future = self.ingest_futures.get(video_path)
+        decode_path = ingest_future.result() if ingest_future is not None else self._decode_path(video_path)
+        return ShotIndex.load(decode_path, executor=pools.get('analysis'), **index_config)
+
+    @pyqtSlot(str, object)
+    def on_shots_ready(self, video_path: str, shot_index):
+        if video_path != self.videopath:
+            if video_path in self.video_states:
+                self.video_states[video_path]['shot_index'] = shot_index
+            return
+        self.shot_index = shot_index
+        self.slider_video.set_markers(shot_index.frames)
+        self.btn_previous_shot.setDisabled(False)
+        self.btn_next_shot.setDisabled(False)
+
+    @pyqtSlot()
+    def _goto_previous_shot(self):
+        frame_idx = self.shot_index.previous(self.render_frame_idx) if self.shot_index else None
+        if frame_idx is None:
+            QMessageBox.information(self, 'Info', 'no previous shot cut', QMessageBox.Ok)
+        else:
+            self.target_frame_idx = frame_idx
+
+    @pyqtSlot()
+    def _goto_next_shot(self):
+        frame_idx = self.shot_index.next(self.render_frame_idx) if self.shot_index else None
+        if frame_idx is None:
+            QMessageBox.information(self, 'Info', 'no next shot cut', QMessageBox.Ok)
+        else:
+            self.target_frame_idx = frame_idx
 
     @pyqtSlot()
     def on_slider_released(self):
@@ -640,18 +1179,16 @@ class VideoApp(VideoAppViewer):
             if event.button() == Qt.LeftButton:
                 self.label_frame.is_drawing = True
                 self.label_frame.is_selecting = False
-                self.logger.debug('press mouse at (%d, %d)', event.x(), event.y())
+                self.logger.debug('press mouse', extra={'fields': {'x': event.x(), 'y': event.y()}})
                 self.label_frame.pt1 = (event.x(), event.y())
-                print('event x', event.x())
-                print('event y', event.y())
             elif event.button() == Qt.RightButton:
-                print('right button clicked')
+                self.logger.debug('right button clicked')
 
     @pyqtSlot()
     def event_frame_mouse_move(self, event):
         """drawing rectangle"""
         if self.label_frame.is_drawing:
-            self.logger.debug('move mouse at (%d, %d)', event.x(), event.y())
+            self.logger.debug('move mouse', extra={'fields': {'x': event.x(), 'y': event.y()}})
             self.label_frame.pt2 = (event.x(), event.y())
             self.update()
 
@@ -661,42 +1198,49 @@ class VideoApp(VideoAppViewer):
         scale_factor = 1.5
         if self.label_frame.is_drawing:
             self.label_frame.is_drawing = False
-            self.logger.debug('release mouse at (%d, %d)', event.x(), event.y())
+            self.logger.debug('release mouse', extra={'fields': {'x': event.x(), 'y': event.y()}})
             if self._check_coor_in_frame(event.x(), event.y()):
                 self.label_frame.pt2 = (event.x(), event.y())
 
             pt1, pt2 = self.label_frame.revise_coor(self.label_frame.pt1, self.label_frame.pt2)
-            record = OrderedDict([
-                ('frame_idx', self.render_frame_idx), ('fps', self.video_fps),
-                ('x1', int(pt1[0] * scale_factor)),
-                ('y1', int(pt1[1] * scale_factor)),
-                ('x2', int(pt2[0] * scale_factor)),
-                ('y2', int(pt2[1] * scale_factor))
-            ])
-            self.records.clear()
-            self.records.append(record)
-            self.enable_buttons()
-            self.status = 'second'
-
-            print('Coordinates: (x1, {}), (y1, {}), (x2, {}), (y2, {})'.format(pt1[0], pt1[1], pt2[0], pt2[1]))
-            self.x1 = int(pt1[0] * scale_factor)
-            self.y1 = int(pt1[1] * scale_factor)
-            self.x2 = int(pt2[0] * scale_factor)
-            self.y2 = int(pt2[1] * scale_factor)
-
-            self.is_force_update = True
+            self.logger.info('time roi drawn',
+                             extra={'fields': {'x1': pt1[0], 'y1': pt1[1], 'x2': pt2[0], 'y2': pt2[1]}})
+            roi = dict(frame_idx=self.render_frame_idx,
+                       x1=int(pt1[0] * scale_factor), y1=int(pt1[1] * scale_factor),
+                       x2=int(pt2[0] * scale_factor), y2=int(pt2[1] * scale_factor))
+            self._set_roi(**roi)
+            if self.journal is not None:
+                self.journal.set_roi(roi)
+
+    def _set_roi(self, frame_idx: int, x1: int, y1: int, x2: int, y2: int):
+        """store the time roi drawn by the user (in frame coordinates)"""
+        record = OrderedDict([
+            ('frame_idx', frame_idx), ('fps', self.video_fps),
+            ('x1', x1), ('y1', y1), ('x2', x2), ('y2', y2)
+        ])
+        self.records.clear()
+        self.records.add(record)
+        self.clock_reader = None
+        self.enable_buttons()
+        self.status = 'second'
 
-            self.update()
+        self.x1, self.y1, self.x2, self.y2 = x1, y1, x2, y2
+
+        self.is_force_update = True
+
+        self.update()
 
     @pyqtSlot()
-    def enable_buttons(self):
-        self.init_trim.setDisabled(False)
-        self.select_event.setDisabled(False)
-        self.begin_celebration.setDisabled(False)
-        self.stop_trim.setDisabled(False)
-        self.add_record.setDisabled(False)
-        self.delete_record.setDisabled(False)
-        self.cut_video.setDisabled(False)
+    def enable_buttons(self, enabled: bool = True):
+        """enable the trim buttons, disabled until the time roi of the video is drawn"""
+        self.init_trim.setDisabled(not enabled)
+        self.select_event.setDisabled(not enabled)
+        self.begin_celebration.setDisabled(not enabled)
+        self.stop_trim.setDisabled(not enabled)
+        # a highlight is added with its timestamps, so not while a clock reading is running
+        self.add_record.setDisabled(not enabled or bool(self.pending_clocks))
+        self.delete_record.setDisabled(not enabled)
+        self.cut_video.setDisabled(not enabled)
 
     @pyqtSlot()
     def event_frame_mouse_double_click(self, event):
@@ -711,21 +1255,101 @@ class VideoApp(VideoAppViewer):
             ('left_frames', int(self.table_events_preview_records.item(self.event_selected, 0).text())),
             ('right_frames', self.frame_count - 1)
         ])
-        self.records.append(record)
-        self.records = sorted(self.records, key=lambda x: x['left_frames'])
+        self.records.add(record)
 
         # frame_idx = int(self.table_events_preview_records.item(self.event_selected, 0).text())
         # self.target_frame_idx = frame_idx
 
+    @staticmethod
+    def _frame_value(line_edit):
+        """read a frame index from a line edit, NO_FRAME if it is empty"""
+        text = line_edit.text().strip()
+        return int(text) if text else NO_FRAME
+
+    @staticmethod
+    def _frame_text(frame_idx: int):
+        return '' if frame_idx == NO_FRAME else frame_idx
+
     @pyqtSlot()
     def add_trim_to_table(self):
-        self.table_trim.insertRow(0)
-        self.table_trim.setItem(0, 0, QTableWidgetItem(str(self.init_trim_value.text())))
-        self.table_trim.setItem(0, 1, QTableWidgetItem(str(self.stop_trim_value.text())))
-        self.table_trim.setItem(0, 2, QTableWidgetItem(str(self.select_event_value.text())))
-        self.table_trim.setItem(0, 3, QTableWidgetItem(str(self.begin_celebration_value.text())))
-        self.table_trim.setItem(0, 4, QTableWidgetItem(str(self.init_timestamp.text())))
-        self.table_trim.setItem(0, 5, QTableWidgetItem(str(self.stop_timestamp.text())))
+        if self.pending_clocks:
+            QMessageBox.information(self, 'Info', 'the match time is still being read, add the highlight once it '
+                                    'is shown', QMessageBox.Ok)
+            return
+        model = self.table_trim.model()
+        frames = (self._frame_value(self.init_trim_value), self._frame_value(self.stop_trim_value),
+                  self._frame_value(self.select_event_value), self._frame_value(self.begin_celebration_value))
+        err = model.highlights.validate(*frames)
+        if err:
+            error_dialog = QErrorMessage()
+            error_dialog.showMessage(err)
+            error_dialog.exec_()
+            return
+        self._add_highlight(*frames, init_time=self.init_timestamp.text(), stop_time=self.stop_timestamp.text())
+
+    def _add_highlight(self, *args, **kwargs):
+        """add a highlight to the trim table and to the session journal"""
+        model = self.table_trim.model()
+        model.add_highlight(*args, **kwargs)
+        if self.journal is not None:
+            self.journal.add_highlight(model.highlights.row(len(model.highlights) - 1))
+
+    @pyqtSlot()
+    def propose_highlights(self):
+        """detect highlight candidates from the audio track in background, they are added to the table"""
+        from .audio import detect_highlights
+
+        self.detect_highlights.setDisabled(True)
+        video_path, decode_path, media, server = self.videopath, self.decode_path, self.media, self.server
+        roi = (self.x1, self.y1, self.x2, self.y2) if self.x1 is not None else None
+        ocr_config = self.ocr_config
+        pre_sec = self.audio_config.get('pre_sec', 10)
+        post_sec = self.audio_config.get('post_sec', 10)
+        detect_config = {key: value for key, value in self.audio_config.items() if key not in ('pre_sec', 'post_sec')}
+
+        def _detect():
+            highlights = []
+            try:
+                candidates = detect_highlights(decode_path, **detect_config)
+            except Exception:
+                self.logger.exception('highlight detection on %s failed', video_path)
+                candidates = []
+            # (init frame, stop frame, event frame) of each candidate
+            frames = [(media.frame_at(candidate.start_sec - pre_sec), media.frame_at(candidate.end_sec + post_sec),
+                       media.frame_at(candidate.peak_sec)) for candidate in candidates]
+            texts = [''] * (2 * len(frames))
+            if roi is not None and frames:
+                try:
+                    # the clocks of all the candidates are read together, with batched EAST passes
+                    clock_frames = [frame for init_frame, stop_frame, _ in frames for frame in (init_frame, stop_frame)]
+                    if server is not None:
+                        # thin client: the server decodes the frames and runs the OCR
+                        texts = server.timestamps(video_path, clock_frames, roi)
+                    else:
+                        texts = read_clocks(decode_path, clock_frames, roi, ocr_config)
+                except Exception:
+                    self.logger.exception('clock recognition of the highlight candidates failed')
+            for i, (init_frame, stop_frame, event_frame) in enumerate(frames):
+                highlights.append((init_frame, stop_frame, event_frame, texts[2 * i], texts[2 * i + 1]))
+            self.candidates_ready.emit(video_path, highlights)
+        pools.submit('background', _detect)
+
+    @pyqtSlot(str, list)
+    def add_candidates_to_table(self, video_path: str, candidates: list):
+        """add the (init frame, stop frame, event frame, init time, stop time) of highlight candidates"""
+        self.detect_highlights.setDisabled(False)
+        if video_path != self.videopath:
+            # added when the video is shown again
+            if video_path in self.video_states:
+                self.video_states[video_path]['candidates'].extend(candidates)
+            return
+        added = 0
+        for init_frame, stop_frame, event_frame, init_time, stop_time in candidates:
+            if not self.table_trim.model().highlights.validate(init_frame, stop_frame, event_frame):
+                self._add_highlight(init_frame, stop_frame, event_frame, init_time=init_time, stop_time=stop_time)
+                added += 1
+        QMessageBox.information(self, 'Info', '{} of {} highlight candidates added to the table'.format(
+            added, len(candidates)), QMessageBox.Ok)
 
     def save_file(self):
         """export records to default paths
@@ -743,7 +1367,7 @@ class VideoApp(VideoAppViewer):
             exist_reply = QMessageBox.question(self, 'File Exist', exist_msg, \
                                                QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
         if not Path(self.outpath).exists() or exist_reply == QMessageBox.Yes:
-            df_labels = pd.DataFrame().from_records(self.records)
+            df_labels = pd.DataFrame().from_records(list(self.records))
             df_labels.to_csv(self.outpath, index=False)
 
         # check if the application is going to close
@@ -0,0 +1,128 @@
+"""highlight candidates from the audio track
+
+Goals come with a crowd roar and an excited commentator, so the loudest
+sustained sections of the match audio are good candidates. The audio track
+is decoded by ffmpeg as mono 16 bit pcm and streamed in chunks (a 90 minute
+match is never held in memory at once), short-time features are computed
+with numpy and the sections standing out from the match baseline are
+proposed as candidate windows.
+"""
+import logging
+import subprocess
+from collections import namedtuple
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+# seconds from the beginning of the video, peak is the loudest window of the candidate
+Candidate = namedtuple('Candidate', ['start_sec', 'peak_sec', 'end_sec', 'score'])
+
+
+def ffmpeg_exe():
+    """ffmpeg binary shipped with imageio (moviepy dependency), or the one on the PATH"""
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except ImportError:
+        return 'ffmpeg'
+
+
+def stream_audio(video_path: str, sample_rate: int = 8000, chunk_sec: float = 30.0):
+    """yield the audio track as float32 mono chunks in [-1, 1]"""
+    command = [ffmpeg_exe(), '-v', 'error', '-i', video_path, '-vn', '-ac', '1', '-ar', str(sample_rate),
+               '-f', 's16le', '-']
+    chunk_bytes = 2 * int(sample_rate * chunk_sec)
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data[:len(data) - len(data) % 2], dtype=np.int16).astype(np.float32) / 32768.0
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+def short_time_features(chunks, sample_rate: int = 8000, window_sec: float = 0.5,
+                        band: tuple = (300.0, 3000.0)):
+    """energy (dB) and crowd-band energy ratio of consecutive non overlapping windows
+
+    Arguments:
+        chunks {iterable} -- float32 audio chunks as yielded by stream_audio
+
+    Returns:
+        {tuple} -- (energy_db, band_ratio) float32 arrays with one value per window
+    """
+    window = int(sample_rate * window_sec)
+    freqs = np.fft.rfftfreq(window, 1.0 / sample_rate)
+    in_band = (freqs >= band[0]) & (freqs <= band[1])
+    energies, ratios = [], []
+    rest = np.zeros(0, dtype=np.float32)
+    for chunk in chunks:
+        samples = np.concatenate([rest, chunk])
+        nwindows = len(samples) // window
+        rest = samples[nwindows * window:]
+        if not nwindows:
+            continue
+        frames = samples[:nwindows * window].reshape(nwindows, window)
+        energies.append(10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10))
+        spectrum = np.abs(np.fft.rfft(frames, axis=1)) ** 2
+        ratios.append(spectrum[:, in_band].sum(axis=1) / (spectrum.sum(axis=1) + 1e-10))
+    if not energies:
+        return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32)
+    return np.concatenate(energies).astype(np.float32), np.concatenate(ratios).astype(np.float32)
+
+
+def propose_candidates(energy_db: np.ndarray, band_ratio: np.ndarray, window_sec: float = 0.5,
+                       smooth_sec: float = 3.0, threshold_mad: float = 3.0, min_duration_sec: float = 2.0,
+                       merge_gap_sec: float = 5.0, max_candidates: int = 30):
+    """sections where the smoothed crowd-noise score stands out from the match baseline
+
+    The score is the loudness above the match median (dB, never negative)
+    weighted by the crowd band ratio, smoothed over `smooth_sec`; sections above median + `threshold_mad` * MAD lasting at
+    least `min_duration_sec` are kept, the ones closer than `merge_gap_sec`
+    are merged, and the `max_candidates` with the highest peak are returned
+    in time order.
+    """
+    if not len(energy_db):
+        return []
+    # energy_db is dBFS (<= 0): the weighted value has to be a non negative loudness, or a stronger crowd band
+    # would lower the score
+    loudness = np.maximum(energy_db - np.median(energy_db), 0.0)
+    score = loudness * (0.5 + band_ratio)
+    smooth = max(1, int(round(smooth_sec / window_sec)))
+    score = np.convolve(score, np.ones(smooth) / smooth, mode='same')
+    median = np.median(score)
+    mad = np.median(np.abs(score - median)) + 1e-6
+    above = score > median + threshold_mad * mad
+
+    # rising/falling edges of the above-threshold runs
+    edges = np.diff(np.concatenate([[0], above.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    runs = []
+    for start, end in zip(starts, ends):
+        if runs and (start - runs[-1][1]) * window_sec <= merge_gap_sec:
+            runs[-1][1] = end
+        else:
+            runs.append([start, end])
+    runs = [(start, end) for start, end in runs if (end - start) * window_sec >= min_duration_sec]
+
+    candidates = []
+    for start, end in runs:
+        peak = start + int(np.argmax(score[start:end]))
+        candidates.append(Candidate(start * window_sec, peak * window_sec, end * window_sec,
+                                    float((score[peak] - median) / mad)))
+    candidates = sorted(candidates, key=lambda candidate: candidate.score, reverse=True)[:max_candidates]
+    return sorted(candidates, key=lambda candidate: candidate.start_sec)
+
+
+def detect_highlights(video_path: str, sample_rate: int = 8000, window_sec: float = 0.5, **kwargs):
+    """stream the audio of a video and propose highlight candidates (see propose_candidates)"""
+    energy_db, band_ratio = short_time_features(stream_audio(video_path, sample_rate), sample_rate, window_sec)
+    candidates = propose_candidates(energy_db, band_ratio, window_sec, **kwargs)
+    LOGGER.info('%d highlight candidates from %.0f s of audio of %s', len(candidates),
+                len(energy_db) * window_sec, video_path)
+    return candidates
@@ -0,0 +1,196 @@
+"""virtual clips: highlight windows addressed inside the original match video
+
+A virtual clip is just a (source, start, end) entry stored in an index file
+next to the `cuts` folder. The padding around the highlight is applied only
+when the clip is read, so changing the context window does not require
+re-cutting anything on disk. With `virtual_clips: True` the labels are
+written to cuts/virtual_labels_info.csv, naming the match instead of a cut;
+`export_virtual_clips` materializes them with any padding as regular cuts
+listed in cuts/labels_info.csv.
+
+    python -m src.clips /path/to/matches --padding-sec 10
+"""
+import argparse
+import csv
+import logging
+import os
+from collections import namedtuple
+from pathlib import Path
+
+from .probe import probe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+CLIP_INDEX_HEADER = ['source', 'start_frame', 'end_frame']
+
+VirtualClip = namedtuple('VirtualClip', CLIP_INDEX_HEADER)
+
+
+def load_clip_index(index_path: str):
+    """read all the virtual clips stored in an index file
+
+    Arguments:
+        index_path {str} -- path of the csv index file
+
+    Returns:
+        {list} -- list of VirtualClip, empty if the index does not exist
+    """
+    if not Path(index_path).exists():
+        return []
+    with open(index_path, 'r', newline='') as read_file:
+        reader = csv.DictReader(read_file)
+        return [VirtualClip(row['source'], int(row['start_frame']), int(row['end_frame'])) for row in reader]
+
+
+def append_clip_index(index_path: str, clips: list):
+    """append virtual clips to an index file, skipping the ones already stored
+
+    Arguments:
+        index_path {str} -- path of the csv index file
+        clips {list} -- list of VirtualClip to be stored
+
+    Returns:
+        {list} -- the clips actually written
+    """
+    known = set(load_clip_index(index_path))
+    new_clips = [clip for clip in clips if clip not in known]
+    write_header = not Path(index_path).exists()
+    with open(index_path, 'a', newline='') as write_file:
+        writer = csv.writer(write_file)
+        if write_header:
+            writer.writerow(CLIP_INDEX_HEADER)
+        writer.writerows(new_clips)
+    return new_clips
+
+
+class ClipReader:
+    """frame accurate reader serving padded windows straight from the source video
+
+    The capture is positioned once on the first frame of the window (the
+    backend jumps to the closest keyframe and decodes forward from there),
+    then the remaining frames are read sequentially without further seeks.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.cap = cv2.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError('cannot open video {}'.format(source))
+        media = probe(source)
+        self.frame_count = media.frame_count
+        self.fps = float(media.fps)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.cap.release()
+
+    def window(self, clip: VirtualClip, padding_frames: int = 0):
+        """clamp the padded clip window to the video boundaries
+
+        Arguments:
+            clip {VirtualClip} -- clip to be read
+            padding_frames {int} -- frames added before the start and after the end
+
+        Returns:
+            {tuple} -- (first frame, last frame) both included
+        """
+        first = max(0, clip.start_frame - padding_frames)
+        last = min(self.frame_count - 1, clip.end_frame + padding_frames)
+        return first, last
+
+    def frames(self, clip: VirtualClip, padding_frames: int = 0):
+        """yield (frame_idx, BGR frame) for every frame of the padded window"""
+        first, last = self.window(clip, padding_frames)
+        self.cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+        for frame_idx in range(first, last + 1):
+            read_success, frame = self.cap.read()
+            if not read_success:
+                LOGGER.warning('read #%d frame of %s failed', frame_idx, self.source)
+                return
+            yield frame_idx, frame
+
+    def export(self, clip: VirtualClip, padding_frames: int, target: str):
+        """materialize a padded virtual clip into a standalone video file"""
+        first, last = self.window(clip, padding_frames)
+        frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        writer = cv2.VideoWriter(target, cv2.VideoWriter_fourcc(*'mp4v'), self.fps, (frame_width, frame_height))
+        try:
+            for _, frame in self.frames(clip, padding_frames):
+                writer.write(frame)
+        finally:
+            writer.release()
+        return first, last
+
+
+def export_virtual_clips(csv_path: str, padding_sec: float, target_dir: str = None):
+    """write the padded clips of a virtual_labels_info.csv and append their labels to the labels_info.csv of the
+    target folder
+
+    Keyword Arguments:
+        target_dir {str} -- folder of the clips (default: {None, the folder of the csv, i.e. the cuts folder})
+
+    Returns:
+        {list} -- paths of the written clips
+    """
+    from .labels import LABEL_COLUMNS, LABELS_FILE, NO_FRAME, read_labels
+
+    target_dir = Path(target_dir or os.path.dirname(os.path.abspath(csv_path)))
+    target_dir.mkdir(parents=True, exist_ok=True)
+    labels_path = target_dir / LABELS_FILE
+    readers = {}
+    written = []
+    try:
+        for row in read_labels(csv_path):
+            source = row['video_name']
+            reader = readers.get(source)
+            if reader is None:
+                reader = readers[source] = ClipReader(source)
+            padding_frames = int(round(row['fps'] * padding_sec))
+            # named like the cuts of VideoApp.cut_videos
+            name = Path(source).name
+            label_name = 'label_{}'.format(row['#_highlight'])
+            name = name.replace('complete', label_name, 1) if 'complete' in name else label_name + '_' + name
+            target = str(target_dir / name)
+            reader.export(VirtualClip(source, row['starting_frame'], row['ending_frame']), padding_frames, target)
+            write_header = not labels_path.exists()
+            with open(str(labels_path), 'a', newline='') as write_file:
+                writer = csv.writer(write_file)
+                if write_header:
+                    writer.writerow(LABEL_COLUMNS)
+                values = dict(row, video_name=target, added_frames_bf=padding_frames)
+                writer.writerow(['' if column in ('goal_frame', 'start_celebration') and values[column] == NO_FRAME
+                                 else values[column] for column in LABEL_COLUMNS])
+            written.append(target)
+    finally:
+        for reader in readers.values():
+            reader.close()
+    LOGGER.info('%d clips exported from %s', len(written), csv_path)
+    return written
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='write the clips of the virtual labels with a given padding')
+    parser.add_argument('roots', nargs='+', help='folders searched for cuts/virtual_labels_info.csv')
+    parser.add_argument('--padding-sec', dest='padding_sec', type=float, required=True,
+                        help='seconds added before and after each highlight')
+    return parser
+
+
+if __name__ == '__main__':
+    from .labels import VIRTUAL_LABELS_FILE
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)8s] %(message)s')
+    args = argparser().parse_args()
+    for root in args.roots:
+        for path in sorted(Path(root).rglob(VIRTUAL_LABELS_FILE)):
+            if path.parent.name == 'cuts':
+                export_virtual_clips(str(path), args.padding_sec)
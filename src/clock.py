@@ -0,0 +1,217 @@
+"""scoreboard clock reading with change detection
+
+The clock digits change once per second, while OCR is requested far more
+often (every frame of a batch extraction, or repeatedly around the same
+event while labeling). `ClockChangeDetector` keeps a cheap signature of the
+clock roi (downscaled gray pixels and their edges) and tells when the digits
+actually changed; `ClockReader` runs OCR only in that case and otherwise
+reuses the previous reading, interpolating the sub-second part from the
+frame distance to the last change.
+"""
+import logging
+import threading
+from collections import namedtuple
+from functools import partial
+
+import numpy as np
+
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+# text as read on the scoreboard, seconds since kick-off (None if unreadable)
+# with interpolated fraction, frame of the reading, whether OCR actually ran
+ClockReading = namedtuple('ClockReading', ['text', 'seconds', 'frame_idx', 'is_ocr'])
+
+
+def parse_clock(text: str):
+    """seconds of a MM:SS clock text, None if the text is not a clock"""
+    if not text:
+        return None
+    digits = ''.join(c for c in text if c.isdigit() or c == ':').strip(':')
+    minutes, sep, seconds = digits.rpartition(':')
+    if not sep or not minutes.isdigit() or not seconds.isdigit() or len(seconds) != 2:
+        return None
+    return int(minutes) * 60 + int(seconds)
+
+
+def binarize_clock(image: np.ndarray, min_height: int = 48):
+    """upscale a clock crop to at least `min_height` and binarize it as dark digits on white"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    if gray.shape[0] < min_height:
+        scale = min_height / float(gray.shape[0])
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    # scoreboards usually have light digits on a dark box: the majority of pixels is the background
+    if np.count_nonzero(binary) < binary.size / 2:
+        binary = cv2.bitwise_not(binary)
+    # white border, tesseract does not like glyphs touching the image edges
+    return cv2.copyMakeBorder(binary, 8, 8, 8, 8, cv2.BORDER_CONSTANT, value=255)
+
+
+def format_clock(seconds: float):
+    seconds = int(seconds)
+    return '{:02d}:{:02d}'.format(seconds // 60, seconds % 60)
+
+
+class ClockChangeDetector:
+    def __init__(self, size: tuple = (96, 24), pixel_threshold: float = 0.04, edge_threshold: float = 0.02):
+        """
+        Keyword Arguments:
+            size {tuple} -- (width, height) the roi is downscaled to (default: {(96, 24)})
+            pixel_threshold {float} -- mean absolute gray difference, in [0, 1], meaning a change (default: {0.04})
+            edge_threshold {float} -- fraction of flipped edge pixels meaning a change (default: {0.02})
+        """
+        self.size = tuple(size)
+        self.pixel_threshold = pixel_threshold
+        self.edge_threshold = edge_threshold
+        self.reference = None
+
+    def signature(self, crop: np.ndarray):
+        """(gray, edges) of the downscaled roi"""
+        gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+        gray = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        edges = cv2.Canny(gray, 50, 150) > 0
+        return gray, edges
+
+    def has_changed(self, signature):
+        """compare a signature with the reference one (always changed without reference)"""
+        if self.reference is None:
+            return True
+        gray, edges = signature
+        ref_gray, ref_edges = self.reference
+        pixel_diff = np.mean(cv2.absdiff(gray, ref_gray)) / 255.0
+        edge_diff = np.count_nonzero(edges != ref_edges) / edges.size
+        return pixel_diff > self.pixel_threshold or edge_diff > self.edge_threshold
+
+    def reset(self, signature=None):
+        self.reference = signature
+
+
+class ClockReader:
+    def __init__(self, ocr, fps: float, detector: ClockChangeDetector = None):
+        """
+        Arguments:
+            ocr {callable} -- crop (BGR np.ndarray) -> recognized text
+            fps {float} -- video frame rate, used to interpolate within a second
+        """
+        self.ocr = ocr
+        self.fps = fps
+        self.detector = detector or ClockChangeDetector()
+        self.last = None
+        # first frame on which the last read digits were seen
+        self.change_frame_idx = None
+        self.nocr = self.nreused = 0
+        # readings may be requested from several OCR worker threads
+        self.lock = threading.Lock()
+
+    def read(self, frame_idx: int, crop: np.ndarray):
+        """read the clock in a roi crop, running OCR only if the digits changed
+
+        Returns:
+            {ClockReading} -- reading of the given frame
+        """
+        with self.lock:
+            return self._read(frame_idx, crop)
+
+    def _read(self, frame_idx: int, crop: np.ndarray):
+        signature = self.detector.signature(crop)
+        if self.last is not None and self.last.seconds is not None and not self.detector.has_changed(signature):
+            self.nreused += 1
+            if frame_idx < self.change_frame_idx:
+                self.change_frame_idx = frame_idx
+            fraction = min((frame_idx - self.change_frame_idx) / self.fps, 1 - 1 / self.fps)
+            return ClockReading(self.last.text, int(self.last.seconds) + fraction, frame_idx, False)
+
+        self.nocr += 1
+        text = self.ocr(crop)
+        self.last = ClockReading(text, parse_clock(text), frame_idx, True)
+        self.change_frame_idx = frame_idx
+        # an unreadable clock is not kept as reference, so the next request runs OCR again
+        self.detector.reset(signature if self.last.seconds is not None else None)
+        return self.last
+
+
+def index_clock(video_path: str, roi: tuple, ocr, step: int = 1, detector: ClockChangeDetector = None):
+    """yield a ClockReading every `step` frames of a video
+
+    Arguments:
+        video_path {str} -- match video
+        roi {tuple} -- (x1, y1, x2, y2) of the scoreboard clock
+        ocr {callable} -- crop (BGR np.ndarray) -> recognized text
+    """
+    from .decode import iter_frames, video_geometry
+
+    reader = ClockReader(ocr, video_geometry(video_path)[0], detector)
+    try:
+        # only the roi pixels are decoded into python
+        for frame_idx, crop in iter_frames(video_path, crop=roi, step=step):
+            yield reader.read(frame_idx, crop)
+    finally:
+        LOGGER.info('clock index of %s: %d OCR runs, %d readings reused', video_path, reader.nocr, reader.nreused)
+
+
+def configure_ocr(ocr_config: dict):
+    """process-wide settings of the `ocr` config section, applied once when the app or the server starts"""
+    if ocr_config.get('dnn_threads'):
+        # the thread pool of every OpenCV call of the process, not only of the EAST passes
+        cv2.setNumThreads(int(ocr_config['dnn_threads']))
+
+
+def _recognizer_kwargs(roi: tuple, ocr_config: dict):
+    x1, y1, x2, y2 = roi
+    return dict(padding=0.08, x1=x1, y1=y1, x2=x2, y2=y2,
+                mode=ocr_config.get('mode', 'fixed_roi'),
+                east_fallback=ocr_config.get('east_fallback', False),
+                batch_size=ocr_config.get('east_batch_size', 8),
+                input_size=ocr_config.get('east_input_size', 'fixed'),
+                text_height=ocr_config.get('east_text_height', 32))
+
+
+def recognize_roi(crop: np.ndarray, roi: tuple, ocr_config: dict):
+    """text of a time roi crop ('' if unreadable), roi is the (x1, y1, x2, y2) it was cut from, recognizer set by the
+    `ocr` config"""
+    from .text_recognition import recognizer
+    # EAST modes return None when no text is detected
+    return recognizer(crop, **_recognizer_kwargs(roi, ocr_config)) or ''
+
+
+def read_clocks(video_path: str, frames: list, roi: tuple, ocr_config: dict):
+    """text of the clock at some frames of a video, recognized together so that EAST passes are batched
+
+    Returns:
+        {list} -- text of each frame, '' when it could not be decoded or read
+    """
+    from .decode import iter_frames
+    from .text_recognition import recognizer_batch
+
+    crops = {}
+    for frame_idx in sorted(set(frames)):
+        for _, crop in iter_frames(video_path, crop=roi, start_frame=frame_idx, end_frame=frame_idx + 1):
+            crops[frame_idx] = crop
+    decoded = list(crops)
+    texts = dict(zip(decoded, recognizer_batch([crops[frame_idx] for frame_idx in decoded],
+                                               **_recognizer_kwargs(roi, ocr_config))))
+    return [(texts.get(frame_idx) or '').strip() for frame_idx in frames]
+
+
+def configured_clock_reader(roi: tuple, fps: float, ocr_config: dict):
+    """ClockReader of a time roi with the template OCR and change detection of the `ocr` config section"""
+    from .digits import TemplateClockOCR
+    ocr = partial(recognize_roi, roi=roi, ocr_config=ocr_config)
+    if ocr_config.get('templates', True):
+        ocr = TemplateClockOCR(ocr, min_readings=ocr_config.get('template_min_readings', 5),
+                               min_confidence=ocr_config.get('template_min_confidence', 0.8))
+    detector = ClockChangeDetector(pixel_threshold=ocr_config.get('pixel_threshold', 0.04),
+                                   edge_threshold=ocr_config.get('edge_threshold', 0.02))
+    return ClockReader(ocr, fps, detector)
+
+
+def read_clock(clock_reader: ClockReader, frame_idx: int, crop: np.ndarray, skip_unchanged: bool = True):
+    """text of the clock in a roi crop, OCR always runs unless `skip_unchanged`"""
+    if skip_unchanged:
+        return clock_reader.read(frame_idx, crop).text
+    with clock_reader.lock:
+        return clock_reader.ocr(crop)
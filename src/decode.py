@@ -0,0 +1,174 @@
+"""reduced decoding for analysis passes
+
+Analysis jobs (shot index, clock indexing, detectors) rarely need full
+resolution color frames. `iter_frames` asks ffmpeg to crop, downscale and
+convert to gray inside the decoder process, keeps only every Nth frame or
+skips non-keyframes without even decoding them, and streams raw frames
+through a pipe; only the requested pixels ever reach Python. OpenCV is used
+as a fallback when no ffmpeg binary is available.
+"""
+import logging
+import re
+import subprocess
+import threading
+from collections import deque
+
+import numpy as np
+
+from .audio import ffmpeg_exe
+from .probe import probe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+_PTS_TIME = re.compile(r'pts_time:\s*([0-9.]+)')
+
+
+def video_geometry(video_path: str):
+    """(fps, frame_count, width, height) of a video"""
+    media = probe(video_path)
+    return float(media.fps), media.frame_count, media.width, media.height
+
+
+def output_size(width: int, height: int, size: tuple = None, scale: float = None):
+    """(width, height) of the analysis frames, even sizes as required by most scalers"""
+    if size:
+        return tuple(size)
+    if scale:
+        return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+    return width, height
+
+
+def iter_frames(video_path: str, size: tuple = None, scale: float = None, gray: bool = False, step: int = 1,
+                keyframes_only: bool = False, crop: tuple = None, start_frame: int = 0, end_frame: int = None,
+                backend: str = 'ffmpeg', i420: bool = False):
+    """yield (frame_idx, frame) for the analysis frames of a video
+
+    Keyword Arguments:
+        size {tuple} -- (width, height) of the output frames (default: {None})
+        scale {float} -- output size as a fraction of the (cropped) input size, if size is not given (default: {None})
+        gray {bool} -- single channel frames instead of BGR (default: {False})
+        step {int} -- keep one frame every `step` frames (default: {1})
+        keyframes_only {bool} -- only decode keyframes, step is then ignored (default: {False})
+        crop {tuple} -- (x1, y1, x2, y2) region cropped before scaling (default: {None})
+        start_frame {int} -- first frame (default: {0})
+        end_frame {int} -- frame where to stop, excluded (default: {None, the end of the video})
+        backend {str} -- 'ffmpeg' or 'opencv' (default: {'ffmpeg'})
+        i420 {bool} -- planar YUV 4:2:0 frames of shape (height * 3 / 2, width), half the size of BGR; the size
+            must be even (default: {False})
+    """
+    media = probe(video_path)
+    width, height = media.width, media.height
+    end_frame = media.frame_count if end_frame is None else min(end_frame, media.frame_count)
+    if crop:
+        x1, y1, x2, y2 = crop
+        width, height = x2 - x1, y2 - y1
+    out_width, out_height = output_size(width, height, size, scale)
+    pix_fmt = 'gray' if gray else 'yuv420p' if i420 else 'bgr24'
+    if backend == 'ffmpeg':
+        try:
+            yield from _iter_ffmpeg(video_path, media, (out_width, out_height), pix_fmt, step, keyframes_only, crop,
+                                    start_frame, end_frame)
+            return
+        except FileNotFoundError:
+            LOGGER.warning('ffmpeg not found, analysis frames decoded with opencv')
+    yield from _iter_opencv(video_path, (out_width, out_height), pix_fmt, step, keyframes_only, crop,
+                            start_frame, end_frame)
+
+
+def _frame_shape(size, pix_fmt):
+    if pix_fmt == 'gray':
+        return size[1], size[0]
+    if pix_fmt == 'yuv420p':
+        return size[1] * 3 // 2, size[0]
+    return size[1], size[0], 3
+
+
+def _iter_ffmpeg(video_path, media, size, pix_fmt, step, keyframes_only, crop, start_frame, end_frame):
+    filters = []
+    if crop:
+        x1, y1, x2, y2 = crop
+        filters.append('crop={}:{}:{}:{}'.format(x2 - x1, y2 - y1, x1, y1))
+    if step > 1 and not keyframes_only:
+        filters.append('select=not(mod(n\\,{}))'.format(step))
+    filters.append('scale={}:{}'.format(*size))
+    if keyframes_only:
+        # the frame index of a keyframe is only known from its timestamp
+        filters.append('showinfo')
+
+    command = [ffmpeg_exe(), '-v', 'info' if keyframes_only else 'error', '-nostats']
+    if keyframes_only:
+        command += ['-skip_frame', 'nokey']
+    if start_frame:
+        command += ['-ss', '{:.6f}'.format(media.seek_time(start_frame))]
+    command += ['-i', video_path, '-an', '-vf', ','.join(filters), '-vsync', '0',
+                '-f', 'rawvideo', '-pix_fmt', pix_fmt, '-']
+    shape = _frame_shape(size, pix_fmt)
+    frame_bytes = int(np.prod(shape))
+
+    process = subprocess.Popen(command, stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE if keyframes_only else subprocess.DEVNULL)
+    timestamps = deque()
+    # output timestamps count from the seek point, or from the container start without a seek
+    start_time = media.frame_time(start_frame) if start_frame else -media.start_offset
+    if keyframes_only:
+        def _read_showinfo():
+            for line in process.stderr:
+                match = _PTS_TIME.search(line.decode('utf-8', 'replace'))
+                if match:
+                    timestamps.append(float(match.group(1)))
+        stderr_reader = threading.Thread(target=_read_showinfo, name='showinfo', daemon=True)
+        stderr_reader.start()
+
+    try:
+        count = 0
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            if keyframes_only:
+                # showinfo logs the frame before it is written to the pipe
+                while not timestamps and stderr_reader.is_alive():
+                    stderr_reader.join(0.001)
+                # output timestamps restart from the seek point, the frame is found from the probed pts
+                frame_idx = media.frame_at(start_time + timestamps.popleft()) if timestamps else None
+            else:
+                frame_idx = start_frame + count * step
+            if frame_idx is not None and frame_idx >= end_frame:
+                break
+            count += 1
+            yield frame_idx, np.frombuffer(data, dtype=np.uint8).reshape(shape)
+    finally:
+        process.stdout.close()
+        process.kill()
+        process.wait()
+
+
+def _iter_opencv(video_path, size, pix_fmt, step, keyframes_only, crop, start_frame, end_frame):
+    if keyframes_only:
+        LOGGER.warning('keyframe only decoding is not available with opencv, all frames are decoded')
+    cap = cv2.VideoCapture(video_path)
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start_frame)
+    try:
+        for frame_idx in range(start_frame, end_frame, step):
+            read_success, frame = cap.read()
+            if not read_success:
+                break
+            if crop:
+                x1, y1, x2, y2 = crop
+                frame = frame[y1:y2, x1:x2]
+            if (frame.shape[1], frame.shape[0]) != tuple(size):
+                frame = cv2.resize(frame, tuple(size), interpolation=cv2.INTER_AREA)
+            if pix_fmt == 'gray':
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            elif pix_fmt == 'yuv420p':
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420)
+            yield frame_idx, frame
+            # skipped frames are only demuxed and decoded, never converted
+            for _ in range(step - 1):
+                if not cap.grab():
+                    return
+    finally:
+        cap.release()
@@ -0,0 +1,138 @@
+"""template matching recognizer of broadcast clock digits
+
+A broadcast uses the same font for the whole match. The first readings
+confirmed by tesseract (texts parsing as MM:SS) are split into glyphs and
+averaged into one template per digit; from then on the clock is read by
+correlating all the glyphs against all the templates with a single matrix
+product, and tesseract is only called again when the match is not confident.
+"""
+import logging
+
+import numpy as np
+
+from .clock import binarize_clock, parse_clock
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+# (width, height) glyphs are normalized to
+GLYPH_SIZE = (12, 20)
+
+
+def segment_glyphs(binary: np.ndarray, min_height_ratio: float = 0.6):
+    """split a binarized clock (dark digits on white) into digit glyphs, left to right
+
+    Components overlapping horizontally are merged (broken strokes), and
+    components much shorter than the tallest one (colon dots, noise) are dropped.
+    """
+    foreground = (binary == 0).astype(np.uint8)
+    ncomponents, _, stats, _ = cv2.connectedComponentsWithStats(foreground, connectivity=8)
+    boxes = sorted([list(stat[:4]) for stat in stats[1:ncomponents]], key=lambda box: box[0])
+    merged = []
+    for x, y, w, h in boxes:
+        if merged and x < merged[-1][0] + merged[-1][2]:
+            px, py, pw, ph = merged[-1]
+            nx, ny = min(px, x), min(py, y)
+            merged[-1] = [nx, ny, max(px + pw, x + w) - nx, max(py + ph, y + h) - ny]
+        else:
+            merged.append([x, y, w, h])
+    if not merged:
+        return []
+    max_height = max(box[3] for box in merged)
+    return [foreground[y:y + h, x:x + w] for x, y, w, h in merged if h >= min_height_ratio * max_height]
+
+
+def glyph_vectors(glyphs: list):
+    """(n, D) matrix of zero mean, unit norm glyph vectors"""
+    vectors = np.stack([cv2.resize(glyph.astype(np.float32), GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+                        for glyph in glyphs])
+    vectors -= vectors.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-6)
+
+
+class DigitTemplates:
+    def __init__(self):
+        dimension = GLYPH_SIZE[0] * GLYPH_SIZE[1]
+        self.sums = np.zeros((10, dimension), dtype=np.float32)
+        self.counts = np.zeros(10, dtype=np.int64)
+        self.nreadings = 0
+        self._templates = None
+
+    def learn(self, image: np.ndarray, text: str):
+        """add the glyphs of a confirmed clock reading to the templates
+
+        Returns:
+            {bool} -- False if the glyphs do not match the digits of the text
+        """
+        digits = [int(c) for c in text if c.isdigit()]
+        glyphs = segment_glyphs(binarize_clock(image))
+        if not digits or len(glyphs) != len(digits):
+            return False
+        np.add.at(self.sums, digits, glyph_vectors(glyphs))
+        np.add.at(self.counts, digits, 1)
+        self.nreadings += 1
+        self._templates = None
+        return True
+
+    @property
+    def templates(self):
+        """(k, D) normalized templates of the k learned digits, and their digit values"""
+        if self._templates is None:
+            known = np.flatnonzero(self.counts)
+            templates = self.sums[known] / self.counts[known, None]
+            templates -= templates.mean(axis=1, keepdims=True)
+            templates /= np.maximum(np.linalg.norm(templates, axis=1, keepdims=True), 1e-6)
+            self._templates = (templates, known)
+        return self._templates
+
+    def recognize(self, image: np.ndarray):
+        """read a clock crop
+
+        Returns:
+            {tuple} -- (MM:SS text, confidence as the lowest glyph correlation), ('', 0.) if unreadable
+        """
+        glyphs = segment_glyphs(binarize_clock(image))
+        templates, known = self.templates
+        if len(glyphs) < 3 or not len(known):
+            return '', 0.0
+        scores = glyph_vectors(glyphs) @ templates.T
+        best = scores.argmax(axis=1)
+        confidence = float(scores[np.arange(len(glyphs)), best].min())
+        digits = ''.join(str(digit) for digit in known[best])
+        return '{}:{}'.format(digits[:-2], digits[-2:]), confidence
+
+
+class TemplateClockOCR:
+    """clock OCR callable reading with digit templates, falling back to a slower OCR"""
+
+    def __init__(self, fallback, min_readings: int = 5, min_confidence: float = 0.8):
+        """
+        Arguments:
+            fallback {callable} -- crop -> text, used to learn the templates and when unsure
+
+        Keyword Arguments:
+            min_readings {int} -- confirmed readings learned before using the templates (default: {5})
+            min_confidence {float} -- lowest glyph correlation accepted (default: {0.8})
+        """
+        self.fallback = fallback
+        self.min_readings = min_readings
+        self.min_confidence = min_confidence
+        self.templates = DigitTemplates()
+        self.nfallback = self.ntemplate = 0
+
+    def __call__(self, crop: np.ndarray):
+        if self.templates.nreadings >= self.min_readings:
+            text, confidence = self.templates.recognize(crop)
+            if confidence >= self.min_confidence and parse_clock(text) is not None:
+                self.ntemplate += 1
+                return text
+            LOGGER.debug('template reading %r not confident (%.2f), fallback OCR', text, confidence)
+
+        self.nfallback += 1
+        text = self.fallback(crop)
+        if parse_clock(text) is not None:
+            self.templates.learn(crop, text)
+        return text
@@ -0,0 +1,103 @@
+"""event feed: match events indexed by match time
+
+The feed csv is parsed only once. Match time (`_min`, `sec`) is turned into
+a single integer key in seconds, the rows are sorted by that key and the
+result is cached next to the csv as a numpy archive, so the next loads skip
+csv parsing and every time range query is a binary search. Text columns are
+stored as strings with a mask of their missing cells, so a cached load gives
+the same frame, NaN included, as parsing the csv.
+"""
+import logging
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.events.npz'
+# caches saved with another version are rebuilt from the csv
+CACHE_VERSION = 2
+KEY_COLUMN = 'match_sec'
+# archive entries which are not columns of the feed
+VERSION_ENTRY = '__version__'
+MISSING_PREFIX = '__missing__'
+
+
+def match_time_key(minutes, seconds):
+    """single sortable key (seconds since kick-off) for a match time"""
+    return minutes * 60 + seconds
+
+
+class EventFeed:
+    def __init__(self, frame: pd.DataFrame):
+        """
+        Arguments:
+            frame {pd.DataFrame} -- events sorted by `match_sec`
+        """
+        self.frame = frame.reset_index(drop=True)
+        self.keys = self.frame[KEY_COLUMN].to_numpy(dtype=np.int64)
+
+    def __len__(self):
+        return len(self.frame)
+
+    @classmethod
+    def load(cls, csv_path: str, sep: str = ','):
+        """load a feed from its binary cache, (re)building the cache when the csv is newer"""
+        cache_path = Path(str(csv_path) + CACHE_SUFFIX)
+        if cache_path.exists() and cache_path.stat().st_mtime >= Path(csv_path).stat().st_mtime:
+            frame = cls._read_cache(cache_path)
+            if frame is not None:
+                LOGGER.debug('event feed %s loaded from cache', csv_path)
+                return cls(frame)
+            LOGGER.info('event feed cache %s saved by another version, parsing the csv again', cache_path)
+
+        frame = pd.read_csv(csv_path, sep=sep)
+        frame[KEY_COLUMN] = match_time_key(frame['_min'].astype(np.int64), frame['sec'].astype(np.int64))
+        frame = frame.sort_values(KEY_COLUMN, kind='mergesort')
+        feed = cls(frame)
+        try:
+            feed.save(cache_path)
+        except OSError as err:
+            # read-only event folder, the feed is parsed again next time
+            LOGGER.warning('event feed cache %s not written: %s', cache_path, err)
+        return feed
+
+    @staticmethod
+    def _read_cache(cache_path):
+        """frame saved by `save`, None if it was saved by another version"""
+        with np.load(str(cache_path), allow_pickle=False) as archive:
+            if VERSION_ENTRY not in archive.files or int(archive[VERSION_ENTRY]) != CACHE_VERSION:
+                return None
+            columns = {}
+            for name in archive.files:
+                if name == VERSION_ENTRY or name.startswith(MISSING_PREFIX):
+                    continue
+                values = archive[name]
+                if MISSING_PREFIX + name in archive.files:
+                    values = values.astype(object)
+                    values[archive[MISSING_PREFIX + name]] = np.nan
+                columns[name] = values
+        return pd.DataFrame(columns)
+
+    def save(self, cache_path):
+        """store the sorted feed as a compact numpy archive (no pickled objects)
+
+        Text columns are saved as strings, with a boolean mask of their missing cells restored as NaN on load.
+        """
+        columns = {VERSION_ENTRY: CACHE_VERSION}
+        for name in self.frame.columns:
+            values = self.frame[name].to_numpy()
+            if values.dtype == object:
+                missing = pd.isnull(values)
+                values = np.where(missing, '', values).astype(str)
+                columns[MISSING_PREFIX + name] = missing
+            columns[name] = values
+        with open(str(cache_path), 'wb') as cache_file:
+            np.savez(cache_file, **columns)
+
+    def query(self, start_key: int, end_key: int):
+        """events whose match time is in [start_key, end_key], seconds included"""
+        first = np.searchsorted(self.keys, start_key, side='left')
+        last = np.searchsorted(self.keys, end_key, side='right')
+        return self.frame.iloc[first:last]
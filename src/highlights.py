@@ -0,0 +1,153 @@
+"""in-memory highlight table backing the trim preview"""
+import numpy as np
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, Qt
+
+FRAME_COLUMNS = ['init_frame', 'stop_frame', 'event_frame', 'celebration_frame']
+TEXT_COLUMNS = ['init_time', 'stop_time']
+HEADER_LABELS = ['init frame', 'stop frame', 'event frame', 'begin celebration',
+                 'match timestamp init', 'match timestamp stop']
+
+# frame value of a column left empty by the user
+NO_FRAME = -1
+
+
+class Highlights:
+    """highlights stored column-wise, frames as native int64 arrays
+
+    Rows are kept in insertion order; `row(0)` is the oldest highlight.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self._size = 0
+        self._frames = np.full((capacity, len(FRAME_COLUMNS)), NO_FRAME, dtype=np.int64)
+        self._texts = {name: [] for name in TEXT_COLUMNS}
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def frames(self):
+        """(n, 4) view over the frame columns, in insertion order"""
+        return self._frames[:self._size]
+
+    def column(self, name: str):
+        """a single frame column or text column by name"""
+        if name in self._texts:
+            return self._texts[name]
+        return self.frames[:, FRAME_COLUMNS.index(name)]
+
+    @staticmethod
+    def validate(init_frame: int, stop_frame: int, event_frame: int = NO_FRAME,
+                 celebration_frame: int = NO_FRAME):
+        """check a highlight before storing it
+
+        Returns:
+            {str} -- error message, empty when the highlight is valid
+        """
+        if init_frame == NO_FRAME or stop_frame == NO_FRAME:
+            return 'Error! both the starting and the ending frame should be set'
+        if init_frame >= stop_frame:
+            return 'Error! the starting frame should be BEFORE the ending frame'
+        for frame in (event_frame, celebration_frame):
+            if frame != NO_FRAME and not init_frame <= frame <= stop_frame:
+                return 'Error! the event frame should be between the starting and ending frame'
+        return ''
+
+    def append(self, init_frame: int, stop_frame: int, event_frame: int = NO_FRAME,
+               celebration_frame: int = NO_FRAME, init_time: str = '', stop_time: str = ''):
+        """store a highlight
+
+        Returns:
+            {int} -- insertion position of the new highlight
+        """
+        if self._size == len(self._frames):
+            grown = np.full((2 * len(self._frames), len(FRAME_COLUMNS)), NO_FRAME, dtype=np.int64)
+            grown[:self._size] = self._frames[:self._size]
+            self._frames = grown
+        self._frames[self._size] = (init_frame, stop_frame, event_frame, celebration_frame)
+        self._texts['init_time'].append(init_time)
+        self._texts['stop_time'].append(stop_time)
+        self._size += 1
+        return self._size - 1
+
+    def remove(self, position: int):
+        """remove the highlight at the given insertion position"""
+        self._frames[position:self._size - 1] = self._frames[position + 1:self._size]
+        self._frames[self._size - 1] = NO_FRAME
+        for texts in self._texts.values():
+            del texts[position]
+        self._size -= 1
+
+    def clear(self):
+        self._frames[:self._size] = NO_FRAME
+        for texts in self._texts.values():
+            texts.clear()
+        self._size = 0
+
+    def row(self, position: int):
+        """highlight at the given insertion position as a dict of native values"""
+        values = dict(zip(FRAME_COLUMNS, (int(v) for v in self._frames[position])))
+        values.update((name, texts[position]) for name, texts in self._texts.items())
+        return values
+
+    def rows(self):
+        """iterate the highlights as dicts, in insertion order"""
+        for position in range(self._size):
+            yield self.row(position)
+
+
+class HighlightTableModel(QAbstractTableModel):
+    """Qt view over `Highlights`, showing the newest highlight on the first row"""
+
+    def __init__(self, highlights: Highlights = None, parent=None):
+        super().__init__(parent)
+        self.highlights = highlights if highlights is not None else Highlights()
+
+    def position(self, row: int):
+        """convert a table row into an insertion position"""
+        return len(self.highlights) - 1 - row
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.highlights)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(HEADER_LABELS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return HEADER_LABELS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        position = self.position(index.row())
+        if index.column() < len(FRAME_COLUMNS):
+            value = int(self.highlights.frames[position, index.column()])
+            return '' if value == NO_FRAME else str(value)
+        return self.highlights.column(TEXT_COLUMNS[index.column() - len(FRAME_COLUMNS)])[position]
+
+    def add_highlight(self, *args, **kwargs):
+        """append a highlight and show it on the first row"""
+        self.beginInsertRows(QModelIndex(), 0, 0)
+        self.highlights.append(*args, **kwargs)
+        self.endInsertRows()
+
+    def removeRows(self, row, count, parent=QModelIndex()):
+        if row < 0 or count < 1 or row + count > len(self.highlights):
+            return False
+        self.beginRemoveRows(parent, row, row + count - 1)
+        for current in range(row + count - 1, row - 1, -1):
+            self.highlights.remove(self.position(current))
+        self.endRemoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self.highlights.clear()
+        self.endResetModel()
+
+    def rows(self):
+        """iterate the highlights in table order (newest first)"""
+        for row in range(len(self.highlights)):
+            yield self.highlights.row(self.position(row))
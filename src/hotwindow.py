@@ -0,0 +1,186 @@
+"""disk-backed window of decoded frames around the event being labeled
+
+While a goal is labeled the user goes back and forth within a minute or
+so of the event for minutes, and every jump is a seek (decode from the
+previous keyframe). `HotFrames` decodes that window once, in background,
+into a raw memory-mapped file (planar YUV 4:2:0, half the size of BGR):
+frames in the window are then served by a page-cache read and a color
+conversion, without ever holding the window in RAM. The window is
+dropped, and its file deleted, as soon as the user asks for a frame far
+from it. A window is bounded in bytes and by the free disk space, and the
+files left by a crash are deleted when the cache is opened.
+"""
+import logging
+import shutil
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from .decode import iter_frames
+from .probe import probe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+WINDOW_SUFFIX = '.i420'
+
+# free disk space left to the rest of the system when a window is sized
+MIN_FREE_BYTES = 1024 ** 3
+
+
+def clear_cache(cache_dir: str):
+    """delete the window files left in a cache folder (by a crash), the ones still open are skipped"""
+    for path in Path(cache_dir).glob('*' + WINDOW_SUFFIX):
+        try:
+            path.unlink()
+        except OSError as err:
+            LOGGER.debug('hot window file %s not deleted: %s', path, err)
+
+
+class HotWindow:
+    """frames [first, last) of a video decoded into a memory-mapped file, readable while it is being written"""
+
+    def __init__(self, video_path: str, first: int, last: int, path: str, width: int, height: int):
+        self.video_path = video_path
+        self.first = first
+        self.last = last
+        self.path = path
+        self.size = (width, height)
+        self.frames = np.memmap(path, dtype=np.uint8, mode='w+', shape=(last - first, height * 3 // 2, width))
+        # frames decoded so far, from first
+        self.ndecoded = 0
+        self.cancelled = self.finished = False
+        self._lock = threading.Lock()
+
+    def __contains__(self, frame_idx: int):
+        return self.first <= frame_idx < self.last
+
+    def decode(self):
+        """fill the file, meant to run on a background pool"""
+        try:
+            if not self.cancelled:
+                for frame_idx, frame in iter_frames(self.video_path, size=self.size, i420=True,
+                                                    start_frame=self.first, end_frame=self.last):
+                    with self._lock:
+                        if self.cancelled:
+                            break
+                        self.frames[frame_idx - self.first] = frame
+                        self.ndecoded = frame_idx - self.first + 1
+                else:
+                    LOGGER.info('hot window [%d, %d) of %s decoded', self.first, self.last, self.video_path)
+        except Exception:
+            LOGGER.exception('hot window [%d, %d) of %s failed', self.first, self.last, self.video_path)
+        finally:
+            with self._lock:
+                self.finished = True
+                if self.cancelled:
+                    self._delete()
+
+    def get(self, frame_idx: int):
+        """BGR frame, None if it is not decoded yet"""
+        with self._lock:
+            if self.cancelled or not self.first <= frame_idx < self.first + self.ndecoded:
+                return None
+            return cv2.cvtColor(self.frames[frame_idx - self.first], cv2.COLOR_YUV2BGR_I420)
+
+    def close(self):
+        """cancel the decoding and delete the file (once the decoding has stopped)"""
+        with self._lock:
+            self.cancelled = True
+            if self.finished:
+                self._delete()
+
+    def _delete(self):
+        # the file is unmapped when the last reference to the memmap is dropped
+        self.frames = None
+        try:
+            Path(self.path).unlink()
+        except OSError as err:
+            # still mapped by a reader on windows, or already removed; clear_cache deletes it next time
+            LOGGER.warning('hot window file %s not deleted: %s', self.path, err)
+
+
+class HotFrames:
+    def __init__(self, video_path: str, cache_dir: str = 'hot_frames', seconds: float = 60.0,
+                 evict_seconds: float = 30.0, max_mb: int = 2048, executor=None):
+        """
+        Arguments:
+            video_path {str} -- video served by the window
+
+        Keyword Arguments:
+            cache_dir {str} -- folder of the window files (default: {'hot_frames'})
+            seconds {float} -- the window spans this many seconds on each side of the focused frame (default: {60.0})
+            evict_seconds {float} -- a frame asked further than this outside the window drops it (default: {30.0})
+            max_mb {int} -- largest window file, `seconds` is shortened to fit in it (default: {2048})
+            executor {Executor} -- pool running the decoding, a thread is started if None (default: {None})
+        """
+        self.video_path = video_path
+        self.cache_dir = Path(cache_dir)
+        self.media = probe(video_path)
+        self.half_frames = int(round(seconds * self.media.fps))
+        self.max_bytes = max_mb * 1024 * 1024
+        self.evict_frames = int(round(evict_seconds * self.media.fps))
+        self.executor = executor
+        self.window = None
+        self._lock = threading.Lock()
+
+    def focus(self, frame_idx: int):
+        """decode the window around a frame, unless the current one already covers it"""
+        with self._lock:
+            if self.window is not None and frame_idx in self.window:
+                return
+            self._evict()
+            # even sizes, as required by 4:2:0 chroma subsampling
+            width, height = self.media.width // 2 * 2, self.media.height // 2 * 2
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                free_bytes = shutil.disk_usage(str(self.cache_dir)).free - MIN_FREE_BYTES
+            except OSError as err:
+                LOGGER.warning('no hot window in %s: %s', self.cache_dir, err)
+                return
+            half_frames = min(self.half_frames, min(self.max_bytes, free_bytes) // (width * height * 3 // 2) // 2)
+            first = max(0, frame_idx - half_frames)
+            last = min(self.media.frame_count, frame_idx + half_frames + 1)
+            if half_frames <= 0 or last <= first:
+                LOGGER.warning('no hot window around frame %d, not enough disk space in %s', frame_idx,
+                               self.cache_dir)
+                return
+            path = self.cache_dir / '{}_{}_{}{}'.format(Path(self.video_path).stem, first, last, WINDOW_SUFFIX)
+            try:
+                window = HotWindow(self.video_path, first, last, str(path), width, height)
+            except OSError as err:
+                LOGGER.warning('no hot window in %s: %s', path, err)
+                return
+            self.window = window
+        if self.executor is not None:
+            self.executor.submit(window.decode)
+        else:
+            threading.Thread(target=window.decode, name='hot-window', daemon=True).start()
+
+    def get(self, frame_idx: int):
+        """BGR frame from the window, None if it is not there; a frame far from the window drops it"""
+        with self._lock:
+            window = self.window
+            if window is None:
+                return None
+            if not window.first - self.evict_frames <= frame_idx < window.last + self.evict_frames:
+                self._evict()
+                return None
+            frame = window.get(frame_idx)
+        if frame is not None and frame.shape[:2] != (self.media.height, self.media.width):
+            # odd source sizes lose their last row or column in 4:2:0
+            frame = cv2.resize(frame, (self.media.width, self.media.height))
+        return frame
+
+    def close(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        if self.window is not None:
+            LOGGER.info('hot window [%d, %d) of %s evicted', self.window.first, self.window.last, self.video_path)
+            self.window.close()
+            self.window = None
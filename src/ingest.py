@@ -0,0 +1,155 @@
+"""ingest of new match videos into seek-friendly MP4 files
+
+Broadcasts are often recorded as MPEG-TS, which has no index: every seek
+makes OpenCV scan the stream, slowly and not always frame accurately. The
+ingest remuxes each video (streams are copied, nothing is re-encoded) into
+an MP4 whose index (sample sizes, timestamps and the table of every
+keyframe) sits at the beginning of the file (+faststart), and stores it in
+a cache folder. `VideoApp` then decodes the cached file in place of the
+original; labels, cuts and sessions keep referring to the original path
+and its frame indexes. A remux can drop leading undecodable frames or shift
+timestamps (MPEG-TS with a late first keyframe), so a copy whose frame
+count or relative timestamps differ from the original is discarded, and a
+marker file keeps the video decoded from the original.
+
+    python -m src.ingest /path/to/new/matches --workers 4
+"""
+import argparse
+import hashlib
+import logging
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from .audio import ffmpeg_exe
+from .probe import probe
+
+LOGGER = logging.getLogger(__name__)
+
+VIDEO_SUFFIXES = ('.ts', '.mp4')
+
+# next to the cached path, written when the remux of a video does not line up with it
+MISMATCH_SUFFIX = '.mismatch'
+
+# one remux at a time per cached file
+_LOCKS = {}
+_LOCKS_LOCK = threading.Lock()
+
+
+def cached_path(video_path: str, cache_dir: str = 'ingest_cache'):
+    """path of the remuxed copy of a video, unique per source path"""
+    source = Path(video_path).resolve()
+    digest = hashlib.sha1(str(source).encode('utf-8')).hexdigest()[:10]
+    return Path(cache_dir) / '{}-{}.mp4'.format(source.stem, digest)
+
+
+def is_ingested(video_path: str, cache_dir: str = 'ingest_cache'):
+    target = cached_path(video_path, cache_dir)
+    return target.exists() and target.stat().st_mtime >= Path(video_path).stat().st_mtime
+
+
+def decode_path(video_path: str, cache_dir: str = 'ingest_cache'):
+    """the ingested copy of a video if it is up to date, else the video itself"""
+    return str(cached_path(video_path, cache_dir)) if is_ingested(video_path, cache_dir) else video_path
+
+
+def timing_mismatch(original, remuxed):
+    """why the frames of a remux (MediaInfo) do not line up with the original ones, '' when they do"""
+    if original.frame_count != remuxed.frame_count:
+        return 'frame count {} instead of {}'.format(remuxed.frame_count, original.frame_count)
+    if original.pts is not None and remuxed.pts is not None and len(original.pts):
+        drift = float(np.max(np.abs(remuxed.pts - original.pts)))
+        if drift > 0.5 / float(original.fps):
+            return 'timestamps shifted by up to {:.3f} s'.format(drift)
+    return ''
+
+
+def remux(video_path: str, target: str):
+    """copy the video and audio streams of a video into a faststart MP4, published only if its frames line up
+    with the original ones
+
+    Returns:
+        {str} -- why the remux was discarded, '' when it was kept
+    """
+    tmp_path = '{}.{}.{}.tmp.mp4'.format(target, os.getpid(), threading.get_ident())
+    command = [ffmpeg_exe(), '-v', 'error', '-y', '-fflags', '+genpts', '-i', video_path,
+               # data streams of broadcasts (teletext, SCTE-35) do not fit in MP4
+               '-map', '0:v:0', '-map', '0:a?', '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+               '-movflags', '+faststart', tmp_path]
+    try:
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        mismatch = timing_mismatch(probe(video_path), probe(tmp_path, cache=False))
+        if not mismatch:
+            os.replace(tmp_path, target)
+        return mismatch
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def ingest_video(video_path: str, cache_dir: str = 'ingest_cache'):
+    """remux a video into the cache if needed and probe it
+
+    Returns:
+        {str} -- path to decode, the original video if the remux failed
+    """
+    target = cached_path(video_path, cache_dir)
+    mismatch_path = target.with_name(target.name + MISMATCH_SUFFIX)
+    with _LOCKS_LOCK:
+        lock = _LOCKS.setdefault(str(target), threading.Lock())
+    with lock:
+        if not is_ingested(video_path, cache_dir):
+            if mismatch_path.exists() and mismatch_path.stat().st_mtime >= Path(video_path).stat().st_mtime:
+                return video_path
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                mismatch = remux(video_path, str(target))
+            except (OSError, ValueError, subprocess.CalledProcessError) as err:
+                LOGGER.error('ingest of %s failed: %s', video_path, getattr(err, 'stderr', err))
+                return video_path
+            if mismatch:
+                LOGGER.warning('remux of %s discarded, %s: the original is decoded', video_path, mismatch)
+                mismatch_path.write_text(mismatch + '\n')
+                return video_path
+            LOGGER.info('%s ingested as %s', video_path, target)
+    # the timing index is built while the file is hot in the page cache
+    probe(str(target))
+    return str(target)
+
+
+def find_videos(directory: str):
+    """videos of a directory, sorted by name"""
+    return sorted(str(path) for path in Path(directory).iterdir()
+                  if path.is_file() and path.suffix.lower() in VIDEO_SUFFIXES)
+
+
+def ingest_directory(directory: str, cache_dir: str = 'ingest_cache', workers: int = 4):
+    """ingest all the videos of a directory in parallel (remuxing is I/O bound, threads drive ffmpeg processes)
+
+    Returns:
+        {dict} -- path to decode by original video path
+    """
+    videos = find_videos(directory)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest') as executor:
+        decode_paths = list(executor.map(partial(ingest_video, cache_dir=cache_dir), videos))
+    return dict(zip(videos, decode_paths))
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='remux new match videos into seek-friendly MP4 files')
+    parser.add_argument('directory')
+    parser.add_argument('--cache-dir', dest='cache_dir', default='ingest_cache')
+    parser.add_argument('--workers', type=int, default=4)
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)8s] %(message)s')
+    args = argparser().parse_args()
+    for source, target in ingest_directory(args.directory, args.cache_dir, args.workers).items():
+        print('{} -> {}'.format(source, target))
@@ -0,0 +1,181 @@
+"""low overhead instrumentation of the hot paths
+
+Timers use `perf_counter_ns` and feed a per-name histogram (a bounded ring
+of samples, percentiles are computed only when the metrics are dumped).
+Everything is a cheap no-op until `configure(enabled=True)` is called from
+the `instrumentation` config section.
+
+    with timer('decode'):
+        read_success, frame = cap.read()
+"""
+import json
+import logging
+import threading
+from array import array
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from time import perf_counter_ns
+
+LOGGER = logging.getLogger(__name__)
+
+# names of the instrumented operations
+DECODE = 'decode'
+SEEK = 'seek'
+CONVERT = 'convert'
+PAINT = 'paint'
+OCR_DETECT = 'ocr_detect'
+OCR_RECOGNIZE = 'ocr_recognize'
+CUT = 'cut'
+# input to display latency of the viewer navigation, and the requests it skipped
+NAVIGATE = 'navigate'
+NAVIGATE_COALESCED = 'navigate.coalesced'
+NAVIGATE_ABANDONED = 'navigate.abandoned'
+NAVIGATE_STALE = 'navigate.stale'
+# frames served by the hot window store instead of the decoder
+HOT_WINDOW_HIT = 'hot_window.hit'
+
+
+class Histogram:
+    """durations in ns; keeps the last `size` samples plus exact count and total"""
+
+    def __init__(self, size: int = 4096):
+        self.samples = array('q', bytes(8 * size))
+        self.count = 0
+        self.total = 0
+
+    def add(self, value: int):
+        self.samples[self.count % len(self.samples)] = value
+        self.count += 1
+        self.total += value
+
+    def summary(self):
+        """count, mean and p50/p95/p99/max in milliseconds"""
+        kept = sorted(self.samples[:min(self.count, len(self.samples))])
+        if not kept:
+            return {'count': 0}
+
+        def percentile(q):
+            return kept[min(len(kept) - 1, int(q * len(kept)))] / 1e6
+        return {'count': self.count, 'mean_ms': self.total / self.count / 1e6,
+                'p50_ms': percentile(0.50), 'p95_ms': percentile(0.95), 'p99_ms': percentile(0.99),
+                'max_ms': kept[-1] / 1e6}
+
+
+class Metrics:
+    def __init__(self):
+        self.enabled = False
+        self.histograms = {}
+        self.counters = {}
+        self.dump_path = None
+        self._lock = threading.Lock()
+        self._server = None
+
+    def observe(self, name: str, duration_ns: int):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.add(duration_ns)
+
+    def count(self, name: str, value: int = 1):
+        if self.enabled:
+            with self._lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self._lock:
+            return {'timers': {name: histogram.summary() for name, histogram in self.histograms.items()},
+                    'counters': dict(self.counters)}
+
+    def reset(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def dump(self, path: str):
+        """write the metrics as json"""
+        with open(path, 'w') as dump_file:
+            json.dump(self.snapshot(), dump_file, indent=2)
+
+    def serve(self, port: int, host: str = '127.0.0.1'):
+        """expose the metrics as json on http://host:port/metrics from a daemon thread"""
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = json.dumps(metrics.snapshot()).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = HTTPServer((host, port), MetricsHandler)
+        threading.Thread(target=self._server.serve_forever, name='metrics-endpoint', daemon=True).start()
+        LOGGER.info('metrics served at http://%s:%d/metrics', host, port)
+
+
+METRICS = Metrics()
+
+
+def configure(enabled: bool = False, dump_path: str = None, port: int = None, **_):
+    """apply the `instrumentation` config section"""
+    METRICS.enabled = bool(enabled)
+    METRICS.dump_path = dump_path
+    if METRICS.enabled and port:
+        METRICS.serve(int(port))
+
+
+def shutdown():
+    """dump the metrics to the configured path, if any"""
+    if METRICS.enabled and METRICS.dump_path:
+        METRICS.dump(METRICS.dump_path)
+        LOGGER.info('metrics dumped at %s', METRICS.dump_path)
+
+
+@contextmanager
+def timer(name: str):
+    """time the enclosed block under the given name"""
+    if not METRICS.enabled:
+        yield
+        return
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        METRICS.observe(name, perf_counter_ns() - start)
+
+
+def timed(name: str = None):
+    """decorator timing every call of a function (default name: module.function)"""
+    def decorator(func):
+        fullname = name or '{}.{}'.format(func.__module__, func.__name__)
+
+        @wraps(func)
+        def wrapped(*args, **kwargs):
+            if not METRICS.enabled:
+                return func(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                METRICS.observe(fullname, perf_counter_ns() - start)
+        return wrapped
+    return decorator
+
+
+def count(name: str, value: int = 1):
+    METRICS.count(name, value)
+
+
+def observe(name: str, duration_ns: int):
+    """record a duration measured elsewhere (e.g. across threads)"""
+    if METRICS.enabled:
+        METRICS.observe(name, duration_ns)
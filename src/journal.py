@@ -0,0 +1,171 @@
+"""autosave journal of a labeling session
+
+Every change made while labeling a video (highlight added or removed, trim
+field edited, time roi drawn) is appended as a json line to a per-video
+journal file by a background thread, so the GUI never waits on disk.
+Once the journal holds `compact_every` entries the whole session state is
+written to a snapshot and the journal is truncated: reloading a session
+reads one snapshot plus at most `compact_every` lines, whatever the length
+of the session.
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+
+def empty_state():
+    return {'seq': 0, 'highlights': [], 'fields': {}, 'roi': None}
+
+
+def apply_entry(state: dict, entry: dict):
+    """apply a single journal entry to a session state"""
+    operation = entry['op']
+    state['seq'] = entry['seq']
+    if operation == 'add':
+        state['highlights'].append(entry['highlight'])
+    elif operation == 'remove':
+        del state['highlights'][entry['position']]
+    elif operation == 'edit':
+        state['fields'][entry['field']] = entry['value']
+    elif operation == 'roi':
+        state['roi'] = entry['roi']
+    else:
+        LOGGER.warning('unknown journal operation %s', operation)
+
+
+class SessionJournal:
+    def __init__(self, video_path: str, session_dir: str = 'sessions', compact_every: int = 256):
+        """open (and recover) the journal of a video
+
+        Arguments:
+            video_path {str} -- video being labeled
+
+        Keyword Arguments:
+            session_dir {str} -- folder holding journals and snapshots (default: {'sessions'})
+            compact_every {int} -- journal entries written before compacting (default: {256})
+        """
+        resolved = str(Path(video_path).resolve())
+        key = '{}_{}'.format(Path(video_path).stem, hashlib.sha1(resolved.encode('utf-8')).hexdigest()[:12])
+        session_path = Path(session_dir)
+        session_path.mkdir(parents=True, exist_ok=True)
+        self.journal_path = session_path / (key + '.journal')
+        self.snapshot_path = session_path / (key + '.snapshot.json')
+        self.compact_every = compact_every
+
+        self._nentries = 0
+        self.state = self._recover()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name='session-journal', daemon=True)
+        self._writer.start()
+
+    def _recover(self):
+        """rebuild the session state from the snapshot and the journal tail
+
+        A crash can leave a partial line (or, with a disk error, a garbled one) in the journal: such lines are
+        skipped, and the recovered state is compacted into a fresh snapshot so that new entries are never appended
+        onto a fragment.
+        """
+        state = empty_state()
+        if self.snapshot_path.exists():
+            with open(str(self.snapshot_path), 'r') as snapshot_file:
+                state = json.load(snapshot_file)
+        if not self.journal_path.exists():
+            return state
+        with open(str(self.journal_path), 'rb') as journal_file:
+            data = journal_file.read()
+        damaged = bool(data) and not data.endswith(b'\n')
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entry = json.loads(line.decode('utf-8'))
+                seq = entry['seq']
+            except (ValueError, TypeError, KeyError):
+                LOGGER.warning('skip undecodable journal entry in %s', self.journal_path)
+                damaged = True
+                continue
+            # entries already folded in the snapshot (crash during compaction)
+            if seq > state['seq']:
+                try:
+                    apply_entry(state, entry)
+                except (KeyError, IndexError, TypeError):
+                    LOGGER.warning('skip invalid journal entry %s in %s', seq, self.journal_path)
+                    damaged = True
+                    continue
+                self._nentries += 1
+        if damaged:
+            self._write_snapshot(state)
+            with open(str(self.journal_path), 'w'):
+                pass
+            self._nentries = 0
+        return state
+
+    def record(self, operation: str, **payload):
+        """apply a change to the session state and queue it for writing"""
+        entry = dict(payload, op=operation, seq=self.state['seq'] + 1)
+        apply_entry(self.state, entry)
+        self._nentries += 1
+        if self._nentries >= self.compact_every:
+            self._nentries = 0
+            self._queue.put(('compact', copy.deepcopy(self.state)))
+        else:
+            self._queue.put(('append', entry))
+
+    def add_highlight(self, highlight: dict):
+        self.record('add', highlight=highlight)
+
+    def remove_highlight(self, position: int):
+        self.record('remove', position=position)
+
+    def edit_field(self, field: str, value: str):
+        if self.state['fields'].get(field) != value:
+            self.record('edit', field=field, value=value)
+
+    def set_roi(self, roi: dict):
+        self.record('roi', roi=roi)
+
+    def compact(self):
+        """write the current state as snapshot and start an empty journal"""
+        self._nentries = 0
+        self._queue.put(('compact', copy.deepcopy(self.state)))
+
+    def close(self):
+        """flush pending entries and stop the writer thread"""
+        self._queue.put(('stop', None))
+        self._writer.join()
+
+    def _write_loop(self):
+        journal_file = open(str(self.journal_path), 'a')
+        try:
+            while True:
+                task, payload = self._queue.get()
+                if task == 'append':
+                    journal_file.write(json.dumps(payload) + '\n')
+                elif task == 'compact':
+                    journal_file.close()
+                    self._write_snapshot(payload)
+                    journal_file = open(str(self.journal_path), 'w')
+                elif task == 'stop':
+                    break
+                if self._queue.empty():
+                    journal_file.flush()
+        except Exception:
+            LOGGER.exception('session journal %s stopped', self.journal_path)
+        finally:
+            journal_file.close()
+
+    def _write_snapshot(self, state: dict):
+        """atomically replace the snapshot, so a crash leaves either the old or the new one"""
+        tmp_path = self.snapshot_path.with_suffix('.tmp')
+        with open(str(tmp_path), 'w') as snapshot_file:
+            json.dump(state, snapshot_file)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(str(tmp_path), str(self.snapshot_path))
@@ -0,0 +1,299 @@
+"""dataset-wide store of the highlight labels
+
+Every `cuts` folder gets its own `labels_info.csv`, appended at each cut.
+`LabelStore` merges the files of all the matches into a single columnar
+`.npz` file (one numpy array per column, no pickled objects): rows are
+validated against the labels_info schema, duplicates left by repeated cuts
+are dropped, and only the csv files changed since the last merge are parsed
+again. Queries are vectorized filters over the columns.
+
+    python -m src.labels /path/to/matches --store labels.npz --fps 25 --min-duration 20 --csv goals.csv
+"""
+import argparse
+import csv
+import logging
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+LOGGER = logging.getLogger(__name__)
+
+LABELS_FILE = 'labels_info.csv'
+# labels of the virtual clips (see clips.py), same columns, video_name is the match the frames are read from
+VIRTUAL_LABELS_FILE = 'virtual_labels_info.csv'
+LABEL_COLUMNS = ['video_name', '#_highlight', 'starting_frame', 'goal_frame', 'ending_frame', 'start_celebration',
+                 'starting_time', 'ending_time', 'added_frames_bf', 'fps']
+
+# frame value of a column left empty in labels_info.csv, as highlights.NO_FRAME
+NO_FRAME = -1
+
+# column dtypes of the store: the labels_info columns, the match of the cut, whether the row is a virtual clip (read
+# from VIRTUAL_LABELS_FILE) and the source csv of each row
+SCHEMA = {'match': str, 'video_name': str, '#_highlight': np.int32, 'starting_frame': np.int64,
+          'goal_frame': np.int64, 'ending_frame': np.int64, 'start_celebration': np.int64, 'starting_time': str,
+          'ending_time': str, 'added_frames_bf': np.int64, 'fps': np.float64, 'virtual': bool, 'source': np.int32}
+
+# cut file name: the match file name with its leading 'complete' replaced by 'label_<n>' (see VideoApp.cut_videos),
+# virtual clips name the match itself
+CUT_NAME = re.compile(r'^(?:label_\d+|complete)(?P<match>.*)$')
+
+# stores saved with another version are merged again from the csv files
+STORE_VERSION = 3
+
+# a highlight is the same when it is cut again from the same window
+DEDUP_COLUMNS = ['video_name', 'starting_frame', 'ending_frame']
+
+
+def _parse_row(row: dict):
+    """typed values of a labels_info row, ValueError when it does not fit the schema"""
+    values = {}
+    for column in LABEL_COLUMNS:
+        text = (row.get(column) or '').strip()
+        dtype = SCHEMA[column]
+        if dtype is str:
+            values[column] = text
+        elif dtype is np.float64:
+            values[column] = float(text)
+        elif text == '' and column in ('goal_frame', 'start_celebration'):
+            values[column] = NO_FRAME
+        else:
+            values[column] = int(text)
+    if values['starting_frame'] < 0 or values['starting_frame'] >= values['ending_frame']:
+        raise ValueError('starting frame {} is not before ending frame {}'.format(values['starting_frame'],
+                                                                                 values['ending_frame']))
+    for column in ('goal_frame', 'start_celebration'):
+        if values[column] != NO_FRAME and not values['starting_frame'] <= values[column] <= values['ending_frame']:
+            raise ValueError('{} {} is outside the highlight'.format(column, values[column]))
+    if values['fps'] <= 0 or values['added_frames_bf'] < 0:
+        raise ValueError('fps {} or added frames {} out of range'.format(values['fps'], values['added_frames_bf']))
+    return values
+
+
+def match_name(video_name: str, csv_path: str):
+    """match of a cut: the rest of its file name after label_<n> (or after 'complete' for the match of a virtual
+    clip), without extension, or the folder holding the cuts folder when the match file was only named 'complete'"""
+    # labels written on windows keep their backslashes
+    stem = os.path.splitext(video_name.replace('\\', '/').rsplit('/', 1)[-1])[0]
+    found = CUT_NAME.match(stem)
+    match = found.group('match').strip(' _-.') if found else ''
+    return match or Path(csv_path).resolve().parent.parent.name
+
+
+def read_labels(csv_path: str):
+    """valid rows of a labels_info.csv, invalid ones are logged and skipped
+
+    Returns:
+        {list} -- one dict per row, with the typed labels_info columns, the match of the cut (see match_name) and
+                  whether it is a virtual clip
+    """
+    virtual = Path(csv_path).name == VIRTUAL_LABELS_FILE
+    rows = []
+    with open(csv_path, 'r', newline='') as read_file:
+        reader = csv.DictReader(read_file)
+        missing = [column for column in LABEL_COLUMNS if column not in (reader.fieldnames or [])]
+        if missing:
+            LOGGER.error('%s skipped, missing columns %s', csv_path, missing)
+            return rows
+        # line 1 is the header
+        for line, row in enumerate(reader, 2):
+            try:
+                values = _parse_row(row)
+            except (TypeError, ValueError) as err:
+                LOGGER.warning('%s:%d skipped: %s', csv_path, line, err)
+                continue
+            values['match'] = match_name(values['video_name'], csv_path)
+            values['virtual'] = virtual
+            rows.append(values)
+    return rows
+
+
+def find_label_files(*roots: str):
+    """labels_info.csv and virtual_labels_info.csv files of the cuts folders found under some folders"""
+    files = set()
+    for root in roots:
+        for name in (LABELS_FILE, VIRTUAL_LABELS_FILE):
+            files.update(str(path.resolve()) for path in Path(root).rglob(name) if path.parent.name == 'cuts')
+    return sorted(files)
+
+
+def _stat(path: str):
+    stat = os.stat(path)
+    return stat.st_mtime, stat.st_size
+
+
+class LabelStore:
+    def __init__(self, columns: dict = None, sources: list = None):
+        """
+        Keyword Arguments:
+            columns {dict} -- array of each SCHEMA column, all of the same length (default: {None}, empty store)
+            sources {list} -- (csv path, mtime, size) of the merged files, rows point to them by index
+                              (default: {None})
+        """
+        self.columns = columns if columns is not None else self._to_columns([])
+        self.sources = sources if sources is not None else []
+
+    @staticmethod
+    def _to_columns(rows: list):
+        columns = {}
+        for column, dtype in SCHEMA.items():
+            values = [row[column] for row in rows]
+            columns[column] = np.array(values, dtype=dtype) if dtype is not str else np.array(values, dtype='U')
+        return columns
+
+    def __len__(self):
+        return len(self.columns['video_name'])
+
+    def __getitem__(self, column: str):
+        return self.columns[column]
+
+    @property
+    def duration(self):
+        """seconds of each highlight, padding excluded"""
+        return (self.columns['ending_frame'] - self.columns['starting_frame'] + 1) / self.columns['fps']
+
+    def matches(self):
+        return sorted(set(self.columns['match'].tolist()))
+
+    def rows(self):
+        """one dict per row, with python values"""
+        names = list(self.columns)
+        return [dict(zip(names, values)) for values in zip(*(self.columns[name].tolist() for name in names))]
+
+    def select(self, mask: np.ndarray):
+        """store restricted to the rows of a boolean mask (or an index array)"""
+        return LabelStore({column: values[mask] for column, values in self.columns.items()}, self.sources)
+
+    def filter(self, match=None, fps=None, min_duration: float = None, max_duration: float = None):
+        """rows matching all the given conditions
+
+        Keyword Arguments:
+            match {str or list} -- match names, see match_name (default: {None})
+            fps {float or list} -- frame rates, 29.97 matches 30000/1001 (default: {None})
+            min_duration {float} -- shortest highlight in seconds (default: {None})
+            max_duration {float} -- longest highlight in seconds (default: {None})
+
+        Returns:
+            {LabelStore} -- the selected rows
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if match is not None:
+            mask &= np.isin(self.columns['match'], [match] if isinstance(match, str) else list(match))
+        if fps is not None:
+            rates = np.atleast_1d(np.asarray(fps, dtype=np.float64))
+            mask &= np.any(np.abs(self.columns['fps'][:, None] - rates[None, :]) < 0.01, axis=1)
+        if min_duration is not None or max_duration is not None:
+            duration = self.duration
+            if min_duration is not None:
+                mask &= duration >= min_duration
+            if max_duration is not None:
+                mask &= duration <= max_duration
+        return self.select(mask)
+
+    def update(self, *roots: str):
+        """merge the labels_info.csv files found under some folders, parsing only the new or changed ones
+
+        Rows of the files no longer found under the folders are dropped.
+
+        Returns:
+            {LabelStore} -- self, for chaining
+        """
+        paths = find_label_files(*roots)
+        known = {path: (idx, (mtime, size)) for idx, (path, mtime, size) in enumerate(self.sources)}
+        kept_rows, new_rows, sources = [], [], []
+        for path in paths:
+            stat = _stat(path)
+            source_idx = len(sources)
+            sources.append((path, stat[0], stat[1]))
+            if path in known and known[path][1] == stat:
+                kept_rows.append((known[path][0], source_idx))
+                continue
+            for row in read_labels(path):
+                row['source'] = source_idx
+                new_rows.append(row)
+
+        # rows of unchanged files are taken as they are, with their new source index
+        old_sources = self.columns['source']
+        keep = np.isin(old_sources, [old_idx for old_idx, _ in kept_rows])
+        remap = dict(kept_rows)
+        kept = {column: values[keep] for column, values in self.columns.items()}
+        kept['source'] = np.array([remap[idx] for idx in kept['source'].tolist()], dtype=SCHEMA['source'])
+        added = self._to_columns(new_rows)
+        columns = {column: np.concatenate([kept[column], added[column]]) for column in SCHEMA}
+        self.columns, self.sources = self._dedup(columns), sources
+        LOGGER.info('%d labels from %d files, %d rows parsed', len(self), len(sources), len(new_rows))
+        return self
+
+    @staticmethod
+    def _dedup(columns: dict):
+        """keep the last row of each highlight, by source file order then line"""
+        count = len(columns['video_name'])
+        if not count:
+            return columns
+        keys = np.rec.fromarrays([columns[column] for column in DEDUP_COLUMNS], names=DEDUP_COLUMNS)
+        order = np.lexsort((np.arange(count), columns['source']))
+        # unique on the reversed order keeps the last occurrence
+        _, last = np.unique(keys[order][::-1], return_index=True)
+        keep = np.sort(order[::-1][last])
+        if len(keep) < count:
+            LOGGER.info('%d duplicated labels dropped', count - len(keep))
+        return {column: values[keep] for column, values in columns.items()}
+
+    def save(self, store_path: str):
+        """write the store as a .npz file, atomically"""
+        tmp_path = store_path + '.tmp'
+        sources = np.array([path for path, _, _ in self.sources], dtype='U')
+        stats = np.array([(mtime, size) for _, mtime, size in self.sources], dtype=np.float64).reshape(-1, 2)
+        with open(tmp_path, 'wb') as store_file:
+            np.savez(store_file, version=STORE_VERSION, source_paths=sources, source_stats=stats,
+                     **{'column_' + column: values for column, values in self.columns.items()})
+        os.replace(tmp_path, store_path)
+
+    @classmethod
+    def load(cls, store_path: str):
+        """store saved by `save`, an empty store if the file does not exist or was saved by another version"""
+        if not Path(store_path).exists():
+            return cls()
+        with np.load(store_path, allow_pickle=False) as archive:
+            if 'version' not in archive.files or int(archive['version']) != STORE_VERSION:
+                LOGGER.info('%s saved by another version, all the labels are merged again', store_path)
+                return cls()
+            columns = {column: archive['column_' + column] for column in SCHEMA}
+            sources = [(path, mtime, int(size)) for path, (mtime, size)
+                       in zip(archive['source_paths'].tolist(), archive['source_stats'].tolist())]
+        return cls(columns, sources)
+
+    def to_csv(self, csv_path: str):
+        """export the rows of the clips written on disk as a labels_info.csv, virtual clips are left out (their
+        video_name is the match, see clips.export_virtual_clips)"""
+        with open(csv_path, 'w', newline='') as write_file:
+            writer = csv.writer(write_file)
+            writer.writerow(LABEL_COLUMNS)
+            for row in self.select(~self.columns['virtual']).rows():
+                writer.writerow(['' if column in ('goal_frame', 'start_celebration') and row[column] == NO_FRAME
+                                 else row[column] for column in LABEL_COLUMNS])
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='merge the labels of all the cuts folders and query them')
+    parser.add_argument('roots', nargs='*', help='folders searched for cuts/labels_info.csv')
+    parser.add_argument('--store', default='labels.npz')
+    parser.add_argument('--match', nargs='+')
+    parser.add_argument('--fps', type=float, nargs='+')
+    parser.add_argument('--min-duration', dest='min_duration', type=float)
+    parser.add_argument('--max-duration', dest='max_duration', type=float)
+    parser.add_argument('--csv', help='export the selected labels as a labels_info.csv')
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)8s] %(message)s')
+    args = argparser().parse_args()
+    store = LabelStore.load(args.store)
+    if args.roots:
+        store.update(*args.roots).save(args.store)
+    selected = store.filter(args.match, args.fps, args.min_duration, args.max_duration)
+    print('{} of {} labels, {} matches'.format(len(selected), len(store), len(selected.matches())))
+    if args.csv:
+        selected.to_csv(args.csv)
@@ -0,0 +1,189 @@
+"""frame requests of the viewer, decoded on a dedicated thread
+
+Navigation (arrow keys, frame buttons, slider, playback) only sets the
+target frame. `FrameNavigator` keeps a single pending request: a new target
+replaces the one not started yet, so a burst of key presses costs one
+decode. Frames just ahead of the decoder position are reached by grabbing
+(no seek), and that walk is abandoned as soon as another frame is
+requested; a decoded frame that is no longer the latest target is dropped
+instead of being converted and painted. `RemoteNavigator` does the same
+with frames fetched from a labeling server (see server.py).
+"""
+import logging
+import threading
+from collections import namedtuple
+from time import perf_counter_ns
+
+from . import instrument
+from .instrument import timer
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+# bgr is the clean decoded frame, rgb the one to display, request_ns the time of the input asking for it
+DecodedFrame = namedtuple('DecodedFrame', ['frame_idx', 'bgr', 'rgb', 'request_ns'])
+
+
+class FrameNavigator:
+    def __init__(self, video_path: str, on_frame, max_grab: int = 30, store=None):
+        """
+        Arguments:
+            video_path {str} -- video decoded by the navigator, with its own capture
+            on_frame {callable} -- called from the navigator thread with each DecodedFrame to display
+
+        Keyword Arguments:
+            max_grab {int} -- frames ahead of the decoder reached by grabbing instead of seeking (default: {30})
+            store {HotFrames} -- already decoded frames, tried before the capture (default: {None})
+        """
+        self.video_path = video_path
+        self.on_frame = on_frame
+        self.max_grab = max_grab
+        self.store = store
+        self.cap = self._open()
+        # index of the frame the next cap.read returns, None when unknown
+        self.position = None
+        self.last = None
+        self._pending = None
+        # (request time, DecodedFrame or None if it failed) of the last request handled, for `read`
+        self._served = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='navigator', daemon=True)
+        self._thread.start()
+
+    def request(self, frame_idx: int):
+        """ask for a frame to be displayed, replacing the request not started yet
+
+        Returns:
+            {int} -- perf_counter_ns time of the request
+        """
+        with self._condition:
+            if self._pending is not None:
+                instrument.count(instrument.NAVIGATE_COALESCED)
+            self._pending = (frame_idx, perf_counter_ns())
+            # `read` callers wait on the same condition
+            self._condition.notify_all()
+            return self._pending[1]
+
+    def read(self, frame_idx: int, timeout: float = 10.0):
+        """request a frame and wait until it is delivered to on_frame, the way the viewer gets it
+
+        Returns:
+            {DecodedFrame} -- the delivered frame, None if it failed, was superseded or did not come in time
+        """
+        request_ns = self.request(frame_idx)
+        with self._condition:
+            self._condition.wait_for(lambda: self._closed or (self._served is not None and
+                                                              self._served[0] >= request_ns), timeout)
+            if self._served is None or self._served[0] != request_ns:
+                return None
+            return self._served[1]
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._pending = None
+            self._condition.notify_all()
+        self._thread.join()
+        if self.cap is not None:
+            self.cap.release()
+
+    def _open(self):
+        return cv2.VideoCapture(self.video_path)
+
+    def _is_superseded(self, frame_idx: int):
+        with self._condition:
+            return self._closed or (self._pending is not None and self._pending[0] != frame_idx)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                frame_idx, request_ns = self._pending
+                self._pending = None
+
+            decoded = None
+            frame = self._decode(frame_idx)
+            if frame is not None and self._is_superseded(frame_idx):
+                instrument.count(instrument.NAVIGATE_ABANDONED)
+            elif frame is not None:
+                with timer(instrument.CONVERT):
+                    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+                decoded = DecodedFrame(frame_idx, frame, rgb, request_ns)
+                try:
+                    self.on_frame(decoded)
+                except Exception:
+                    LOGGER.exception('delivery of frame %d failed', frame_idx)
+            with self._condition:
+                self._served = (request_ns, decoded)
+                self._condition.notify_all()
+
+    def _decode(self, frame_idx: int):
+        """BGR frame, None if it failed or was abandoned for a newer request"""
+        if self.last is not None and self.last[0] == frame_idx:
+            return self.last[1]
+        if self.store is not None:
+            frame = self.store.get(frame_idx)
+            if frame is not None:
+                instrument.count(instrument.HOT_WINDOW_HIT)
+                self.last = (frame_idx, frame)
+                return frame
+        ahead = frame_idx - self.position if self.position is not None else -1
+        if 0 <= ahead <= self.max_grab:
+            for _ in range(ahead):
+                if self._is_superseded(frame_idx):
+                    instrument.count(instrument.NAVIGATE_ABANDONED)
+                    return None
+                with timer(instrument.DECODE):
+                    grabbed = self.cap.grab()
+                if not grabbed:
+                    self.position = None
+                    LOGGER.error('grab before #%d frame failed', frame_idx)
+                    return None
+                self.position += 1
+        else:
+            with timer(instrument.SEEK):
+                self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+        with timer(instrument.DECODE):
+            read_success, frame = self.cap.read()
+        if not read_success:
+            self.position = None
+            LOGGER.error('read #%d frame failed', frame_idx)
+            return None
+        self.position = frame_idx + 1
+        self.last = (frame_idx, frame)
+        return frame
+
+
+class RemoteNavigator(FrameNavigator):
+    """navigator fetching the frames from a labeling server instead of decoding them"""
+
+    def __init__(self, client, video_path: str, on_frame):
+        """
+        Arguments:
+            client {server.ServerClient} -- connection to the server
+            video_path {str} -- video as known by the server
+            on_frame {callable} -- called from the navigator thread with each DecodedFrame to display
+        """
+        self.client = client
+        super().__init__(video_path, on_frame)
+
+    def _open(self):
+        return None
+
+    def _decode(self, frame_idx: int):
+        if self.last is not None and self.last[0] == frame_idx:
+            return self.last[1]
+        try:
+            with timer(instrument.DECODE):
+                frame = self.client.frame(self.video_path, frame_idx)
+        except (OSError, ValueError):
+            LOGGER.exception('fetch of #%d frame failed', frame_idx)
+            return None
+        self.last = (frame_idx, frame)
+        return frame
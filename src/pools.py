@@ -0,0 +1,59 @@
+"""worker pools shared by all the videos of a labeling session
+
+- ocr: clock recognition requests (tesseract runs as a subprocess, threads are enough)
+- cut: ffmpeg cuts of the highlights
+- ingest: ffmpeg remuxes of new videos into the ingest cache (see ingest.py)
+- analysis: cpu heavy passes over whole videos (shot index), in separate processes
+- background: orchestration jobs waiting on the other pools (index builds, highlight detection)
+- hot_window: decoding of the hot windows (see hotwindow.py), kept apart so that it never queues behind the
+  long background jobs
+
+Pools are created on first use with the sizes given to `configure`.
+"""
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+LOGGER = logging.getLogger(__name__)
+
+# workers per pool, None lets concurrent.futures choose (cpu count based)
+WORKERS = {'ocr': 2, 'cut': 2, 'ingest': 2, 'analysis': None, 'background': 4, 'hot_window': 2}
+
+_POOLS = {}
+_LOCK = threading.Lock()
+
+
+def configure(**workers):
+    """set pool sizes from the `pools` config section, before the pools are first used"""
+    for name, nworkers in workers.items():
+        if name not in WORKERS:
+            LOGGER.warning('unknown pool %s', name)
+        elif name in _POOLS:
+            LOGGER.warning('pool %s already started, size %s ignored', name, nworkers)
+        else:
+            WORKERS[name] = nworkers
+
+
+def get(name: str):
+    """shared executor by name"""
+    with _LOCK:
+        pool = _POOLS.get(name)
+        if pool is None:
+            if name == 'analysis':
+                pool = ProcessPoolExecutor(max_workers=WORKERS[name])
+            else:
+                pool = ThreadPoolExecutor(max_workers=WORKERS[name], thread_name_prefix=name)
+            _POOLS[name] = pool
+        return pool
+
+
+def submit(name: str, func, *args, **kwargs):
+    return get(name).submit(func, *args, **kwargs)
+
+
+def shutdown(wait: bool = False):
+    with _LOCK:
+        pools = list(_POOLS.values())
+        _POOLS.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
@@ -0,0 +1,221 @@
+"""exact timing of a video: rational frame rate, frame count and per-frame timestamps
+
+OpenCV reports the frame rate as a float (and the app used to truncate it
+to an int), so frame to time conversions of 29.97 or 59.94 broadcasts drift
+by seconds over a match, and variable frame rate sources cannot be
+converted with a single rate at all. `probe` asks ffprobe once for the
+stream rate as a fraction and for the presentation timestamp of every
+packet (demuxing only, nothing is decoded), and caches the result next to
+the video; frame index <-> seconds conversions then use the timestamps.
+Without ffprobe, OpenCV values are used with the rate rounded to the
+closest broadcast fraction.
+"""
+import json
+import logging
+import os
+import shutil
+import subprocess
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+
+from .audio import ffmpeg_exe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.probe.npz'
+
+# probed videos by (path, mtime)
+_CACHE = {}
+
+
+class MediaInfo:
+    def __init__(self, fps: Fraction, width: int, height: int, pts: np.ndarray = None, keyframes: np.ndarray = None,
+                 frame_count: int = None, start_offset: float = 0.0):
+        """
+        Arguments:
+            fps {Fraction} -- average frame rate
+            width {int} -- frame width
+            height {int} -- frame height
+
+        Keyword Arguments:
+            pts {np.ndarray} -- presentation time (seconds from the first frame) of each frame, sorted (default: {None})
+            keyframes {np.ndarray} -- indexes of the keyframes (default: {None})
+            frame_count {int} -- number of frames when pts are not known (default: {None})
+            start_offset {float} -- seconds from the start of the container to the first frame, where ffmpeg
+                                    seeks count from (default: {0.0})
+        """
+        self.fps = fps
+        self.width = width
+        self.height = height
+        self.pts = pts
+        self.keyframes = keyframes
+        self.frame_count = len(pts) if pts is not None else frame_count
+        self.start_offset = start_offset
+
+    @property
+    def duration(self):
+        """seconds from the first frame to the end of the last one"""
+        if self.pts is not None and len(self.pts):
+            return float(self.pts[-1]) + float(1 / self.fps)
+        return float(self.frame_count / self.fps)
+
+    @property
+    def is_vfr(self):
+        """whether frame durations vary by more than half a nominal frame"""
+        if self.pts is None or len(self.pts) < 3:
+            return False
+        return bool(np.any(np.abs(np.diff(self.pts) - float(1 / self.fps)) > float(0.5 / self.fps)))
+
+    def frame_time(self, frame_idx: int):
+        """presentation time in seconds of a frame, extrapolated at the nominal rate outside the video"""
+        if self.pts is None or not len(self.pts):
+            return float(frame_idx / self.fps)
+        if frame_idx < 0:
+            return float(frame_idx / self.fps)
+        if frame_idx >= len(self.pts):
+            return float(self.pts[-1]) + float((frame_idx - len(self.pts) + 1) / self.fps)
+        return float(self.pts[frame_idx])
+
+    def seek_time(self, frame_idx: int):
+        """time of a frame for ffmpeg -ss, which counts from the container start and not from the first frame
+        (MPEG-TS audio or data streams often start before the video)"""
+        return self.frame_time(frame_idx) + self.start_offset
+
+    def frame_at(self, seconds: float):
+        """index of the frame shown at a time, clamped to the video"""
+        if self.pts is None or not len(self.pts):
+            frame_idx = int(Fraction(seconds).limit_denominator(1000000) * self.fps)
+        else:
+            # a small tolerance keeps rounding errors of the caller on the right frame
+            frame_idx = int(np.searchsorted(self.pts, seconds + 1e-6, side='right')) - 1
+        return min(max(frame_idx, 0), max(self.frame_count - 1, 0))
+
+
+def ffprobe_exe():
+    """ffprobe on the PATH, or next to the ffmpeg binary, None if not found"""
+    ffprobe = shutil.which('ffprobe')
+    if ffprobe:
+        return ffprobe
+    ffmpeg = ffmpeg_exe()
+    directory, name = os.path.split(ffmpeg)
+    candidate = os.path.join(directory, name.replace('ffmpeg', 'ffprobe'))
+    return candidate if directory and os.path.isfile(candidate) else None
+
+
+def _ffprobe(ffprobe: str, video_path: str):
+    command = [ffprobe, '-v', 'error', '-select_streams', 'v:0', '-show_entries',
+               'stream=width,height,avg_frame_rate,r_frame_rate,time_base:packet=pts,flags:format=start_time',
+               '-of', 'json', video_path]
+    output = json.loads(subprocess.check_output(command).decode('utf-8'))
+    stream = output['streams'][0]
+    time_base = Fraction(stream['time_base'])
+    packets = [(int(packet['pts']), 'K' in packet.get('flags', ''))
+               for packet in output.get('packets', []) if packet.get('pts') not in (None, 'N/A')]
+    packets.sort()
+    pts = np.array([pts for pts, _ in packets], dtype=np.int64)
+    # integer ticks are exact, seconds are taken from the first frame
+    seconds = ((pts - pts[0]) * float(time_base)) if len(pts) else np.zeros(0)
+    keyframes = np.flatnonzero([is_key for _, is_key in packets])
+    start_time = output.get('format', {}).get('start_time')
+    start_offset = float(pts[0] * time_base) - float(start_time) if len(pts) and start_time not in (None, 'N/A') \
+        else 0.0
+
+    fps = Fraction(stream.get('avg_frame_rate') or '0/1')
+    if not fps:
+        fps = Fraction(stream.get('r_frame_rate') or '0/1')
+    if not fps and len(seconds) > 1:
+        fps = Fraction((len(seconds) - 1) / seconds[-1]).limit_denominator(1001)
+    return MediaInfo(fps, int(stream['width']), int(stream['height']), seconds, keyframes,
+                     start_offset=max(start_offset, 0.0))
+
+
+def _opencv_probe(video_path: str):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        # 29.97 is reported as 29.97002997..., the closest fraction with a broadcast denominator is 30000/1001
+        fps = Fraction(cap.get(cv2.CAP_PROP_FPS)).limit_denominator(1001)
+        return MediaInfo(fps, int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                         frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+    finally:
+        cap.release()
+
+
+def load_media(source):
+    """MediaInfo written by `dump_media`, from a path or a binary file object"""
+    with np.load(source, allow_pickle=False) as archive:
+        pts = archive['pts'] if archive['has_pts'] else None
+        keyframes = archive['keyframes'] if archive['has_pts'] else None
+        return MediaInfo(Fraction(int(archive['fps_num']), int(archive['fps_den'])), int(archive['width']),
+                         int(archive['height']), pts, keyframes, int(archive['frame_count']),
+                         float(archive['start_offset']))
+
+
+def dump_media(media: MediaInfo, target):
+    """write a MediaInfo as npz to a binary file object"""
+    has_pts = media.pts is not None
+    np.savez(target, fps_num=media.fps.numerator, fps_den=media.fps.denominator, width=media.width,
+             height=media.height, frame_count=media.frame_count, has_pts=has_pts,
+             pts=media.pts if has_pts else np.zeros(0), keyframes=media.keyframes if has_pts else np.zeros(0),
+             start_offset=media.start_offset)
+
+
+def _load_cache(cache_path: Path):
+    """cached MediaInfo, None for caches written before the start offset was stored"""
+    try:
+        return load_media(str(cache_path))
+    except KeyError:
+        return None
+
+
+def _save_cache(cache_path: Path, media: MediaInfo):
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    with open(str(tmp_path), 'wb') as cache_file:
+        dump_media(media, cache_file)
+    # worker processes may probe the same video
+    os.replace(str(tmp_path), str(cache_path))
+
+
+def probe(video_path: str, cache: bool = True):
+    """timing of a video, probed once and cached in memory and as <video>.probe.npz
+
+    Keyword Arguments:
+        cache {bool} -- read and write the <video>.probe.npz sidecar (default: {True})
+
+    Returns:
+        {MediaInfo} -- rate, size and frame timestamps of the first video stream
+    """
+    video_path = str(video_path)
+    mtime = Path(video_path).stat().st_mtime
+    media = _CACHE.get((video_path, mtime))
+    if media is not None:
+        return media
+
+    cache_path = Path(video_path + CACHE_SUFFIX)
+    media = None
+    if cache and cache_path.exists() and cache_path.stat().st_mtime >= mtime:
+        media = _load_cache(cache_path)
+    if media is None:
+        ffprobe = ffprobe_exe()
+        media = None
+        if ffprobe:
+            try:
+                media = _ffprobe(ffprobe, video_path)
+            except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+                LOGGER.exception('ffprobe of %s failed, timing read with opencv', video_path)
+        if media is None:
+            media = _opencv_probe(video_path)
+        if cache:
+            try:
+                _save_cache(cache_path, media)
+            except OSError as err:
+                # read-only video folder (shared drive), the video is probed again at the next session
+                LOGGER.warning('probe cache %s not written: %s', cache_path, err)
+        LOGGER.info('%s: %d frames at %s fps (%.3f), %.1f s%s', video_path, media.frame_count, media.fps,
+                    float(media.fps), media.duration, ', variable frame rate' if media.is_vfr else '')
+    _CACHE[(video_path, mtime)] = media
+    return media
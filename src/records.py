@@ -0,0 +1,82 @@
+"""indexed storage for the frame records shown on the video"""
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+def record_frame(record):
+    """frame index a record is attached to (roi records or imported events)"""
+    frame_idx = record.get('frame_idx')
+    return record['left_frames'] if frame_idx is None else frame_idx
+
+
+class RecordStore:
+    """records kept sorted by frame index
+
+    Frame indexes live in a compact integer array aligned with the record
+    list, so lookups by frame and neighbour searches are binary searches
+    instead of scans over every record.
+    """
+
+    def __init__(self, records=()):
+        self._frames = array('q')
+        self._records = []
+        for record in records:
+            self.add(record)
+
+    def __len__(self):
+        return len(self._records)
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def __getitem__(self, position):
+        return self._records[position]
+
+    def add(self, record):
+        """insert a record after the ones already stored on the same frame
+
+        Returns:
+            {int} -- position of the record in the store
+        """
+        frame_idx = record_frame(record)
+        position = bisect_right(self._frames, frame_idx)
+        self._frames.insert(position, frame_idx)
+        self._records.insert(position, record)
+        return position
+
+    def index(self, record):
+        """position of the record, looked up among the records of its frame only"""
+        frame_idx = record_frame(record)
+        for position in range(bisect_left(self._frames, frame_idx), bisect_right(self._frames, frame_idx)):
+            if self._records[position] is record:
+                return position
+        raise ValueError('record not in store')
+
+    def remove(self, record):
+        """remove a record
+
+        Returns:
+            {int} -- position the record had in the store
+        """
+        position = self.index(record)
+        del self._frames[position]
+        del self._records[position]
+        return position
+
+    def clear(self):
+        del self._frames[:]
+        self._records.clear()
+
+    def at(self, frame_idx: int):
+        """records attached to the given frame"""
+        return self._records[bisect_left(self._frames, frame_idx):bisect_right(self._frames, frame_idx)]
+
+    def previous(self, frame_idx: int):
+        """closest record strictly before the given frame, None if there is none"""
+        position = bisect_left(self._frames, frame_idx)
+        return self._records[position - 1] if position > 0 else None
+
+    def next(self, frame_idx: int):
+        """closest record strictly after the given frame, None if there is none"""
+        position = bisect_right(self._frames, frame_idx)
+        return self._records[position] if position < len(self._records) else None
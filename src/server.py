@@ -0,0 +1,374 @@
+"""local labeling server: decoders, frame caches and OCR shared by several annotators
+
+Every `VideoApp` normally opens its own decoders, hot windows, EAST network
+and tesseract processes. When several people label on one workstation,
+`python main.py --serve` starts a `LabelingServer` that owns all of them:
+videos are decoded once per video whatever the number of clients, decoded
+frames are kept in a single memory-bounded cache, and clock readings run on
+the server OCR pool. A `VideoApp` whose config has a `server.url` is a thin
+client: it asks the server for the timing of its videos, for the frames to
+display and for the match time of a roi, through `ServerClient`, and
+leaves ingesting to the server (shot indexes are not built in this mode).
+
+The server reads any video path a client sends, so it only listens on the
+loopback interface unless configured otherwise. Routes (`video` is the
+path of the original video, `index` a frame index):
+
+    GET  /media?video=           MediaInfo as npz (see probe.dump_media)
+    GET  /frame?video=&index=    raw BGR bytes, size in the X-Frame-Width and X-Frame-Height headers
+    GET  /timestamp?video=&index=&roi=x1,y1,x2,y2[&client=][&skip_unchanged=0]   {"text": clock text}
+    GET  /timestamps?video=&indexes=i,j,...&roi=x1,y1,x2,y2   {"texts": clock text of each frame}, batched OCR
+    POST /focus?video=&index=    decode the hot window around a frame
+"""
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs, urlencode, urlsplit
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from . import ingest, instrument, pools
+from .clock import configure_ocr, configured_clock_reader, read_clock, read_clocks
+from .hotwindow import HotFrames, clear_cache
+from .instrument import timer
+from .probe import dump_media, load_media, probe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+
+class FrameCache:
+    """decoded frames of all the videos, the least recently used are dropped beyond a memory budget"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            frame = self._frames.get(key)
+            if frame is not None:
+                self._frames.move_to_end(key)
+            return frame
+
+    def put(self, key, frame: np.ndarray):
+        with self._lock:
+            if key in self._frames:
+                return
+            self._frames[key] = frame
+            self.nbytes += frame.nbytes
+            while self.nbytes > self.max_bytes and len(self._frames) > 1:
+                _, dropped = self._frames.popitem(last=False)
+                self.nbytes -= dropped.nbytes
+
+    def drop(self, video_path: str):
+        """forget the frames of a video, keys are (video path, frame index)"""
+        with self._lock:
+            for key in [key for key in self._frames if key[0] == video_path]:
+                self.nbytes -= self._frames.pop(key).nbytes
+
+
+class VideoSource:
+    """decoder of a video shared by all the clients, with its hot window and clock readers"""
+
+    def __init__(self, video_path: str, decode_path: str, hot_window_config: dict = None, max_grab: int = 30):
+        """
+        Arguments:
+            video_path {str} -- video as named by the clients
+            decode_path {str} -- file actually decoded, its ingested copy when there is one
+
+        Keyword Arguments:
+            hot_window_config {dict} -- `hot_window` config section, no hot window if None (default: {None})
+            max_grab {int} -- frames ahead of the decoder reached by grabbing instead of seeking (default: {30})
+        """
+        self.video_path = video_path
+        self.decode_path = decode_path
+        self.max_grab = max_grab
+        self.media = probe(decode_path)
+        self.cap = cv2.VideoCapture(decode_path)
+        # index of the frame the next cap.read returns, None when unknown
+        self.position = None
+        self.hot_frames = None
+        hot_window_config = dict(hot_window_config or {})
+        if hot_window_config.pop('enabled', True):
+            self.hot_frames = HotFrames(decode_path, executor=pools.get('hot_window'),
+                                        **hot_window_config)
+        # ClockReader by (client, roi): a reader reuses the reading of the last frame it was asked for, which is
+        # only right for the requests of a single client
+        self.clock_readers = {}
+        self._lock = threading.Lock()
+
+    def read(self, frame_idx: int):
+        """BGR frame, None if it cannot be read"""
+        if not 0 <= frame_idx < self.media.frame_count:
+            return None
+        if self.hot_frames is not None:
+            frame = self.hot_frames.get(frame_idx)
+            if frame is not None:
+                instrument.count(instrument.HOT_WINDOW_HIT)
+                return frame
+        with self._lock:
+            ahead = frame_idx - self.position if self.position is not None else -1
+            if 0 <= ahead <= self.max_grab:
+                with timer(instrument.DECODE):
+                    for _ in range(ahead):
+                        if not self.cap.grab():
+                            break
+            else:
+                with timer(instrument.SEEK):
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, frame_idx)
+            with timer(instrument.DECODE):
+                read_success, frame = self.cap.read()
+            self.position = frame_idx + 1 if read_success else None
+        if not read_success:
+            LOGGER.error('read #%d frame of %s failed', frame_idx, self.video_path)
+            return None
+        return frame
+
+    def clock_reader(self, client: str, roi: tuple, ocr_config: dict):
+        with self._lock:
+            reader = self.clock_readers.get((client, roi))
+            if reader is None:
+                reader = self.clock_readers[client, roi] = configured_clock_reader(roi, float(self.media.fps),
+                                                                                   ocr_config)
+            return reader
+
+    def close(self):
+        if self.hot_frames is not None:
+            self.hot_frames.close()
+        with self._lock:
+            self.cap.release()
+
+
+class LabelingServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: dict, host: str = '127.0.0.1', port: int = 8765, frame_cache_mb: int = 1024,
+                 max_videos: int = 8):
+        """
+        Arguments:
+            config {dict} -- app config, its ocr, hot_window and ingest sections are used
+
+        Keyword Arguments:
+            host {str} -- listening address (default: {'127.0.0.1'})
+            port {int} -- listening port (default: {8765})
+            frame_cache_mb {int} -- memory of the decoded frames kept for all the videos (default: {1024})
+            max_videos {int} -- videos kept open, the least recently used is closed beyond (default: {8})
+        """
+        super().__init__((host, port), RequestHandler)
+        self.config = config
+        self.ocr_config = dict(config.get('ocr') or {})
+        configure_ocr(self.ocr_config)
+        self.ingest_config = dict(config.get('ingest') or {})
+        hot_window_config = config.get('hot_window') or {}
+        if hot_window_config.get('enabled', True):
+            clear_cache(hot_window_config.get('cache_dir', 'hot_frames'))
+        self.frames = FrameCache(frame_cache_mb * 1024 * 1024)
+        self.max_videos = max_videos
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    def source(self, video_path: str):
+        """decoder of a video, opened on the first request"""
+        with self._lock:
+            source = self._sources.get(video_path)
+            if source is not None:
+                self._sources.move_to_end(video_path)
+                return source
+        if not os.path.isfile(video_path):
+            raise FileNotFoundError(video_path)
+        decode_path = video_path
+        if self.ingest_config.get('enabled', True):
+            decode_path = ingest.decode_path(video_path, self.ingest_config.get('cache_dir', 'ingest_cache'))
+        opened = VideoSource(video_path, decode_path, self.config.get('hot_window'))
+        evicted = []
+        with self._lock:
+            source = self._sources.setdefault(video_path, opened)
+            while len(self._sources) > self.max_videos:
+                evicted.append(self._sources.popitem(last=False)[1])
+        if source is not opened:
+            # opened meanwhile by another request
+            opened.close()
+        else:
+            LOGGER.info('%s opened, decoded from %s', video_path, decode_path)
+            if decode_path == video_path and self.ingest_config.get('enabled', True):
+                # clients do not ingest in server mode: decoded from the remux once the video is opened again
+                pools.submit('ingest', ingest.ingest_video, video_path,
+                             self.ingest_config.get('cache_dir', 'ingest_cache'))
+        for old_source in evicted:
+            self.frames.drop(old_source.video_path)
+            old_source.close()
+        return source
+
+    def frame(self, video_path: str, frame_idx: int):
+        frame = self.frames.get((video_path, frame_idx))
+        if frame is None:
+            frame = self.source(video_path).read(frame_idx)
+            if frame is not None:
+                self.frames.put((video_path, frame_idx), frame)
+        return frame
+
+    def timestamp(self, video_path: str, frame_idx: int, roi: tuple, skip_unchanged: bool = True, client: str = ''):
+        """clock text in the roi of a frame, read on the OCR pool with the clock reader of the client"""
+        frame = self.frame(video_path, frame_idx)
+        if frame is None:
+            raise ValueError('frame {} of {} cannot be read'.format(frame_idx, video_path))
+        x1, y1, x2, y2 = roi
+        crop = frame[y1: y2, x1: x2].copy()
+        reader = self.source(video_path).clock_reader(client, roi, self.ocr_config)
+        return pools.submit('ocr', read_clock, reader, frame_idx, crop, skip_unchanged).result()
+
+    def timestamps(self, video_path: str, frames: list, roi: tuple):
+        """clock texts in the roi of several frames, recognized together on the OCR pool (see clock.read_clocks)"""
+        source = self.source(video_path)
+        return pools.submit('ocr', read_clocks, source.decode_path, frames, roi, self.ocr_config).result()
+
+    def focus(self, video_path: str, frame_idx: int):
+        source = self.source(video_path)
+        if source.hot_frames is not None:
+            source.hot_frames.focus(frame_idx)
+
+    def server_close(self):
+        super().server_close()
+        with self._lock:
+            sources = list(self._sources.values())
+            self._sources.clear()
+        for source in sources:
+            source.close()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self._dispatch({'/media': self._media, '/frame': self._frame, '/timestamp': self._timestamp,
+                        '/timestamps': self._timestamps})
+
+    def do_POST(self):
+        self._dispatch({'/focus': self._focus})
+
+    def log_message(self, format, *args):
+        LOGGER.debug(format, *args)
+
+    def _dispatch(self, routes: dict):
+        url = urlsplit(self.path)
+        route = routes.get(url.path)
+        if route is None:
+            self.send_error(404, 'unknown route {}'.format(url.path))
+            return
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            route(params)
+        except FileNotFoundError as err:
+            self.send_error(404, 'no video {}'.format(err))
+        except (KeyError, ValueError) as err:
+            self.send_error(400, str(err))
+        except Exception as err:
+            LOGGER.exception('%s failed', self.path)
+            self.send_error(500, str(err))
+
+    def _send(self, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _media(self, params: dict):
+        buffer = io.BytesIO()
+        dump_media(self.server.source(params['video']).media, buffer)
+        self._send(buffer.getvalue(), 'application/octet-stream')
+
+    def _frame(self, params: dict):
+        frame_idx = int(params['index'])
+        frame = self.server.frame(params['video'], frame_idx)
+        if frame is None:
+            raise ValueError('frame {} cannot be read'.format(frame_idx))
+        height, width = frame.shape[:2]
+        self._send(np.ascontiguousarray(frame).tobytes(), 'application/octet-stream',
+                   {'X-Frame-Width': width, 'X-Frame-Height': height})
+
+    @staticmethod
+    def _roi(params: dict):
+        roi = tuple(int(value) for value in params['roi'].split(','))
+        if len(roi) != 4:
+            raise ValueError('roi should be x1,y1,x2,y2')
+        return roi
+
+    def _timestamp(self, params: dict):
+        text = self.server.timestamp(params['video'], int(params['index']), self._roi(params),
+                                     params.get('skip_unchanged', '1') != '0', params.get('client', ''))
+        self._send(json.dumps({'text': text}).encode('utf-8'), 'application/json')
+
+    def _timestamps(self, params: dict):
+        frames = [int(value) for value in params['indexes'].split(',') if value]
+        texts = self.server.timestamps(params['video'], frames, self._roi(params))
+        self._send(json.dumps({'texts': texts}).encode('utf-8'), 'application/json')
+
+    def _focus(self, params: dict):
+        self.server.focus(params['video'], int(params['index']))
+        self._send(b'', 'text/plain')
+
+
+class ServerClient:
+    """connection of a VideoApp to a labeling server"""
+
+    def __init__(self, url: str, timeout: float = 60.0):
+        self.url = url.rstrip('/')
+        self.timeout = timeout
+        # the server keeps a clock reader per client
+        self.client_id = uuid.uuid4().hex
+
+    def _request(self, route: str, method: str = 'GET', **params):
+        request = Request('{}{}?{}'.format(self.url, route, urlencode(params)), method=method)
+        with urlopen(request, timeout=self.timeout) as response:
+            return response.read(), response.headers
+
+    def media(self, video_path: str):
+        body, _ = self._request('/media', video=video_path)
+        return load_media(io.BytesIO(body))
+
+    def frame(self, video_path: str, frame_idx: int):
+        """BGR frame (read-only array)"""
+        body, headers = self._request('/frame', video=video_path, index=frame_idx)
+        shape = (int(headers['X-Frame-Height']), int(headers['X-Frame-Width']), 3)
+        return np.frombuffer(body, dtype=np.uint8).reshape(shape)
+
+    def timestamp(self, video_path: str, frame_idx: int, roi: tuple, skip_unchanged: bool = True):
+        body, _ = self._request('/timestamp', video=video_path, index=frame_idx, roi=','.join(map(str, roi)),
+                                client=self.client_id, skip_unchanged=int(skip_unchanged))
+        return json.loads(body.decode('utf-8'))['text']
+
+    def timestamps(self, video_path: str, frames: list, roi: tuple):
+        body, _ = self._request('/timestamps', video=video_path, indexes=','.join(map(str, frames)),
+                                roi=','.join(map(str, roi)))
+        return json.loads(body.decode('utf-8'))['texts']
+
+    def focus(self, video_path: str, frame_idx: int):
+        self._request('/focus', method='POST', video=video_path, index=frame_idx)
+
+
+def serve(config: dict):
+    """run a labeling server with the `server` config section until interrupted"""
+    server_config = {key: value for key, value in (config.get('server') or {}).items() if key != 'url'}
+    server = LabelingServer(config, **server_config)
+    LOGGER.info('labeling server listening on http://%s:%d', *server.server_address[:2])
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        pools.shutdown()
+        instrument.shutdown()
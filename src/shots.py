@@ -0,0 +1,145 @@
+"""shot boundary and replay transition index of a whole match
+
+Frames are downscaled and compared through their HSV color histograms;
+a large distance between two consecutive frames is a hard cut. Broadcast
+replays are framed by animated logo wipes, which show up as a burst of
+moderate distances over a few frames instead of a single spike: those
+gradual transitions are indexed as replay candidates.
+
+The video is split in segments analyzed in parallel by a process pool, and
+the result is cached next to the video so it is computed once per match.
+"""
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from .decode import iter_frames
+from .probe import probe
+from .startup import lazy_import
+
+cv2 = lazy_import('cv2')
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_SUFFIX = '.shots.npz'
+
+HARD_CUT = 0
+GRADUAL = 1
+
+
+def frame_histogram(frame: np.ndarray, size: tuple = (64, 36), bins: tuple = (16, 8)):
+    """normalized hue/saturation histogram of a downscaled BGR frame"""
+    small = frame if (frame.shape[1], frame.shape[0]) == tuple(size) else cv2.resize(frame, size,
+                                                                                       interpolation=cv2.INTER_AREA)
+    hsv = cv2.cvtColor(small, cv2.COLOR_BGR2HSV)
+    histogram = cv2.calcHist([hsv], [0, 1], None, list(bins), [0, 180, 0, 256])
+    return cv2.normalize(histogram, histogram).flatten()
+
+
+def segment_distances(video_path: str, first: int, last: int):
+    """histogram distance between each frame of [first, last) and its previous frame
+
+    Runs in a worker process: each segment decodes its own downscaled frames.
+    """
+    distances = np.zeros(last - first, dtype=np.float32)
+    previous = None
+    for frame_idx, frame in iter_frames(video_path, size=(64, 36), start_frame=max(0, first - 1), end_frame=last):
+        histogram = frame_histogram(frame)
+        if previous is not None and frame_idx >= first:
+            distances[frame_idx - first] = cv2.compareHist(previous, histogram, cv2.HISTCMP_BHATTACHARYYA)
+        previous = histogram
+    return distances
+
+
+def classify_transitions(distances: np.ndarray, cut_threshold: float = 0.5, gradual_threshold: float = 1.2,
+                         gradual_window: int = 10, min_gap: int = 12):
+    """find hard cuts and gradual transitions in the frame to frame distances
+
+    Returns:
+        {tuple} -- (frame indexes, kinds) sorted by frame, kinds are HARD_CUT or GRADUAL
+    """
+    # adaptive: a cut must also stand out from the local motion level
+    local = np.convolve(distances, np.ones(25) / 25, mode='same')
+    hard = np.flatnonzero((distances > cut_threshold) & (distances > 3 * local))
+
+    window_sum = np.convolve(distances, np.ones(gradual_window), mode='same')
+    gradual = np.flatnonzero(window_sum > gradual_threshold)
+    if len(hard) and len(gradual):
+        # drop the windows explained by a hard cut
+        position = np.searchsorted(hard, gradual)
+        left = hard[np.clip(position - 1, 0, len(hard) - 1)]
+        right = hard[np.clip(position, 0, len(hard) - 1)]
+        nearest = np.minimum(np.abs(gradual - left), np.abs(gradual - right))
+        gradual = gradual[nearest > gradual_window]
+
+    frames, kinds = [], []
+    for frame_idx, kind in sorted([(int(f), HARD_CUT) for f in hard] + [(int(f), GRADUAL) for f in gradual]):
+        if frames and frame_idx - frames[-1] < min_gap:
+            # keep a single transition per burst, a hard cut wins over a gradual one
+            if kind == HARD_CUT and kinds[-1] == GRADUAL:
+                frames[-1], kinds[-1] = frame_idx, kind
+            continue
+        frames.append(frame_idx)
+        kinds.append(kind)
+    return np.array(frames, dtype=np.int64), np.array(kinds, dtype=np.int8)
+
+
+class ShotIndex:
+    def __init__(self, frames: np.ndarray, kinds: np.ndarray):
+        self.frames = frames
+        self.kinds = kinds
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def replays(self):
+        """frames of the gradual transitions (replay candidates)"""
+        return self.frames[self.kinds == GRADUAL]
+
+    def previous(self, frame_idx: int):
+        """closest transition strictly before the frame, None if there is none"""
+        position = np.searchsorted(self.frames, frame_idx, side='left')
+        return int(self.frames[position - 1]) if position > 0 else None
+
+    def next(self, frame_idx: int):
+        """closest transition strictly after the frame, None if there is none"""
+        position = np.searchsorted(self.frames, frame_idx, side='right')
+        return int(self.frames[position]) if position < len(self.frames) else None
+
+    @classmethod
+    def build(cls, video_path: str, workers: int = None, segment_frames: int = 9000, executor=None, **kwargs):
+        """analyze the whole video with a process pool (or the given executor) and classify transitions"""
+        frame_count = probe(video_path).frame_count
+        bounds = [(first, min(first + segment_frames, frame_count)) for first in range(0, frame_count, segment_frames)]
+
+        own_executor = executor is None
+        executor = executor or ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [executor.submit(segment_distances, video_path, first, last) for first, last in bounds]
+            distances = np.concatenate([future.result() for future in futures]) if futures else np.zeros(0)
+        finally:
+            if own_executor:
+                executor.shutdown()
+        frames, kinds = classify_transitions(distances, **kwargs)
+        LOGGER.info('%d shot transitions (%d gradual) in %s', len(frames), np.count_nonzero(kinds == GRADUAL),
+                    video_path)
+        return cls(frames, kinds)
+
+    @classmethod
+    def load(cls, video_path: str, **kwargs):
+        """load the cached index of a video, building it when missing or older than the video"""
+        cache_path = Path(str(video_path) + CACHE_SUFFIX)
+        if cache_path.exists() and cache_path.stat().st_mtime >= Path(video_path).stat().st_mtime:
+            with np.load(str(cache_path)) as archive:
+                return cls(archive['frames'], archive['kinds'])
+        index = cls.build(video_path, **kwargs)
+        try:
+            with open(str(cache_path), 'wb') as cache_file:
+                np.savez(cache_file, frames=index.frames, kinds=index.kinds)
+        except OSError as err:
+            # read-only video folder, the index is built again next time
+            LOGGER.warning('shot index cache %s not written: %s', cache_path, err)
+        return index
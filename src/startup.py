@@ -0,0 +1,155 @@
+"""lazy imports and startup timing
+
+Heavy modules (cv2, pandas, moviepy, the OCR stack) are only needed once a
+video is opened or a highlight is cut, so they are imported on first use or
+by a background warm-up thread started once the window is shown. Every
+import and startup phase is timed, and `report` logs the breakdown of the
+time to first window. Within `import_times`, each module executed by an
+import is timed too, as `python -X importtime` does, so that a slower start
+can be traced to the module responsible.
+"""
+import importlib
+import logging
+import sys
+import threading
+import types
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+
+PROCESS_START = perf_counter()
+
+# label -> (seconds, thread name), in completion order
+TIMINGS = OrderedDict()
+_TIMINGS_LOCK = threading.Lock()
+# nesting depth of the module executions timed by `import_times`, per thread
+_IMPORT_DEPTH = threading.local()
+
+
+def _record(label: str, seconds: float):
+    with _TIMINGS_LOCK:
+        TIMINGS[label] = (seconds, threading.current_thread().name)
+
+
+@contextmanager
+def phase(label: str):
+    """time a startup phase (e.g. an eager import or the window construction)"""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        _record(label, perf_counter() - start)
+
+
+def timed_import(name: str):
+    """import a module and record how long it took (nothing if already imported)"""
+    start = perf_counter()
+    module = importlib.import_module(name)
+    label = 'import ' + name
+    if label not in TIMINGS:
+        _record(label, perf_counter() - start)
+    return module
+
+
+class _TimedLoader:
+    """loader wrapper timing the execution of a module, its own imports included"""
+
+    def __init__(self, loader, min_seconds: float):
+        self.loader = loader
+        self.min_seconds = min_seconds
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # the module only ever sees its real loader
+        module.__loader__ = module.__spec__.loader = self.loader
+        depth = getattr(_IMPORT_DEPTH, 'value', 0)
+        _IMPORT_DEPTH.value = depth + 1
+        start = perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            _IMPORT_DEPTH.value = depth
+            seconds = perf_counter() - start
+            if seconds >= self.min_seconds:
+                # recorded after the modules it imported, indented below them by depth like `-X importtime`
+                _record('import ' + '  ' * depth + module.__name__, seconds)
+
+    def __getattr__(self, attr):
+        return getattr(self.loader, attr)
+
+
+class _ImportTimer:
+    """meta path finder handing out timed loaders for the modules found by the other finders"""
+
+    def __init__(self, min_seconds: float):
+        self.min_seconds = min_seconds
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimedLoader(spec.loader, self.min_seconds)
+            return spec
+        return None
+
+
+@contextmanager
+def import_times(min_seconds: float = 0.001):
+    """time every module imported in the block (cumulative, nested ones included), skipping the faster ones"""
+    timer = _ImportTimer(min_seconds)
+    sys.meta_path.insert(0, timer)
+    try:
+        yield
+    finally:
+        sys.meta_path.remove(timer)
+
+
+class LazyModule(types.ModuleType):
+    """module placeholder importing the real module on first attribute access"""
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            module = timed_import(self.__name__)
+            self.__dict__['_module'] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+
+def lazy_import(name: str):
+    return LazyModule(name)
+
+
+def warm_up(*names):
+    """import modules in a daemon thread so that their first use does not stall the GUI"""
+    def _import_all():
+        for name in names:
+            try:
+                timed_import(name)
+            except ImportError:
+                logging.getLogger(__name__).exception('warm up import of %s failed', name)
+    thread = threading.Thread(target=_import_all, name='warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def report(logger: logging.Logger, label: str = 'first window'):
+    """log the time elapsed since the process started and the per phase/import breakdown"""
+    total = perf_counter() - PROCESS_START
+    logger.info('time to %s: %.1f ms', label, total * 1000)
+    with _TIMINGS_LOCK:
+        timings = list(TIMINGS.items())
+    for name, (seconds, thread_name) in timings:
+        logger.info('  %-40s %8.1f ms  [%s]', name, seconds * 1000, thread_name)
@@ -3,125 +3,218 @@
 # python text_recognition.py --east frozen_east_text_detection.pb --image match_frame.png --padding 0.08
 
 # import the necessary packages
+import logging
 from imutils.object_detection import non_max_suppression
 import numpy as np
 import pytesseract
 import argparse
+import threading
+from collections import OrderedDict
 import cv2
 
+from . import instrument
+from .instrument import timer
+from .clock import binarize_clock, parse_clock
+
+LOGGER = logging.getLogger(__name__)
+
 # TO BE COMMENTED FOR LINUX OS
 pytesseract.pytesseract.tesseract_cmd = 'C:\\Program Files (x86)\\Tesseract-OCR\\tesseract.exe'
 
 
 def decode_predictions(scores, geometry, min_confidence):
-    # grab the number of rows and columns from the scores volume, then
-    # initialize our set of bounding box rectangles and corresponding
-    # confidence scores
-    (numRows, numCols) = scores.shape[2:4]
-    rects = []
-    confidences = []
-
-    # loop over the number of rows
-    for y in range(0, numRows):
-        # extract the scores (probabilities), followed by the
-        # geometrical data used to derive potential bounding box
-        # coordinates that surround text
-        scoresData = scores[0, 0, y]
-        xData0 = geometry[0, 0, y]
-        xData1 = geometry[0, 1, y]
-        xData2 = geometry[0, 2, y]
-        xData3 = geometry[0, 3, y]
-        anglesData = geometry[0, 4, y]
-
-        # loop over the number of columns
-        for x in range(0, numCols):
-            # if our score does not have sufficient probability,
-            # ignore it
-            if scoresData[x] < min_confidence:
-                continue
-
-            # compute the offset factor as our resulting feature
-            # maps will be 4x smaller than the input image
-            (offsetX, offsetY) = (x * 4.0, y * 4.0)
-
-            # extract the rotation angle for the prediction and
-            # then compute the sin and cosine
-            angle = anglesData[x]
-            cos = np.cos(angle)
-            sin = np.sin(angle)
-
-            # use the geometry volume to derive the width and height
-            # of the bounding box
-            h = xData0[x] + xData2[x]
-            w = xData1[x] + xData3[x]
-
-            # compute both the starting and ending (x, y)-coordinates
-            # for the text prediction bounding box
-            endX = int(offsetX + (cos * xData1[x]) + (sin * xData2[x]))
-            endY = int(offsetY - (sin * xData1[x]) + (cos * xData2[x]))
-            startX = int(endX - w)
-            startY = int(endY - h)
-
-            # add the bounding box coordinates and probability score
-            # to our respective lists
-            rects.append((startX, startY, endX, endY))
-            confidences.append(scoresData[x])
-
-    # return a tuple of the bounding boxes and associated confidences
-    return (rects, confidences)
+    """boxes and confidences of the cells of one EAST output above min_confidence
 
+    Arguments:
+        scores {np.ndarray} -- (1, 1, rows, cols) score map
+        geometry {np.ndarray} -- (1, 5, rows, cols) distances to the box sides and angle
 
-def recognizer(img, *args, **kwargs):
-    min_confidence = kwargs.get('min_confidence', 0.5)
-    width = kwargs.get('width', 320)
-    height = kwargs.get('height', 320)
-    padding = kwargs.get('padding', 0.08)
-    east = kwargs.get('east', 'frozen_east_text_detection.pb')
-    x1 = kwargs.get('x1', 0)
-    y1 = kwargs.get('y1', 0)
-    x2 = kwargs.get('x2', 0)
-    y2 = kwargs.get('y2', 0)
+    Returns:
+        {tuple} -- (list of (startX, startY, endX, endY), list of confidences)
+    """
+    # all the cells above the threshold are decoded at once instead of looping over rows and columns
+    ys, xs = np.nonzero(scores[0, 0] >= min_confidence)
+    if not len(ys):
+        return [], []
+    d0, d1, d2, d3, angles = geometry[0][:, ys, xs]
+
+    # the feature maps are 4x smaller than the input image
+    offsetX, offsetY = xs * 4.0, ys * 4.0
+    cos, sin = np.cos(angles), np.sin(angles)
+
+    # width and height of the box from the distances to its sides
+    h = d0 + d2
+    w = d1 + d3
+
+    endX = (offsetX + (cos * d1) + (sin * d2)).astype(int)
+    endY = (offsetY - (sin * d1) + (cos * d2)).astype(int)
+    startX = (endX - w).astype(int)
+    startY = (endY - h).astype(int)
+
+    rects = list(zip(startX.tolist(), startY.tolist(), endX.tolist(), endY.tolist()))
+    return rects, list(scores[0, 0, ys, xs])
 
-    # load the input image and grab the image dimensions
 
-    image = cv2.imread(img)
+def decode_batch(scores, geometry, min_confidence):
+    """decode_predictions for each image of a batched EAST output, followed by non-maxima suppression
 
+    Returns:
+        {list} -- (n, 4) array of boxes per image, in the network input coordinates
+    """
+    boxes = []
+    for i in range(scores.shape[0]):
+        rects, confidences = decode_predictions(scores[i:i + 1], geometry[i:i + 1], min_confidence)
+        boxes.append(non_max_suppression(np.array(rects), probs=confidences) if rects else np.zeros((0, 4), int))
+    return boxes
 
-    image = cv2.bitwise_not(image)
-    (origH, origW) = image.shape[:2]
 
-    orig = image.copy()
+# EAST networks already loaded, by model path; a net is not safe to run from several threads at once
+_NETS = {}
+_NETS_LOCK = threading.Lock()
 
-    # set the new width and height and then determine the ratio in change
-    # for both the width and height
-    (newW, newH) = (width, height)
+EAST_LAYERS = ["feature_fusion/Conv_7/Sigmoid", "feature_fusion/concat_3"]
 
-    rW = origW / float(newW)
-    rH = origH / float(newH)
 
-    # resize the image and grab the new image dimensions
-    image = cv2.resize(image, (newW, newH))
-    (H, W) = image.shape[:2]
+def east_input_size(width: int, height: int, text_height: int = 32, max_side: int = 1280):
+    """(W, H) EAST input for a crop: same aspect ratio, multiples of 32
 
-    layerNames = [
-        "feature_fusion/Conv_7/Sigmoid",
-        "feature_fusion/concat_3"]
+    The time roi is drawn tightly around a single line of text, so its
+    height is taken as the text height and scaled to `text_height` pixels
+    (rounded up to a multiple of 32, the network stride): a larger value
+    is more accurate on small clocks, a smaller one is faster.
+    """
+    scale = min(text_height / float(max(height, 1)), max_side / float(max(width, height, 1)))
 
-    # load the pre-trained EAST text detector
-    print("[INFO] loading EAST text detector...")
-    net = cv2.dnn.readNet(east)
+    def round32(value):
+        return max(32, int(np.ceil(value / 32.0)) * 32)
+    return round32(width * scale), round32(height * scale)
 
-    # construct a blob from the image and then perform a forward pass of
-    # the model to obtain the two output layer sets
-    blob = cv2.dnn.blobFromImage(image, 1.0, (W, H),
-                                 (123.68, 116.78, 103.94), swapRB=True, crop=False)
-    net.setInput(blob)
-    (scores, geometry) = net.forward(layerNames)
 
-    # decode the predictions, then  apply non-maxima suppression to
-    # suppress weak, overlapping bounding boxes
-    (rects, confidences) = decode_predictions(scores, geometry, min_confidence)
-    boxes = non_max_suppression(np.array(rects), probs=confidences)
+def load_east(east: str):
+    """(net, lock) of an EAST model, read once per process; its threads are set by clock.configure_ocr"""
+    with _NETS_LOCK:
+        if east not in _NETS:
+            LOGGER.info('loading EAST text detector', extra={'fields': {'model': east}})
+            _NETS[east] = (cv2.dnn.readNet(east), threading.Lock())
+        return _NETS[east]
+
+
+def recognize_fixed_roi(image, min_height: int = 48):
+    """read the clock of a crop drawn tightly around it, without text detection
+
+    The crop is upscaled to a height tesseract reads reliably, binarized with
+    Otsu (dark digits on a light background) and recognized as a single line
+    restricted to digits and colon.
+    """
+    binary = binarize_clock(image, min_height)
+
+    # --psm 7: the image is a single text line
+    config = ("--oem 1 --psm 7 -c tessedit_char_whitelist=0123456789:")
+    with timer(instrument.OCR_RECOGNIZE):
+        text = pytesseract.image_to_string(binary, config=config)
+    return text.strip()
+
+
+def recognizer(img, *args, **kwargs):
+    """recognize the match time in a time roi crop
+
+    Keyword Arguments:
+        mode {str} -- 'fixed_roi' reads the crop directly, 'east' runs EAST text detection first (default: {'fixed_roi'})
+        east_fallback {bool} -- in fixed_roi mode, run EAST when the reading is not a MM:SS clock (default: {False})
+    """
+    image = cv2.imread(img) if isinstance(img, str) else img
+    if kwargs.get('mode', 'fixed_roi') == 'east':
+        return recognize_east(image, **kwargs)
+
+    text = recognize_fixed_roi(image)
+    if parse_clock(text) is None and kwargs.get('east_fallback', False):
+        return recognize_east(image, **kwargs)
+    return text
+
+
+def recognizer_batch(images, **kwargs):
+    """recognizer for several crops (paths or arrays), with batched EAST passes
+
+    Returns:
+        {list} -- recognized text of each crop
+    """
+    images = [cv2.imread(img) if isinstance(img, str) else img for img in images]
+    if kwargs.get('mode', 'fixed_roi') == 'east':
+        return recognize_east_batch(images, **kwargs)
+
+    texts = [recognize_fixed_roi(image) for image in images]
+    if kwargs.get('east_fallback', False):
+        unreadable = [i for i, text in enumerate(texts) if parse_clock(text) is None]
+        if unreadable:
+            for i, text in zip(unreadable, recognize_east_batch([images[i] for i in unreadable], **kwargs)):
+                texts[i] = text
+    return texts
+
+
+def recognize_east(image, *args, **kwargs):
+    """recognize the text of a crop with EAST text detection followed by tesseract, None if no text is found"""
+    return recognize_east_batch([image], **kwargs)[0]
+
+
+def recognize_east_batch(images, **kwargs):
+    """recognize_east for several crops, the EAST forward passes are batched
+
+    The crops are resized to the same network input, stacked with
+    blobFromImages and run through the network `batch_size` at a time, so
+    the per-call overhead of OpenCV DNN is paid once per batch.
+
+    Keyword Arguments:
+        batch_size {int} -- crops per forward pass (default: {8})
+        input_size {str} -- 'auto' keeps the crop aspect ratio (see east_input_size), 'fixed' resizes every
+            crop to width x height (default: {'fixed'})
+        text_height {int} -- network input height of the text in 'auto' mode (default: {32})
+
+    Returns:
+        {list} -- recognized text (None if no text is detected) of each crop
+    """
+    min_confidence = kwargs.get('min_confidence', 0.5)
+    padding = kwargs.get('padding', 0.08)
+    east = kwargs.get('east', 'frozen_east_text_detection.pb')
+    batch_size = max(1, int(kwargs.get('batch_size', 8)))
+
+    net, net_lock = load_east(east)
+    originals = [cv2.bitwise_not(image) for image in images]
+    if kwargs.get('input_size', 'fixed') == 'auto':
+        sizes = [east_input_size(image.shape[1], image.shape[0], kwargs.get('text_height', 32))
+                 for image in originals]
+    else:
+        sizes = [(kwargs.get('width', 320), kwargs.get('height', 320))] * len(originals)
+
+    # a blob holds images of a single size, crops of the same roi share it
+    boxes = [None] * len(originals)
+    for size in OrderedDict.fromkeys(sizes):
+        indexes = [i for i, image_size in enumerate(sizes) if image_size == size]
+        for first in range(0, len(indexes), batch_size):
+            batch_indexes = indexes[first:first + batch_size]
+            batch = [cv2.resize(originals[i], size) for i in batch_indexes]
+            # construct a blob from the images and then perform a single forward pass of
+            # the model to obtain the two output layer sets of the whole batch
+            blob = cv2.dnn.blobFromImages(batch, 1.0, size,
+                                          (123.68, 116.78, 103.94), swapRB=True, crop=False)
+            with timer(instrument.OCR_DETECT):
+                with net_lock:
+                    net.setInput(blob)
+                    (scores, geometry) = net.forward(EAST_LAYERS)
+                # decode the predictions, then apply non-maxima suppression to
+                # suppress weak, overlapping bounding boxes
+                for i, image_boxes in zip(batch_indexes, decode_batch(scores, geometry, min_confidence)):
+                    boxes[i] = image_boxes
+
+    return [_recognize_boxes(orig, image_boxes, size[0], size[1], padding)
+            for orig, image_boxes, size in zip(originals, boxes, sizes)]
+
+
+def _recognize_boxes(orig, boxes, width, height, padding):
+    """tesseract on the padded detected boxes of a crop, text of the top one"""
+    (origH, origW) = orig.shape[:2]
+    # ratio between the crop and the network input
+    rW = origW / float(width)
+    rH = origH / float(height)
 
     # initialize the list of results
     results = []
@@ -156,7 +249,8 @@ def recognizer(img, *args, **kwargs):
         # (3) an OEM value, in this case, 7 which implies that we are
         # treating the ROI as a single line of text
         config = ("-l eng --oem 1 --psm 13")
-        text = pytesseract.image_to_string(roi, config=config)
+        with timer(instrument.OCR_RECOGNIZE):
+            text = pytesseract.image_to_string(roi, config=config)
 
         # add the bounding box coordinates and OCR'd text to the list
         # of results
@@ -167,12 +261,10 @@ def recognizer(img, *args, **kwargs):
 
     # loop over the results
     for ((startX, startY, endX, endY), text) in results:
-        # display the text OCR'd by Tesseract
-        print("OCR TEXT")
-        print("========")
-        print("{}\n".format(text))
+        # log the text OCR'd by Tesseract
+        LOGGER.debug('OCR text', extra={'fields': {'text': repr(text), 'box': (startX, startY, endX, endY)}})
         return(text)
-    print("concluded")
+    LOGGER.debug('no text detected')
 
 
     # # strip out non-ASCII text so we can draw the text on the image
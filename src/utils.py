@@ -1,20 +1,99 @@
 """some utility function"""
+import copy
 import logging
+import queue
 import sys
-from datetime import datetime
+import threading
+from datetime import timedelta
 from functools import wraps
+from logging.handlers import QueueHandler, QueueListener
+from time import perf_counter_ns
+
+from .instrument import METRICS
 
 LOGGER = logging.getLogger(__name__)
 
 
-def log_handler(*loggers, logname: str = ''):
-    """[summary]
+class RateLimitFilter(logging.Filter):
+    """let through at most `burst` records per `interval` seconds from each logging call site
+
+    Warnings and errors are never dropped. The first record let through
+    after a suppression carries the number of records dropped meanwhile.
+    """
+
+    def __init__(self, interval: float = 1.0, burst: int = 5):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        # (logger, file, line) -> [window start, records let through, records suppressed]
+        self._sites = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or record.created - site[0] >= self.interval:
+                if site is not None and site[2]:
+                    record.suppressed = site[2]
+                self._sites[key] = [record.created, 1, 0]
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            return False
+
+
+class StructuredFormatter(logging.Formatter):
+    """formatter appending the `fields` given as extra as key=value pairs
+
+        logger.debug('roi drawn', extra={'fields': {'x1': x1, 'y1': y1}})
+    """
+
+    def formatMessage(self, record):
+        message = super().formatMessage(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            message += ' ' + ' '.join('{}={}'.format(key, value) for key, value in fields.items())
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            message += ' ({} similar messages suppressed)'.format(suppressed)
+        return message
+
+
+class _QueueHandler(QueueHandler):
+    def prepare(self, record):
+        # only the message is merged on the calling thread, formatting and I/O happen on the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+_LISTENER = None
+
+
+def log_handler(*loggers, logname: str = '', rate_interval: float = 1.0, rate_burst: int = 5):
+    """log to stdout (and to a file) without blocking the calling threads
+
+    Records go through a queue to a listener thread owning the stream and
+    file handlers, so the GUI thread never waits on I/O; repeated records
+    from the same call site are rate limited (see RateLimitFilter).
 
     Keyword Arguments:
-        logname {str} -- [description] (default: {''})
+        logname {str} -- also log to this file, with debug records (default: {''})
+        rate_interval {float} -- rate limit window in seconds (default: {1.0})
+        rate_burst {int} -- records per call site and window (default: {5})
     """
+    global _LISTENER
 
-    formatter = logging.Formatter(
+    formatter = StructuredFormatter(
         '%(asctime)s %(filename)12s:L%(lineno)3s [%(levelname)8s] %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S')
 
@@ -22,27 +101,48 @@ def log_handler(*loggers, logname: str = ''):
     shell_handler = logging.StreamHandler(sys.stdout)
     shell_handler.setLevel(logging.INFO)
     shell_handler.setFormatter(formatter)
+    handlers = [shell_handler]
 
     # file handler
     if logname:
         file_handler = logging.FileHandler(logname)
         file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
+        handlers.append(file_handler)
 
+    stop_logging()
+    log_queue = queue.SimpleQueue()
+    _LISTENER = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _LISTENER.start()
+
+    queue_handler = _QueueHandler(log_queue)
+    # records no handler would write are not even queued
+    queue_handler.setLevel(min(handler.level for handler in handlers))
+    queue_handler.addFilter(RateLimitFilter(rate_interval, rate_burst))
     for logger in loggers:
-        if logname:
-            logger.addHandler(file_handler)
-        logger.addHandler(shell_handler)
+        logger.addHandler(queue_handler)
         logger.setLevel(logging.DEBUG)
 
+
+def stop_logging():
+    """flush the queued records and stop the listener thread"""
+    global _LISTENER
+    if _LISTENER is not None:
+        _LISTENER.stop()
+        _LISTENER = None
+
+
 def func_profile(func):
-    """record the function processing time"""
+    """record the function processing time (logged, and in the metrics when instrumentation is on)"""
+    fullname = '{}.{}'.format(func.__module__, func.__name__)
+
     @wraps(func)
     def wrapped(*args, **kwargs):
-        start_time = datetime.now()
+        start_time = perf_counter_ns()
         result = func(*args, **kwargs)
-        cost_time = datetime.now() - start_time
-        fullname = '{}.{}'.format(func.__module__, func.__name__)
-        LOGGER.info('%s[kwargs=%s] completed in %s', fullname, kwargs, str(cost_time))
+        cost_time = perf_counter_ns() - start_time
+        if METRICS.enabled:
+            METRICS.observe(fullname, cost_time)
+        LOGGER.info('%s[kwargs=%s] completed in %s', fullname, kwargs, str(timedelta(microseconds=cost_time // 1000)))
         return result
     return wrapped
@@ -0,0 +1,232 @@
+"""integrity check of the cut clips against their labels
+
+A clip should hold the frames from `starting_frame - added_frames_bf` to
+`ending_frame + added_frames_bf` of its match, as written in
+labels_info.csv, cut to the frames the match actually has. Stream-copied
+cuts start on a keyframe and often do not. `verify` probes every clip in
+parallel worker processes and compares its frame count and duration with
+the labels. Probe results are cached next to each labels_info.csv, keyed by
+the size and modification time of the clip, so a run only probes new or
+changed clips (labels are always compared again). Virtual clips
+(virtual_labels_info.csv) have no file: their window is checked against
+the frames of the match.
+
+    python -m src.verify /path/to/matches --workers 8 --csv report.csv
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from .labels import LabelStore
+from .probe import probe
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_FILE = 'verify_cache.json'
+
+# status of a clip: ok, frames or duration (mismatch), range (virtual clip outside its match), missing (no clip or
+# match file), error (probe failed)
+ClipCheck = namedtuple('ClipCheck', ['clip', 'status', 'expected_frames', 'frame_count', 'expected_duration',
+                                     'duration', 'message'])
+
+
+def expected_window(row: dict, frame_count: int = None):
+    """(first frame, frame count) of the padded window a clip should hold; cuts cannot start before the match nor
+    end after its `frame_count` frames (when known)"""
+    first = max(0, row['starting_frame'] - row['added_frames_bf'])
+    last = row['ending_frame'] + row['added_frames_bf']
+    if frame_count is not None:
+        last = min(last, frame_count - 1)
+    return first, max(0, last - first + 1)
+
+
+def match_path(row: dict, cuts_dir: str):
+    """the match video a label was cut from, named by the virtual clip itself or rebuilt from the cut name (the
+    match file name with 'label_<n>' in place of 'complete', see VideoApp.cut_videos)"""
+    if row['virtual']:
+        return row['video_name']
+    name = Path(row['video_name'].replace('\\', '/')).name
+    label_name = 'label_{}'.format(row['#_highlight'])
+    return str(Path(cuts_dir).parent / name.replace(label_name, 'complete', 1))
+
+
+def clip_path(row: dict, cuts_dir: str):
+    """the clip file of a label, looked up in its cuts folder when the stored path moved"""
+    path = Path(row['video_name'])
+    if path.exists():
+        return str(path)
+    return str(Path(cuts_dir) / path.name)
+
+
+def probe_clip(path: str, cache: bool = False):
+    """(frame count, duration, error message) of a clip, run in a worker process
+
+    Keyword Arguments:
+        cache {bool} -- use the .probe.npz sidecar, only for the matches: verify_cache.json keeps the results of the
+                        clips, which get no sidecar in the dataset folders (default: {False})
+    """
+    try:
+        media = probe(path, cache=cache)
+    except Exception as err:
+        return 0, 0.0, '{}: {}'.format(type(err).__name__, err)
+    return media.frame_count, media.duration, ''
+
+
+def probe_match(path: str):
+    return probe_clip(path, cache=True)
+
+
+def compare(path: str, expected_frames: int, fps: float, frame_count: int, duration: float, error: str = '',
+            tolerance: int = 1):
+    """check a probed clip against its expected frame count, with some frames of tolerance"""
+    expected_duration = expected_frames / fps
+    if error:
+        return ClipCheck(path, 'error', expected_frames, frame_count, expected_duration, duration, error)
+    if abs(frame_count - expected_frames) > tolerance:
+        return ClipCheck(path, 'frames', expected_frames, frame_count, expected_duration, duration,
+                         '{:+d} frames'.format(frame_count - expected_frames))
+    if abs(duration - expected_duration) > (tolerance + 0.5) / fps:
+        return ClipCheck(path, 'duration', expected_frames, frame_count, expected_duration, duration,
+                         '{:+.3f} s'.format(duration - expected_duration))
+    return ClipCheck(path, 'ok', expected_frames, frame_count, expected_duration, duration, '')
+
+
+def compare_range(row: dict, path: str, frame_count: int, error: str = ''):
+    """check a virtual clip against the frame count of its match"""
+    first, expected_frames = expected_window(row, frame_count)
+    expected_duration = expected_frames / row['fps']
+    if error:
+        return ClipCheck(path, 'error', expected_frames, 0, expected_duration, 0.0, error)
+    if row['ending_frame'] >= frame_count:
+        return ClipCheck(path, 'range', expected_frames, expected_frames, expected_duration, expected_duration,
+                         'ends at frame {} of a {} frames match'.format(row['ending_frame'], frame_count))
+    return ClipCheck(path, 'ok', expected_frames, expected_frames, expected_duration, expected_duration,
+                     'frames {}-{}'.format(first, first + expected_frames - 1))
+
+
+def _load_cache(cache_path: Path):
+    if not cache_path.exists():
+        return {}
+    try:
+        with open(str(cache_path), 'r') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        LOGGER.warning('%s unreadable, all its clips are checked again', cache_path)
+        return {}
+
+
+def _save_cache(cache_path: Path, cache: dict):
+    tmp_path = cache_path.with_name(cache_path.name + '.tmp')
+    with open(str(tmp_path), 'w') as cache_file:
+        json.dump(cache, cache_file)
+    os.replace(str(tmp_path), str(cache_path))
+
+
+def verify(*roots: str, workers: int = None, tolerance: int = 1, executor=None):
+    """check the clips of all the cuts folders found under some folders
+
+    Keyword Arguments:
+        workers {int} -- probing processes, None for one per cpu (default: {None})
+        tolerance {int} -- frame count difference still accepted (default: {1})
+        executor {Executor} -- pool running the probes instead of a new process pool (default: {None})
+
+    Returns:
+        {list} -- a ClipCheck per label, in label order
+    """
+    store = LabelStore().update(*roots)
+    rows = store.rows()
+    checks = [None] * len(store)
+    cuts_dirs = [os.path.dirname(store.sources[row['source']][0]) for row in rows]
+    matches = [match_path(row, cuts_dir) for row, cuts_dir in zip(rows, cuts_dirs)]
+    own_executor = executor is None
+    executor = executor or ProcessPoolExecutor(max_workers=workers)
+    try:
+        # frame counts of the matches: no window goes past the end of its match
+        match_paths = sorted({path for path in matches if os.path.exists(path)})
+        probed_matches = dict(zip(match_paths, executor.map(probe_match, match_paths, chunksize=4)))
+
+        caches = {}
+        # (label position, clip path, cache key, expected frames, fps, cache) of the clips to probe
+        pending = []
+        for position, (row, cuts_dir, match) in enumerate(zip(rows, cuts_dirs, matches)):
+            probed_match = probed_matches.get(match)
+            if row['virtual']:
+                if probed_match is None:
+                    _, expected_frames = expected_window(row)
+                    checks[position] = ClipCheck(match, 'missing', expected_frames, 0, expected_frames / row['fps'],
+                                                 0.0, 'no match file')
+                else:
+                    checks[position] = compare_range(row, match, probed_match[0], probed_match[2])
+                continue
+
+            cache = caches.setdefault(cuts_dir, _load_cache(Path(cuts_dir) / CACHE_FILE))
+            path = clip_path(row, cuts_dir)
+            match_frames = probed_match[0] if probed_match is not None and not probed_match[2] else None
+            _, expected_frames = expected_window(row, match_frames)
+            if not os.path.exists(path):
+                checks[position] = ClipCheck(path, 'missing', expected_frames, 0, expected_frames / row['fps'], 0.0,
+                                             'no clip file')
+                continue
+            stat = os.stat(path)
+            key = [stat.st_mtime, stat.st_size]
+            cached = cache.get(path)
+            if cached is not None and cached['key'] == key:
+                checks[position] = compare(path, expected_frames, row['fps'], cached['frame_count'],
+                                           cached['duration'], tolerance=tolerance)
+            else:
+                pending.append((position, path, key, expected_frames, row['fps'], cache))
+
+        if pending:
+            LOGGER.info('%d clips to probe, %d checked', len(pending), sum(check is not None for check in checks))
+            paths = [path for _, path, _, _, _, _ in pending]
+            probed = list(executor.map(probe_clip, paths, chunksize=4))
+            for (position, path, key, expected_frames, fps, cache), (frame_count, duration, error) in zip(pending,
+                                                                                                        probed):
+                if not error:
+                    # failed probes are tried again at the next run
+                    cache[path] = {'key': key, 'frame_count': frame_count, 'duration': duration}
+                checks[position] = compare(path, expected_frames, fps, frame_count, duration, error, tolerance)
+            for cuts_dir, cache in caches.items():
+                _save_cache(Path(cuts_dir) / CACHE_FILE, cache)
+    finally:
+        if own_executor:
+            executor.shutdown()
+    return checks
+
+
+def write_report(csv_path: str, checks: list):
+    with open(csv_path, 'w', newline='') as write_file:
+        writer = csv.writer(write_file)
+        writer.writerow(ClipCheck._fields)
+        writer.writerows(checks)
+
+
+def argparser():
+    parser = argparse.ArgumentParser(description='check the cut clips against labels_info.csv')
+    parser.add_argument('roots', nargs='+',
+                        help='folders searched for cuts/labels_info.csv and cuts/virtual_labels_info.csv')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--tolerance', type=int, default=1, help='frame count difference still accepted')
+    parser.add_argument('--csv', help='write all the checks to a csv report')
+    return parser
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)8s] %(message)s')
+    args = argparser().parse_args()
+    checks = verify(*args.roots, workers=args.workers, tolerance=args.tolerance)
+    failed = [check for check in checks if check.status != 'ok']
+    for check in failed:
+        print('{}: {} (expected {} frames / {:.3f} s, found {} / {:.3f} s) {}'.format(
+            check.clip, check.status, check.expected_frames, check.expected_duration, check.frame_count,
+            check.duration, check.message))
+    print('{} of {} clips do not match their labels'.format(len(failed), len(checks)))
+    if args.csv:
+        write_report(args.csv, checks)
+    sys.exit(1 if failed else 0)
@@ -4,11 +4,15 @@ from PyQt5.QtCore import Qt, QFile, QSize
 from PyQt5.QtGui import QColor, QFont, QPainter, QPen, QIcon, QPixmap
 from PyQt5.QtWidgets import (QAbstractItemView, QDesktopWidget, QGridLayout,
                              QGroupBox, QHBoxLayout, QHeaderView, QLabel,
-                             QPushButton, QSlider, QStyle, QTableWidget,
+                             QPushButton, QSlider, QStyle, QTableView, QTableWidget,
                              QTableWidgetItem, QVBoxLayout, QWidget, QListWidget, QMenuBar, QFileDialog, QLineEdit,
-                             QSpacerItem, QSizePolicy, QMainWindow, QAction, QToolBar, QMenu, QApplication)
+                             QSpacerItem, QSizePolicy, QMainWindow, QAction, QToolBar, QMenu, QApplication,
+                             QStyleOptionSlider, QDockWidget)
 
-import pandas as pd
+from .highlights import HighlightTableModel
+from .startup import lazy_import
+
+pd = lazy_import('pandas')
 
 
 class VideoFrameViewer(QLabel):
@@ -59,6 +63,45 @@ class VideoFrameViewer(QLabel):
             self._draw_rect(pt1, pt2, pen)
 
 
+class MarkedSlider(QSlider):
+    """slider drawing a tick over the groove for each marker value (e.g. shot cuts)"""
+
+    def __init__(self, orientation, parent=None):
+        super().__init__(orientation, parent)
+        self.markers = []
+        self.marker_color = QColor(255, 140, 0)
+        self._marker_xs = None
+        self._marker_geometry = None
+
+    def set_markers(self, values):
+        self.markers = list(values)
+        self._marker_xs = None
+        self.update()
+
+    def _marker_positions(self, offset: int, span: int):
+        """distinct x pixel of the markers, cached until the geometry or the markers change"""
+        geometry = (offset, span, self.minimum(), self.maximum())
+        if self._marker_xs is None or self._marker_geometry != geometry:
+            self._marker_xs = sorted({offset + QStyle.sliderPositionFromValue(self.minimum(), self.maximum(), value, span)
+                                      for value in self.markers if self.minimum() <= value <= self.maximum()})
+            self._marker_geometry = geometry
+        return self._marker_xs
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.markers or self.maximum() <= self.minimum():
+            return
+        option = QStyleOptionSlider()
+        self.initStyleOption(option)
+        groove = self.style().subControlRect(QStyle.CC_Slider, option, QStyle.SC_SliderGroove, self)
+        handle = self.style().subControlRect(QStyle.CC_Slider, option, QStyle.SC_SliderHandle, self)
+        painter = QPainter(self)
+        painter.setPen(QPen(self.marker_color, 1))
+        for x in self._marker_positions(groove.x() + handle.width() // 2, groove.width() - handle.width()):
+            painter.drawLine(x, groove.top(), x, groove.bottom())
+        painter.end()
+
+
 class VideoAppViewer(QWidget):
     def __init__(self, title='PyQt5 video labeling viewer'):
         """init
@@ -162,6 +205,11 @@ class VideoAppViewer(QWidget):
         self.cut_video.setDisabled(True)
         table_toolbar.addAction(self.cut_video)
 
+        self.detect_highlights = QAction('detect highlights')
+        self.detect_highlights.setToolTip('propose highlights from the audio track, delete the wrong ones')
+        self.detect_highlights.setDisabled(True)
+        table_toolbar.addAction(self.detect_highlights)
+
         # table with cut info
         self.table_trim = self._get_trim_preview_table(self)
         table_vbox.addWidget(table_toolbar)
@@ -188,7 +236,7 @@ class VideoAppViewer(QWidget):
         self.btn_play_video = QPushButton()
         self.btn_play_video.setEnabled(True)
         self.btn_play_video.setIcon(self.style().standardIcon(QStyle.SP_MediaPlay))
-        self.slider_video = QSlider(Qt.Horizontal)
+        self.slider_video = MarkedSlider(Qt.Horizontal)
         self.slider_video.setRange(0, 0)
         hbox_video_slider_plot.addWidget(self.btn_play_video, 0, 0)
         hbox_video_slider_plot.addWidget(self.slider_video, 0, 1)
@@ -209,7 +257,15 @@ class VideoAppViewer(QWidget):
         self.btn_10_next_frames.setFixedSize(130, 30)
         self.btn_3_next_sec = QPushButton('3 secs >>')
         self.btn_3_next_sec.setFixedSize(120, 30)
-
+        # jump to the previous/next shot cut, enabled once the shot index is ready
+        self.btn_previous_shot = QPushButton('<< Shot')
+        self.btn_previous_shot.setFixedSize(100, 30)
+        self.btn_previous_shot.setDisabled(True)
+        self.btn_next_shot = QPushButton('Shot >>')
+        self.btn_next_shot.setFixedSize(100, 30)
+        self.btn_next_shot.setDisabled(True)
+
+        hbox_jump_frames.addWidget(self.btn_previous_shot)
         hbox_jump_frames.addWidget(self.btn_3_previous_sec)
         hbox_jump_frames.addWidget(self.btn_10_previous_frames)
         hbox_jump_frames.addWidget(self.btn_previous_frame)
@@ -217,6 +273,7 @@ class VideoAppViewer(QWidget):
         hbox_jump_frames.addWidget(self.btn_next_frame)
         hbox_jump_frames.addWidget(self.btn_10_next_frames)
         hbox_jump_frames.addWidget(self.btn_3_next_sec)
+        hbox_jump_frames.addWidget(self.btn_next_shot)
         hbox_jump_frames.addStretch()
         vbox_panels.addLayout(hbox_jump_frames)
 
@@ -274,11 +331,9 @@ class VideoAppViewer(QWidget):
     def get_frame_from_event(self, event):
         """get frame from single event informations"""
         min = event['_min']
-        print("min", min)
         sec = event['sec']
-        print("sec", sec)
         seconds = min * 60 + sec
-        print("seconds", seconds)
+        self.logger.debug('event time', extra={'fields': {'min': min, 'sec': sec, 'seconds': seconds}})
         initial = self.start_time_min * 60 + self.start_time_sec
         frame = (seconds - initial) * self.video_fps
         return frame
@@ -302,10 +357,8 @@ class VideoAppViewer(QWidget):
         return result
 
     def _get_trim_preview_table(self, parent):
-        table = QTableWidget(parent=parent)
-        table.setColumnCount(6)
-        table.setHorizontalHeaderLabels(
-            ['init frame', 'stop frame', 'event frame', 'begin celebration',  'match timestamp init', 'match timestamp stop'])
+        table = QTableView(parent=parent)
+        table.setModel(HighlightTableModel(parent=table))
         table.setSortingEnabled(False)
         table.setEditTriggers(QAbstractItemView.NoEditTriggers)
         table.setSelectionBehavior(QAbstractItemView.SelectRows)
@@ -319,8 +372,24 @@ class VideoAppMain(QMainWindow):
         self.centralWidget().setDisabled(True)
         self.select_path = QAction("&Select video...", self)
         self.select_path.setShortcut("Ctrl+O")
+        self.add_videos = QAction("&Add videos to queue...", self)
+        self.add_videos.setShortcut("Ctrl+Shift+O")
+        self.ingest_folder = QAction("&Ingest folder...", self)
+        self.ingest_folder.setShortcut("Ctrl+I")
+        self.next_video = QAction("&Next video", self)
+        self.next_video.setShortcut("Ctrl+N")
         self.statusBar()
 
         main_menu = self.menuBar()
         file_menu = main_menu.addMenu('&File')
         file_menu.addAction(self.select_path)
+        file_menu.addAction(self.add_videos)
+        file_menu.addAction(self.ingest_folder)
+        file_menu.addAction(self.next_video)
+
+        # queue of the match videos of the session
+        self.list_videos = QListWidget(self)
+        dock_videos = QDockWidget('Videos', self)
+        dock_videos.setWidget(self.list_videos)
+        dock_videos.setFeatures(QDockWidget.DockWidgetMovable | QDockWidget.DockWidgetFloatable)
+        self.addDockWidget(Qt.LeftDockWidgetArea, dock_videos)
@@ -0,0 +1,24 @@
+import pandas as pd
+
+from src.events import CACHE_SUFFIX, EventFeed
+
+FEED_CSV = """_min,sec,type,player,x
+12,5,pass,Smith,0.5
+3,40,foul,,
+12,5,,Jones,0.25
+45,0,shot,nan,1.0
+"""
+
+
+def test_cached_load_matches_fresh_load(tmp_path):
+    csv_path = tmp_path / 'events.csv'
+    csv_path.write_text(FEED_CSV)
+
+    fresh = EventFeed.load(str(csv_path))
+    assert (tmp_path / ('events.csv' + CACHE_SUFFIX)).exists()
+    cached = EventFeed.load(str(csv_path))
+
+    pd.testing.assert_frame_equal(cached.frame, fresh.frame)
+    assert cached.frame.isnull().equals(fresh.frame.isnull())
+    assert cached.frame['player'].isnull().tolist() == [True, False, False, True]
+    assert list(cached.keys) == list(fresh.keys) == [220, 725, 725, 2700]